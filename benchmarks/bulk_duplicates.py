@@ -0,0 +1,102 @@
+"""Time the duplicate detection of a statement import into the CSV data, for several sizes of existing data
+
+Run from the repository root with `python benchmarks/bulk_duplicates.py`, optionally followed by the numbers of existing
+transactions to test, like `python benchmarks/bulk_duplicates.py 1000 10000 100000`.
+
+Each size gets a generated data directory and a statement of 900 rows: 300 copies of existing transactions, changed in
+three ways that are each checked by a different duplicate rule, and 600 new transactions. Autocategorization is replaced
+by a fixed category, so only the duplicate detection is timed.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from components.maintain_transactions_csv import MaintainCSV
+
+ACCOUNTS = ['Checking', 'Credit Card', 'Savings']
+DESCRIPTIONS = ['AMAZON MKTPLACE PMTS', 'STARBUCKS STORE 1234', 'SHELL OIL 5555', 'PAYROLL ACME CORP', 'NETFLIX.COM',
+                'TRADER JOES #552', 'UBER TRIP HELP.UBER.COM', 'SPOTIFY USA', 'CHEVRON 0099', 'WHOLEFDS MKT 10']
+SIZES = [1000, 10000, 100000]
+
+
+def make_data(n, data_dir, seed=0):
+    """Write a CSV data directory of n random transactions posted over ten years
+
+    Returns: Dataframe of the transactions
+    """
+    rng = np.random.default_rng(seed)
+    posted = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, n), unit='D')
+    descriptions = [DESCRIPTIONS[i] + f" {rng.integers(0, 50)}" for i in rng.integers(0, len(DESCRIPTIONS), n)]
+    df = pd.DataFrame({'_id': [str(uuid.uuid4()) for _ in range(n)],
+                       'transaction date': posted - pd.to_timedelta(rng.integers(0, 3, n), unit='D'),
+                       'posted date': posted,
+                       'category': 'unknown',
+                       'description': descriptions,
+                       'amount': np.round(rng.normal(-40, 60, n), 2),
+                       'original description': descriptions,
+                       'account name': rng.choice(ACCOUNTS, n),
+                       'notes': ''})
+    df.to_csv(os.path.join(data_dir, 'transactions.csv'), index=False)
+    pd.DataFrame({'account name': ACCOUNTS, 'status': 'open', 'initial balance': 0,
+                  '_id': ['a', 'b', 'c']}).to_csv(os.path.join(data_dir, 'accounts.csv'), index=False)
+    return df
+
+
+def make_statement(df, path, account='Checking', n_new=600, seed=1):
+    """Write a bank statement CSV with 300 changed copies of the account's existing transactions and n_new new ones"""
+    rng = np.random.default_rng(seed)
+    existing = df[df['account name'] == account]
+    existing = existing.sample(min(300, len(existing)), random_state=seed)
+    rows = []
+    for i, trans in enumerate(existing.to_dict('records')):
+        if i % 3 == 0:  # Same posted date
+            rows.append((trans['transaction date'], trans['posted date'], trans['description'], trans['amount']))
+        elif i % 3 == 1:  # Same transaction date and a similar description
+            rows.append((trans['transaction date'], trans['posted date'] + pd.Timedelta(days=1), trans['description'] + ' X',
+                         trans['amount']))
+        else:  # Same transaction date and a different description
+            rows.append((trans['transaction date'], trans['posted date'] + pd.Timedelta(days=1), 'COMPLETELY OTHER',
+                         trans['amount']))
+    posted = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n_new), unit='D')
+    for i in range(n_new):
+        rows.append((posted[i], posted[i], f"NEW MERCHANT {i % 40}", float(np.round(rng.normal(-30, 20), 2))))
+    statement = pd.DataFrame(rows, columns=['Transaction Date', 'Post Date', 'Description', 'Amount'])
+    statement['Transaction Date'] = pd.to_datetime(statement['Transaction Date']).dt.strftime('%m/%d/%Y')
+    statement['Post Date'] = pd.to_datetime(statement['Post Date']).dt.strftime('%m/%d/%Y')
+    statement.to_csv(path, index=False)
+    return len(statement)
+
+
+def time_import(n):
+    """Time finding the new transactions of the statement among n existing transactions
+
+    Returns: Seconds taken, number of statement rows, and number of new transactions found
+    """
+    with tempfile.TemporaryDirectory() as data_dir:
+        df = make_data(n, data_dir)
+        statement_path = os.path.join(data_dir, 'statement.csv')
+        n_rows = make_statement(df, statement_path)
+        os.environ['DATA_DIR'] = data_dir
+        md = MaintainCSV()
+        md._autocategorize = lambda row, account=None: 'unknown'
+        with contextlib.redirect_stdout(io.StringIO()):  # Don't print each inserted transaction
+            start = time.perf_counter()
+            inserted = sum(len(chunk) for chunk in md._add_transactions(statement_path, 'Checking'))
+            elapsed = time.perf_counter() - start
+    return elapsed, n_rows, inserted
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'existing rows':>14}  {'statement rows':>14}  {'new rows':>8}  {'time':>8}")
+    for size in sizes:
+        seconds, rows, new = time_import(size)
+        print(f"{size:>14,}  {rows:>14,}  {new:>8,}  {seconds:>7.2f}s")
@@ -0,0 +1,126 @@
+import dash
+from dash import dcc, html, Input, Output, State, no_update
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+import json
+
+from components.configurations_sidebar import configurations_sidebar
+from components.trends_tab import trends_tab, make_trends_plot
+from components.transaction_tab import transaction_tab, make_table
+from components.budget_tab import budget_tab, make_budget_plots
+from components.net_worth_tab import net_worth_tab, make_net_worth_plot
+from components.configurations_tab import configurations_tab, make_accounts_table, make_categories_table
+from components.utils import zero_params_dict, MD
+
+external_stylesheets = ['assets/budgie_light.css', dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME]
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+
+# Initialize parameters
+current_config_dict = zero_params_dict()
+
+# Layout app window
+app.layout = html.Div(
+    children=[
+        dcc.Store(id='current-config-memory'),
+        dcc.Store(id='update-tab'),
+        dcc.Store(id='rendered-tabs'),
+        dcc.Store(id='dropdown-version'),
+
+        html.Div(style={'background-color': '#2C4864'},
+                 children=[
+                     html.Div(style={'width': 'auto', 'display': 'inline-block', 'padding': '25px 40px'},
+                              children=[html.Img(id='logo', src="assets/parakeet.png", height="90px")]),
+                     dbc.Tooltip(children=["Tweet tweet!", html.Br(),
+                                           "I'd like to thank J for coming up with the name and theme of Budgie, and T for supporting me (and laughing at my antics) while developing this. - K, 2024"],
+                                 target='logo',
+                                 placement='right',
+                                 style={'font-size': 14},
+                                 ),
+
+                     html.Div(style={'position': 'absolute', 'left': '145px', 'top': '60px'},
+                              children=[html.H1(['Budgie Financial Dashboard'])]),
+                 ]),
+
+        configurations_sidebar,
+
+        html.Div(
+            id='tab-div', style={'padding': '20px'},  # tabs container
+            children=[
+                dcc.Tabs(id='selection-tabs', value='Trends', children=[
+                    trends_tab,
+                    transaction_tab,
+                    budget_tab,
+                    net_worth_tab,
+                    configurations_tab,
+                ]),
+            ]),
+    ]
+)
+
+
+########################################################################################
+@app.callback(
+    Output('trends-graph', 'figure'),
+    Output('transactions-grid', 'children'),
+    Output('budget-graph-income', 'figure'),
+    Output('budget-graph-income', 'style'),
+    Output('budget-graph-group', 'figure'),
+    Output('budget-graph-group', 'style'),
+    Output('budget-graph-spend', 'figure'),
+    Output('budget-graph-spend', 'style'),
+    Output('budget-equation', 'children'),
+    Output('net-worth-graph', 'figure'),
+    Output('accounts-table', 'rowData'),
+    Output('accounts-table', 'columnDefs'),
+    Output('categories-table', 'rowData'),
+    Output('categories-table', 'columnDefs'),
+    Output('rendered-tabs', 'data'),
+
+    Input('current-config-memory', 'data'),
+    Input('selection-tabs', 'value'),
+    Input('update-tab', 'data'),
+    State('rendered-tabs', 'data'),
+)
+def update_tab_data(current_params, which_tab, update_tab, rendered_tabs):
+    """Updates the plots and tables of the active tab, if they changed since it was last rendered.
+
+    The other tabs are left as they are and rendered when they are next selected.
+
+    Args:
+        current_params: Dictionary of original parameters from loaded config file.
+        which_tab: The active tab to update the values of
+        update_tab: Trigger to update the table
+        rendered_tabs: Dictionary of each rendered tab and the parameters and data version it was rendered with
+
+    Returns:
+        Figure object of plot
+        Table data dictionary
+        Updated dictionary of rendered tabs
+
+    """
+    # The data changed, so every tab needs to be rendered again
+    if rendered_tabs is None or dash.callback_context.triggered[0]['prop_id'] == 'update-tab.data':
+        rendered_tabs = {}
+
+    # The Configurations tab doesn't depend on the filter parameters
+    tab_params = None if which_tab == 'Configurations' else current_params
+    signature = f"{MD.data_version}|{json.dumps(tab_params, sort_keys=True, default=str)}"
+    if rendered_tabs.get(which_tab) == signature:
+        raise PreventUpdate
+
+    outputs = [no_update] * 14
+    if which_tab == 'Trends':
+        outputs[0] = make_trends_plot(current_params)
+    elif which_tab == 'Transactions':
+        outputs[1] = make_table(current_params)
+    elif which_tab == 'Budget':
+        outputs[2:9] = make_budget_plots(current_params)
+    elif which_tab == 'Net Worth':
+        outputs[9] = make_net_worth_plot(current_params)
+    elif which_tab == 'Configurations':
+        acc_dict = make_accounts_table(True)
+        cat_dict = make_categories_table(True)
+        outputs[10:14] = acc_dict['data'], acc_dict['columns'], cat_dict['data'], cat_dict['columns']
+
+    rendered_tabs[which_tab] = signature
+    return *outputs, rendered_tabs
@@ -0,0 +1,186 @@
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+# Column names used by different banks for the same standard transaction column
+COMMON_COLUMNS = {'posting date': 'posted date', 'post date': 'posted date', 'booking date': 'posted date',
+                  'payee': 'description', 'original name': 'original description'}
+
+
+def normalize_column(column):
+    """Lowercase the column name and replace underscores with spaces"""
+    return str(column).lower().replace('_', ' ')
+
+
+def to_amount(values):
+    """Convert dollar strings like '$1,234.50', '(12.00)', or '- $12.00' to numbers"""
+    if values.dtype != object:
+        return values
+    values = values.astype(str).str.replace(r'[$,\s]', '', regex=True).str.replace('(', '-', regex=False).str.replace(')', '', regex=False)
+    return pd.to_numeric(values.replace({'nan': np.nan, '': np.nan}))
+
+
+class BankFormat:
+    """Declarative description of the transaction CSV format of a financial institution
+
+    Args:
+        name: Name of the format
+        signature: Set of (normalized) column names that identify the format
+        columns: Dictionary to rename the bank's columns to the standard column names
+        amount: How to get the signed amount, one of:
+            'signed': the amount column is already positive for credits and negative for debits
+            'credit_debit': separate credit and debit columns, both positive
+            'indicator': positive amount column with a credit debit indicator column
+        header_row: Row of the CSV with the column names
+        required: Column that must have a value, to drop extra balance or summary rows
+        date_format: strftime format of the dates, or None to infer it from the first date of each file
+        date_only: Drop the time from the dates
+        transform: Function to apply any other changes to the standardized dataframe
+    """
+    def __init__(self, name, signature, columns=None, amount='signed', header_row=0, required=None, date_format=None, date_only=False,
+                 transform=None):
+        self.name = name
+        self.signature = frozenset(signature)
+        self.columns = {**COMMON_COLUMNS, **(columns or {})}
+        self.amount = amount
+        self.header_row = header_row
+        self.required = required
+        self.date_format = date_format
+        self.date_only = date_only
+        self.transform = transform
+        self.inferred_date_formats = {}
+
+    def __repr__(self):
+        return f"BankFormat({self.name!r})"
+
+    def matches(self, columns):
+        return self.signature.issubset(columns)
+
+    def parse_dates(self, values, header):
+        """Convert date strings to datetimes with a single date format, inferring the format once per file header
+
+        Args:
+            values: Series of date strings
+            header: Tuple of the CSV column names, to remember the inferred date format for files with the same columns
+
+        Returns: Series of datetimes without time zones
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            dates = values
+        else:
+            key = (header, values.name)
+            date_format = self.date_format or self.inferred_date_formats.get(key)
+            if date_format is None and values.notna().any():
+                date_format = guess_datetime_format(str(values.dropna().iloc[0]))
+            try:
+                dates = pd.to_datetime(values, format=date_format)
+                self.inferred_date_formats[key] = date_format
+            except (ValueError, TypeError):
+                # The dates don't all have the same format, so fall back to parsing each one
+                dates = pd.to_datetime(values, format='mixed')
+                self.inferred_date_formats.pop(key, None)
+
+        # Remove the time zone, keeping the local time
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            dates = dates.dt.tz_localize(None)
+        elif dates.dtype == object:
+            # Mixed time zones
+            dates = pd.to_datetime(dates.map(lambda x: x.replace(tzinfo=None)))
+        if self.date_only:
+            dates = dates.dt.normalize()
+        return dates
+
+    def standardize(self, df):
+        """Rename the columns to the standard names, convert the amount to signed numbers, and parse the dates"""
+        header = tuple(df.columns)
+        df = df.rename(columns=normalize_column)
+        if self.required is not None:
+            df = df.dropna(subset=self.required)
+        df = df.rename(columns=self.columns)
+
+        if self.amount == 'credit_debit':
+            df['amount'] = to_amount(df['credit']).fillna(-to_amount(df['debit']))
+        elif self.amount == 'indicator':
+            amount = to_amount(df['amount'])
+            df['amount'] = amount.where(df['credit debit indicator'].str.lower() == 'credit', -amount)
+        else:
+            df['amount'] = to_amount(df['amount'])
+
+        # Drop empty columns first, so an empty date column is filled from the other date instead of being parsed
+        df = df.dropna(axis='columns', how='all')
+
+        # Ensure both Transaction and Posted dates
+        if 'transaction date' in df.columns and 'posted date' not in df.columns:
+            df['posted date'] = df['transaction date']
+        elif 'posted date' in df.columns and 'transaction date' not in df.columns:
+            df['transaction date'] = df['posted date']
+        for col in ['posted date', 'transaction date']:
+            if col in df.columns:
+                df[col] = self.parse_dates(df[col], header)
+
+        if self.transform is not None:
+            df = self.transform(df)
+        return df
+
+
+def _venmo_transform(df):
+    """Mark payments from a different funding source and describe the transfers out of Venmo"""
+    source = df['funding source'].where(df['funding source'] != 'Venmo balance')
+    if source.notna().any():
+        df['notes'] = 'Source: ' + source
+    transfer = df['type'] == 'Standard Transfer'
+    df.loc[transfer, 'description'] = 'Transfer to ' + df.loc[transfer, 'destination'].astype(str)
+    return df
+
+
+# Known formats, checked in order, so more specific formats come first
+BANK_FORMATS = [
+    BankFormat('Venmo', {'datetime', 'note', 'amount (total)'}, header_row=2, required='datetime',
+               columns={'datetime': 'posted date', 'note': 'description', 'amount (total)': 'amount'},
+               date_format='%Y-%m-%dT%H:%M:%S', date_only=True, transform=_venmo_transform),
+    BankFormat('Credit and debit columns', {'credit', 'debit'}, amount='credit_debit'),
+    BankFormat('Credit debit indicator', {'amount', 'credit debit indicator'}, amount='indicator'),
+    BankFormat('Signed amount', {'amount'}),
+]
+
+
+def register_bank_format(bank_format):
+    """Add a new bank format, checked before all the existing formats"""
+    BANK_FORMATS.insert(0, bank_format)
+    detect_bank_format.cache_clear()
+
+
+@lru_cache(maxsize=128)
+def detect_bank_format(columns):
+    """Get the bank format matching the CSV column names
+
+    Args:
+        columns: Tuple of the column names of the CSV
+
+    Returns: Matching BankFormat, or None if the format is unknown
+    """
+    normalized = {normalize_column(col) for col in columns}
+    for bank_format in BANK_FORMATS:
+        if bank_format.matches(normalized):
+            return bank_format
+    return None
+
+
+def detect_header_row(read_header):
+    """Find which row of the CSV has the column names of a known bank format
+
+    Args:
+        read_header: Function to get the column names of the CSV when reading it with the given header row
+
+    Returns: Header row index
+    """
+    if detect_bank_format(tuple(read_header(0))) is not None:
+        return 0
+    for header_row in sorted({bank_format.header_row for bank_format in BANK_FORMATS} - {0}):
+        try:
+            if detect_bank_format(tuple(read_header(header_row))) is not None:
+                return header_row
+        except (IndexError, ValueError):
+            continue
+    return 0
@@ -0,0 +1,49 @@
+import pandas as pd
+
+
+class BudgetSnapshot:
+    """In-memory copy of the budget items, keyed by category
+
+    Args:
+        items: Iterable of budget item dictionaries, or a dataframe, with the category, value, and is_parent columns
+    """
+    def __init__(self, items=()):
+        if isinstance(items, pd.DataFrame):
+            items = items.to_dict('records')
+        self.values = {}
+        self.groups = set()
+        for item in items:
+            self.set(item['category'], item['value'], item.get('is_parent', False))
+
+    def set(self, category, value, is_parent=None):
+        """Add or update the monthly value of a budget item, keeping whether it's a group budget if not given"""
+        self.values[category] = value
+        if is_parent is not None:
+            if is_parent is True or (not pd.isna(is_parent) and bool(is_parent)):
+                self.groups.add(category)
+            else:
+                self.groups.discard(category)
+
+    def remove(self, category):
+        self.values.pop(category, None)
+        self.groups.discard(category)
+
+    def amount(self, category):
+        """Get the budget value of a category, the sum for a list of categories, or 0 if there is no budget"""
+        if isinstance(category, list):
+            return sum(self.values.get(cat, 0) for cat in category)
+        return self.values.get(category, 0)
+
+    def budget_dicts(self):
+        """Split the budget items into positive, negative, and group budget dictionaries"""
+        pos_dict = {}
+        neg_dict = {}
+        grp_dict = {}
+        for category, value in self.values.items():
+            if category in self.groups:
+                grp_dict[category] = value
+            elif value > 0:
+                pos_dict[category] = value
+            else:
+                neg_dict[category] = value
+        return pos_dict, neg_dict, grp_dict
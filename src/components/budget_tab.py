@@ -24,7 +24,10 @@ def make_budget_plots(conf_dict):
     neg_dict = dict(sorted(neg_dict.items(), reverse=True))
     grp_dict = dict(sorted(grp_dict.items(), reverse=True))
 
-    transactions = MD.query_transactions(conf_dict)
+    # Get income and spending per category, mostly from the monthly rollup
+    summary = MD.summarize_transactions(conf_dict)
+    category_totals = summary.groupby(level='category')[['income', 'spending']].sum()
+    spent_by_category = category_totals['income'] + category_totals['spending']
 
     # Calculate overall percent of budget for multiple months
     start_date = datetime.strptime(conf_dict['start_date'], '%Y-%m-%d').date()
@@ -32,24 +35,25 @@ def make_budget_plots(conf_dict):
     display_delta = max(end_date - start_date, timedelta(days=1))
     months = np.ceil(display_delta.days / 31)
 
+    # Spent and budgeted amounts of each budget, with group budgets summing their children categories
+    children = MD.get_children_map()
+    budget_arrays = []
+    for budget_dict, is_group in [[pos_dict, False], [neg_dict, False], [grp_dict, True]]:
+        if is_group:
+            spent = np.array([spent_by_category.reindex(children.get(cat, [])).sum() for cat in budget_dict], dtype=float)
+        else:
+            spent = spent_by_category.reindex(list(budget_dict), fill_value=0).to_numpy(dtype=float)
+        budgeted = np.array(list(budget_dict.values()), dtype=float) * months
+        budget_arrays.append((spent, budgeted, 100 * spent / budgeted))
+
     fig_income = go.Figure()
     fig_spend = go.Figure()
     fig_group = go.Figure()
 
-    count = 0
-    for fig, budget_dict in [[fig_income, pos_dict], [fig_spend, neg_dict], [fig_group, grp_dict]]:
-        percent_list = []
-        count += 1
-        for cat in budget_dict.keys():
-            # Get overall spending depending on if it's the normal single categories or a group category
-            if count == 3:
-                categories = MD.get_children_categories_list(cat)
-                spent = float(transactions[transactions['category'].isin(categories)]['amount'].sum())
-            else:
-                spent = float(transactions[transactions['category'] == cat]['amount'].sum())
-            budgeted = budget_dict[cat] * months
-            percent = 100 * spent / budgeted
-            percent_list.append(percent)
+    for fig, budget_dict, (spent_array, budgeted_array, percent_array) in zip([fig_income, fig_spend, fig_group],
+                                                                             [pos_dict, neg_dict, grp_dict], budget_arrays):
+        percent_list = percent_array.tolist()
+        for cat, spent, budgeted, percent in zip(budget_dict.keys(), spent_array.tolist(), budgeted_array.tolist(), percent_list):
             diff = spent - budgeted
 
             if budgeted >= 0:
@@ -130,9 +134,9 @@ def make_budget_plots(conf_dict):
         est_color = '#162432'
 
     # Now get the actual current status
-    transactions = transactions[~transactions['category'].isin(MD.get_hide_from_trends())]
-    act_income = transactions['amount'][transactions['amount'] > 0].sum()
-    act_spend = transactions['amount'][transactions['amount'] < 0].sum()
+    shown = category_totals[~category_totals.index.isin(MD.get_hide_from_trends())]
+    act_income = shown['income'].sum()
+    act_spend = shown['spending'].sum()
     act_delta = act_income + act_spend
     if act_delta < 0:
         act_color = 'firebrick'
@@ -235,6 +239,12 @@ budget_tab = dcc.Tab(label="Budget", value='Budget', className='tab-body', child
 ])
 
 
+def _last_six_months(categories):
+    """Get the configuration for the transactions of the categories over the past 180 days"""
+    return {'start_date': (date.today() - timedelta(days=180)).strftime('%Y-%m-%d'), 'end_date': date.today().strftime('%Y-%m-%d'),
+            'field_filter': ['Category'], 'filter_value': {'Category': list(categories)}}
+
+
 @callback(
     Output("budget-modal", "is_open"),
     Output('budget-category-dropdown', 'options'),
@@ -284,16 +294,11 @@ def toggle_budget_modal(open_modal, cancel, submit, budget_category, budget_valu
 
         # If it's a parent category, then give the default budget amount
         if budget_category in MD.get_categories_list('parent_only'):
-            budget_value = 0
-            transactions = pd.DataFrame()
-            for child_cat in MD.get_children_categories_list(budget_category):
-                # Get the total budgeted amount for all child categories
-                budget_value += MD.get_budget_amount(child_cat)
-                # Query all transactions to get the average spent per all child categories
-                transactions = pd.concat([transactions, pd.DataFrame(MD.transactions_table.find({
-                    'posted date': {'$gte': datetime.today() - timedelta(days=180),
-                                    '$lte': datetime.today()},
-                    'category': child_cat}))])
+            # Get the total budgeted amount for all child categories
+            children = MD.get_children_categories_list(budget_category)
+            budget_value = MD.get_budget_amount(children)
+            # Query all transactions to get the average spent per all child categories
+            transactions = MD.query_transactions(_last_six_months(children))
             num_text = 'Group budget amount:'
             input_disabled = True
         
@@ -304,10 +309,7 @@ def toggle_budget_modal(open_modal, cancel, submit, budget_category, budget_valu
             else:
                 budget_value = None
             # Query all transactions to get the average spent per the categories specified
-            transactions = pd.DataFrame(MD.transactions_table.find({
-                'posted date': {'$gte': datetime.today() - timedelta(days=180),
-                                '$lte': datetime.today()},
-                'category': budget_category}))
+            transactions = MD.query_transactions(_last_six_months([budget_category]))
 
         # Check if value exists, if so, give option to delete it
         if bv != 0:
@@ -331,7 +333,7 @@ def toggle_budget_modal(open_modal, cancel, submit, budget_category, budget_valu
         categories = MD.get_categories_list('parent')
 
     elif trigger == 'modal-submit.n_clicks':
-        categories = list(MD.transactions_table.find().distinct('category'))
+        categories = MD.get_categories_list()
         if budget_category is not None and budget_value is not None and budget_value != 0:
             MD.add_budget_item(budget_category, budget_value)
             update_tab = True
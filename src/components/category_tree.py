@@ -0,0 +1,49 @@
+from itertools import count
+import pandas as pd
+
+# Shared between instances, so a reloaded tree never reuses the version of the one it replaced
+_versions = count(1)
+
+
+def _parent_name(parent):
+    """Use '' for categories without a parent, whether it's stored as empty, None, or NaN"""
+    return '' if parent is None or pd.isna(parent) else parent
+
+
+class CategoryTree:
+    """In-memory hierarchy of the categories, to answer parent, children, and hidden lookups without a query
+
+    Args:
+        categories: Iterable of category dictionaries, or a dataframe, with the category name, parent, and hidden columns
+    """
+    def __init__(self, categories=()):
+        if isinstance(categories, pd.DataFrame):
+            categories = categories.to_dict('records')
+        self.parents = {}
+        self.children = {}
+        self.hidden = set()
+        self.version = next(_versions)
+        for cat in categories:
+            name = cat['category name']
+            parent = _parent_name(cat.get('parent'))
+            self.parents[name] = parent
+            self.children.setdefault(parent, []).append(name)
+            if cat.get('hidden') is True:
+                self.hidden.add(name)
+
+    def parent_of(self, category):
+        """Get the parent of a category, '' if it has none, or None if the category doesn't exist"""
+        return self.parents.get(category)
+
+    def children_of(self, parent):
+        """Get the list of children categories of a parent category, or of each parent in a list"""
+        if isinstance(parent, list):
+            return [child for par in parent for child in self.children.get(_parent_name(par), [])]
+        return list(self.children.get(_parent_name(parent), []))
+
+    def parent_names(self):
+        """Get the sorted list of categories that are the parent of another category"""
+        return sorted(parent for parent in self.children if parent != '')
+
+    def is_parent(self, category):
+        return category != '' and category in self.children
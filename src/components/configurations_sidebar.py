@@ -1,13 +1,14 @@
 import base64
 import dash
-from dash import callback, dcc, html, Input, Output, no_update
+from dash import callback, dcc, html, Input, Output, State, no_update
 import dash_bootstrap_components as dbc
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
-from io import StringIO
-import os
+from io import BytesIO
 import pandas as pd
 
+from components.maintain_transactions_arrow import MaintainArrow
+from components.maintain_transactions_csv import MaintainCSV
 from components.utils import zero_params_dict, get_accounts_list, MD
 
 configurations_sidebar = html.Div(
@@ -192,6 +193,7 @@ configurations_sidebar = html.Div(
     Output('time-dropdown', 'value'),
     Output('sort-dropdown', 'value'),
     Output('date-range', 'style'),
+    Output('dropdown-version', 'data'),
 
     Input('field-dropdown', 'value'),
     Input('time-dropdown', 'value'),
@@ -204,8 +206,10 @@ configurations_sidebar = html.Div(
     Input('bar-button', 'n_clicks'),
     Input('pie-button', 'n_clicks'),
     Input('time-button', 'n_clicks'),
+    State('dropdown-version', 'data'),
 )
-def update_parameters(field_filter, time_filter, cat_filter, acc_filter, sort_filter, current_params, start_date, end_date, bar_button, pie_button, time_button):
+def update_parameters(field_filter, time_filter, cat_filter, acc_filter, sort_filter, current_params, start_date, end_date, bar_button, pie_button, time_button,
+                      dropdown_version):
     """Update current parameter dictionary and visible parameters based on selected bit or manual changes.
 
     Args:
@@ -216,6 +220,7 @@ def update_parameters(field_filter, time_filter, cat_filter, acc_filter, sort_fi
         current_params: Dictionary of current parameters
         end_date: end date of time window to show
         start_date: start date of time window to show
+        dropdown_version: Version of the categories and accounts the filter dropdown options were made from
 
     Returns: Current parameters for specified bit.
 
@@ -302,7 +307,15 @@ def update_parameters(field_filter, time_filter, cat_filter, acc_filter, sort_fi
     if trigger == 'acc-filter-dropdown.value':
         new_params['filter_value']['Account Name'] = acc_filter
 
-    return new_params, cat_style, MD.get_categories_list('parent'), account_style, get_accounts_list(), new_params['time_filter'], new_params['sort_filter'], date_range_style
+    # Only send the filter dropdown options if the categories or accounts changed
+    current_version = MD.get_dropdown_version()
+    if current_version == dropdown_version:
+        cat_options = acc_options = no_update
+    else:
+        cat_options = MD.get_categories_list('parent')
+        acc_options = get_accounts_list()
+
+    return new_params, cat_style, cat_options, account_style, acc_options, new_params['time_filter'], new_params['sort_filter'], date_range_style, current_version
 
 
 @callback(
@@ -383,7 +396,6 @@ def new_transaction_modal(open_modal, cancel, submit, category, amount, t_date,
                 MD.add_account(new_account)
             if new_category:
                 MD.add_category(new_category)
-            MD.export_data_to_csv()
             category = 'unknown'
             new_category = None
             amount = '$ 0'
@@ -460,21 +472,34 @@ def parse_upload_transaction_file(account, loaded_file, new_account):
         elif account == 'Multiple accounts...':
             account = None
 
-        # Parse the data
-        msg = []
-        for i, file in enumerate(loaded_file):
-            decodedBytes = base64.b64decode(file.split(',')[-1])
-            file_text = decodedBytes.decode("utf-8")
+        # Check each file is a CSV, keeping the decoded file as bytes so the transactions are read in chunks
+        files = []
+        for file in loaded_file:
+            decoded = base64.b64decode(file.split(',')[-1])
             try:
-                m = pd.read_csv(StringIO(file_text), index_col=False)
+                pd.read_csv(BytesIO(decoded), index_col=False, nrows=1)
+                files.append(decoded)
             except Exception:
+                files.append(None)
+
+        # Parse the files in parallel, adding each one in order as soon as it's parsed so duplicates between files are caught
+        parsed = iter(MD.standardize_transaction_files([file for file in files if file is not None], account))
+        msg = []
+        for i, file in enumerate(files):
+            if file is None:
                 msg.append(f"File {i + 1}: File must be in CSV format\n")
                 msg.append(html.Br())
                 continue
 
             try:
                 print(f"\nLoading {account} transactions...")
-                results = MD.load_transactions(m, account)
+                chunks = next(parsed)
+                if isinstance(chunks, Exception):
+                    raise chunks
+                elif isinstance(chunks, str):
+                    results = chunks
+                else:
+                    results = MD.load_transactions(chunks, account, standardized=True)
 
                 # If the results were successful, reset the upload center and update the tab
                 if isinstance(results, int):
@@ -487,7 +512,6 @@ def parse_upload_transaction_file(account, loaded_file, new_account):
                         update_tab = True
                         if new_account:
                             MD.add_account(new_account)
-                            MD.export_data_to_csv()
                             new_account = ''
                     account_dropdown_value = None
                 else:
@@ -521,8 +545,10 @@ def parse_upload_transaction_file(account, loaded_file, new_account):
 def export_data(export):
     """If pulling data from CSV, export the files to the CSV where they're currently located"""
     msg = None
-    if isinstance(MD.transactions_table, pd.DataFrame):
-        tooltip = f"Export data (transactions, budget, accounts, categories) as CSV files to overwrite current files in:  {os.getenv('DATA_DIR')}."
+    if isinstance(MD, MaintainArrow):
+        tooltip = f"Export data (transactions, budget, accounts, categories) as Feather files to overwrite current files in:  {MD.file_dir}."
+    elif isinstance(MD, MaintainCSV):
+        tooltip = f"Export data (transactions, budget, accounts, categories) as CSV files to overwrite current files in:  {MD.file_dir}."
     else:
         tooltip = 'Export data (transactions, budget, accounts, categories) as CSV files to the root directory, or specified in ' \
                   'the .env file BACKUP_DIR.'
@@ -0,0 +1,142 @@
+import pandas as pd
+
+BALANCE_COLUMNS = ['account name', 'posted date', 'balance']
+
+
+def balance_changes(transactions):
+    """Sum the amounts of the transactions that count towards the account balances per account and day
+
+    Venmo transactions paid from another funding source are left out, since they are a transfer from an account that
+    already has the transaction.
+
+    Args:
+        transactions: Dataframe or list of transaction dictionaries
+
+    Returns: Series of the amount change, indexed by account name and posted day
+    """
+    df = pd.DataFrame(list(transactions)) if not isinstance(transactions, pd.DataFrame) else transactions
+    if len(df) == 0 or 'posted date' not in df.columns:
+        return pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=BALANCE_COLUMNS[:2]))
+
+    keep = pd.Series(True, index=df.index)
+    if '_id' in df.columns:  # Placeholder row of an empty table
+        keep &= df['_id'].astype(str) != 'None'
+    if 'notes' in df.columns:
+        keep &= ~((df['account name'] == 'Venmo') & df['notes'].astype(str).str.contains('Source'))
+    df = df[keep]
+
+    days = pd.to_datetime(df['posted date'], format='mixed').dt.normalize().rename('posted date')
+    amounts = pd.to_numeric(df['amount'], errors='coerce')
+    return amounts.groupby([df['account name'], days]).sum()
+
+
+class DailyBalances:
+    """Materialized running balance of each account at the end of each day it has transactions
+
+    Changes are applied per account from the first changed day forward, and the changed rows are returned so the
+    storage backend only has to rewrite those.
+
+    Args:
+        table: Dataframe with the account name, posted date, and balance columns
+    """
+    def __init__(self, table=None):
+        if table is None or len(table) == 0:
+            table = pd.DataFrame({'account name': pd.Series(dtype=object), 'posted date': pd.Series(dtype='datetime64[ns]'),
+                                  'balance': pd.Series(dtype=float)})
+        table = table[BALANCE_COLUMNS].copy()
+        table['posted date'] = pd.to_datetime(table['posted date'])
+        self.table = table.sort_values(['account name', 'posted date']).reset_index(drop=True)
+
+    @classmethod
+    def build(cls, transactions):
+        """Compute the balances from scratch"""
+        balances = cls()
+        balances.apply(balance_changes(transactions))
+        return balances
+
+    @property
+    def empty(self):
+        return len(self.table) == 0
+
+    def account_balances(self, account):
+        """Get the series of balances of one account, indexed by day"""
+        rows = self.table[self.table['account name'] == account]
+        return rows.set_index('posted date')['balance']
+
+    def apply(self, changes):
+        """Add daily amount changes to the balances
+
+        Args:
+            changes: Series of the amount change, indexed by account name and posted day
+
+        Returns: Dictionary of each changed account and the first changed day and the new balances from that day on
+        """
+        changed = {}
+        changes = changes[changes != 0]
+        for account, account_changes in changes.groupby(level=0):
+            account_changes = account_changes.droplevel(0)
+            first_day = account_changes.index.min()
+            old = self.account_balances(account)
+
+            # Add the running total of the changes to the balances from the first changed day on
+            days = old.index.union(account_changes.index)
+            days = days[days >= first_day]
+            previous = old[old.index < first_day]
+            base = previous.iloc[-1] if len(previous) > 0 else 0
+            new = old.reindex(days).ffill().fillna(base) + account_changes.reindex(days, fill_value=0).cumsum()
+            new_rows = pd.DataFrame({'account name': account, 'posted date': days, 'balance': new.values})
+
+            keep = (self.table['account name'] != account) | (self.table['posted date'] < first_day)
+            self.table = pd.concat([self.table[keep], new_rows], ignore_index=True).sort_values(['account name', 'posted date'], ignore_index=True)
+            changed[account] = (first_day, new_rows)
+        return changed
+
+    def rename_account(self, old_name, new_name):
+        """Move the balances of an account to a different name, combining them if that account already exists
+
+        Returns: Dictionary of the changed accounts, like apply, with None for the removed account
+        """
+        old = self.account_balances(old_name)
+        daily = old.diff().fillna(old)
+        self.table = self.table[self.table['account name'] != old_name].reset_index(drop=True)
+        changed = self.apply(pd.Series(daily.values, index=pd.MultiIndex.from_arrays([[new_name] * len(daily), daily.index])))
+        changed[old_name] = None
+        return changed
+
+    def drop_account(self, account):
+        """Remove all the balances of an account"""
+        self.table = self.table[self.table['account name'] != account].reset_index(drop=True)
+        return {account: None}
+
+    def sample(self, days, start=None, end=None):
+        """Get the balance of every account at the end of each day
+
+        Args:
+            days: List of dates
+            start: Only count transactions posted on or after this date
+            end: Only count transactions posted on or before this date
+
+        Returns: Dataframe of the balances, indexed by day with a column for each account
+        """
+        wide = self.table.pivot(index='posted date', columns='account name', values='balance').sort_index().ffill().fillna(0)
+        days = pd.to_datetime(days)
+        sample_days = days if end is None else days.where(days <= pd.Timestamp(end), pd.Timestamp(end))
+        sampled = wide.reindex(sample_days, method='ffill').fillna(0)
+        if start is not None:
+            before = wide.reindex([pd.Timestamp(start) - pd.Timedelta(days=1)], method='ffill').fillna(0)
+            sampled = sampled - before.values
+        sampled.index = days
+        sampled.columns.name = None
+        return sampled
+
+    def compare(self, other, tolerance=0.005):
+        """Get the accounts and days where the balances differ from another DailyBalances"""
+        days = sorted(set(self.table['posted date']) | set(other.table['posted date']))
+        if len(days) == 0:
+            return []
+        mine = self.sample(days)
+        theirs = other.sample(days)
+        mine, theirs = mine.align(theirs, join='outer', fill_value=0)
+        diff = (mine - theirs).abs()
+        return [(account, day, mine.loc[day, account], theirs.loc[day, account])
+                for account in diff.columns for day in diff.index[diff[account] > tolerance]]
@@ -0,0 +1,100 @@
+from collections import Counter, defaultdict
+from difflib import get_close_matches
+
+SHORTLIST_SIZE = 50
+# Most descriptions checked, when many are tied with the last one in the shortlist
+SHORTLIST_LIMIT = 200
+# Columns of the stored index, with one row per account and description
+DESCRIPTION_COLUMNS = ['account name', 'original description', 'category', 'posted date']
+
+
+def _trigrams(text):
+    """Get the set of padded, lowercase character trigrams of each word of a string, which doesn't depend on the word order"""
+    grams = set()
+    for word in str(text).lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class DescriptionIndex:
+    """Trigram index of the known original descriptions of one account, with the last known category of each
+
+    Instead of comparing a new description against every known description, the index looks up the descriptions
+    that share the most trigrams with it and only runs the close match comparison against that shortlist.
+
+    The index is stored with the rest of the data, so it's only built from the transactions the first time an account is
+    imported to. It's updated as transactions are added or recategorized, and as categories are renamed.
+    """
+    def __init__(self):
+        self.descriptions = {}
+        self.trigrams = defaultdict(set)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build the index from an iterable of transaction dictionaries"""
+        index = cls()
+        for rec in records:
+            index.add(rec['original description'], rec['category'], rec['posted date'])
+        return index
+
+    def records(self, descriptions=None):
+        """Get the description, category, and posted date of each description, or only of the given descriptions"""
+        descriptions = self.descriptions if descriptions is None else descriptions
+        return [{'original description': desc, **self.descriptions[desc]} for desc in descriptions]
+
+    def add(self, description, category, posted_date):
+        """Add a description to the index, or update its category if this is the most recent transaction for it
+
+        Returns: If the index changed
+        """
+        if not isinstance(description, str):
+            return False
+        existing = self.descriptions.get(description)
+        if existing is None:
+            for gram in _trigrams(description):
+                self.trigrams[gram].add(description)
+            self.descriptions[description] = {'category': category, 'posted date': posted_date}
+        elif posted_date >= existing['posted date']:
+            if existing['category'] == category and existing['posted date'] == posted_date:
+                return False
+            existing['category'] = category
+            existing['posted date'] = posted_date
+        else:
+            return False
+        return True
+
+    def relabel(self, categories):
+        """Rename categories, given a dictionary of each old name and its new name
+
+        Returns: List of the descriptions that changed
+        """
+        changed = []
+        for desc, data in self.descriptions.items():
+            if data['category'] in categories:
+                data['category'] = categories[data['category']]
+                changed.append(desc)
+        return changed
+
+    def shortlist(self, description, size=SHORTLIST_SIZE):
+        """Get the known descriptions sharing the most trigrams with the description
+
+        Descriptions tied with the last one in the shortlist are included too, up to SHORTLIST_LIMIT, so which of them are
+        checked doesn't depend on the order they were added in.
+        """
+        counts = Counter()
+        for gram in _trigrams(description):
+            counts.update(self.trigrams.get(gram, ()))
+        ranked = counts.most_common()
+        if len(ranked) <= size:
+            return [desc for desc, _ in ranked]
+        least = ranked[size - 1][1]
+        return [desc for desc, count in ranked[:SHORTLIST_LIMIT] if count >= least]
+
+    def get_category(self, description, cutoff=0.7):
+        """Get the category of the most recent close match to the description, or None if nothing is close enough"""
+        matches = get_close_matches(description, self.shortlist(description), cutoff=cutoff)
+        if len(matches) == 0:
+            return None
+        matches_data = [self.descriptions[match] for match in matches]
+        return max(matches_data, key=lambda cat: cat['posted date'])['category']
@@ -0,0 +1,51 @@
+from collections import Counter
+from itertools import count
+import pandas as pd
+
+DISTINCT_FIELDS = ['category', 'account name']
+
+# Shared between instances, so a rebuilt DistinctValues never reuses the version of the one it replaced
+_versions = count(1)
+
+
+class DistinctValues:
+    """Number of transactions with each category and account, so the distinct values are known without a scan
+
+    The version changes whenever a value is added or the last transaction with a value is removed.
+
+    Args:
+        transactions: Dataframe or list of transaction dictionaries
+    """
+    def __init__(self, transactions=()):
+        self.counts = {field: Counter() for field in DISTINCT_FIELDS}
+        self.version = next(_versions)
+        self.update(added=transactions)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Make the distinct values from stored counts of each field's values, without the transactions"""
+        distinct = cls()
+        for field, field_counts in counts.items():
+            distinct.counts[field].update({value: n for value, n in field_counts.items() if n > 0})
+        return distinct
+
+    def update(self, removed=(), added=()):
+        """Count added transactions and uncount removed transactions"""
+        changed = False
+        for sign, transactions in [(-1, removed), (1, added)]:
+            df = pd.DataFrame(list(transactions)) if not isinstance(transactions, pd.DataFrame) else transactions
+            for field, counts in self.counts.items():
+                if field not in df.columns:
+                    continue
+                for value, n in df[field].value_counts().items():
+                    existed = value in counts
+                    counts[value] += sign * n
+                    if counts[value] <= 0:
+                        del counts[value]
+                    changed |= existed != (value in counts)
+        if changed:
+            self.version = next(_versions)
+
+    def values(self, field):
+        """Get the sorted list of distinct values of a field"""
+        return sorted(self.counts[field])
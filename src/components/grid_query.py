@@ -0,0 +1,145 @@
+import json
+import re
+import pandas as pd
+
+# Number of rows the transactions grid requests at a time
+GRID_BLOCK_SIZE = 100
+
+# AG Grid comparison filter types and the matching Mongo operators
+COMPARISONS = {'equals': '$eq', 'notEqual': '$ne', 'lessThan': '$lt', 'lessThanOrEqual': '$lte',
+               'greaterThan': '$gt', 'greaterThanOrEqual': '$gte'}
+
+
+def _conditions(column_filter):
+    """Split a column filter into its conditions and whether they are combined with AND"""
+    if 'conditions' in column_filter:
+        return column_filter['conditions'], column_filter.get('operator', 'AND') == 'AND'
+    if 'condition1' in column_filter:  # Filter model of older AG Grid versions
+        return [column_filter['condition1'], column_filter['condition2']], column_filter.get('operator', 'AND') == 'AND'
+    return [column_filter], True
+
+
+def _filter_values(condition):
+    """Get the value(s) of a filter condition, converting dates to datetimes"""
+    if condition.get('filterType') == 'date':
+        return [pd.Timestamp(condition[key]) if condition.get(key) else None for key in ['dateFrom', 'dateTo']]
+    return [condition.get('filter'), condition.get('filterTo')]
+
+
+def _date_condition_to_mongo(field, kind, value, value_to):
+    """Compare the posted day, not the time, like the grid's date filter"""
+    day_start, day_end = value, value + pd.Timedelta(days=1)
+    if kind == 'equals':
+        return {field: {'$gte': day_start, '$lt': day_end}}
+    if kind == 'notEqual':
+        return {field: {'$not': {'$gte': day_start, '$lt': day_end}}}
+    if kind == 'lessThan':
+        return {field: {'$lt': day_start}}
+    if kind == 'lessThanOrEqual':
+        return {field: {'$lt': day_end}}
+    if kind == 'greaterThan':
+        return {field: {'$gte': day_end}}
+    if kind == 'greaterThanOrEqual':
+        return {field: {'$gte': day_start}}
+    if kind == 'inRange':  # Excluding both ends
+        return {field: {'$gte': day_end, '$lt': value_to}}
+    raise ValueError(f"Unknown date filter type '{kind}'")
+
+
+def _condition_to_mongo(field, condition):
+    kind = condition.get('type', 'contains')
+    value, value_to = _filter_values(condition)
+    if kind == 'blank':
+        return {field: {'$in': [None, '']}}
+    if kind == 'notBlank':
+        return {field: {'$nin': [None, '']}}
+    if condition.get('filterType') == 'date':
+        return _date_condition_to_mongo(field, kind, value, value_to)
+    if kind == 'inRange':
+        return {field: {'$gt': value, '$lt': value_to}}
+    if kind in COMPARISONS:
+        return {field: {COMPARISONS[kind]: value}}
+
+    text = re.escape(str(value))
+    pattern = {'startsWith': f"^{text}", 'endsWith': f"{text}$"}.get(kind, text)
+    if kind == 'notContains':
+        return {field: {'$not': re.compile(pattern, re.IGNORECASE)}}
+    return {field: {'$regex': pattern, '$options': 'i'}}
+
+
+def grid_filter_to_mongo(filter_model):
+    """Convert an AG Grid filter model to a Mongo filter
+
+    Args:
+        filter_model: Dictionary of each filtered column and its filter, from the grid's rows request
+
+    Returns: Mongo filter dictionary
+    """
+    clauses = []
+    for field, column_filter in (filter_model or {}).items():
+        conditions, match_all = _conditions(column_filter)
+        mongo_conditions = [_condition_to_mongo(field, cond) for cond in conditions]
+        clauses.append({'$and' if match_all else '$or': mongo_conditions})
+    return {'$and': clauses} if clauses else {}
+
+
+def _condition_mask(df, field, condition):
+    column = df[field]
+    kind = condition.get('type', 'contains')
+    value, value_to = _filter_values(condition)
+    if kind == 'blank':
+        return column.isna() | (column == '')
+    if kind == 'notBlank':
+        return column.notna() & (column != '')
+    if condition.get('filterType') == 'date':
+        column = column.dt.normalize()
+    if kind == 'inRange':
+        return (column > value) & (column < value_to)
+    if kind == 'equals':
+        return column == value
+    if kind == 'notEqual':
+        return column != value
+    if kind == 'lessThan':
+        return column < value
+    if kind == 'lessThanOrEqual':
+        return column <= value
+    if kind == 'greaterThan':
+        return column > value
+    if kind == 'greaterThanOrEqual':
+        return column >= value
+
+    text = column.astype(str).str.lower()
+    value = str(value).lower()
+    if kind == 'startsWith':
+        return text.str.startswith(value)
+    if kind == 'endsWith':
+        return text.str.endswith(value)
+    if kind == 'notContains':
+        return ~text.str.contains(value, regex=False)
+    return text.str.contains(value, regex=False)
+
+
+def grid_filter_mask(df, filter_model):
+    """Get a boolean mask of the dataframe rows matching an AG Grid filter model"""
+    mask = pd.Series(True, index=df.index)
+    for field, column_filter in (filter_model or {}).items():
+        if field not in df.columns:
+            continue
+        conditions, match_all = _conditions(column_filter)
+        masks = [_condition_mask(df, field, cond) for cond in conditions]
+        combined = masks[0]
+        for other in masks[1:]:
+            combined = combined & other if match_all else combined | other
+        mask &= combined
+    return mask
+
+
+def grid_key(sort_model, filter_model):
+    """Get a hashable key for an AG Grid sort model and filter model, to cache the rows they select"""
+    return tuple(grid_sort(sort_model)), json.dumps(filter_model or {}, sort_keys=True)
+
+
+def grid_sort(sort_model):
+    """Convert an AG Grid sort model to a list of (field, direction) pairs, defaulting to the newest posted date first"""
+    sort = [(col['colId'], 1 if col['sort'] == 'asc' else -1) for col in sort_model or []]
+    return sort or [('posted date', -1)]
@@ -1,19 +1,70 @@
 from bson.objectid import ObjectId
+from collections import Counter
 from datetime import datetime, timedelta
 from difflib import get_close_matches
 from dotenv import load_dotenv
-import numpy as np
+import hashlib
 import os
 import pandas as pd
 import pymongo
+from pymongo.errors import BulkWriteError
+import sys
+
+from components.budget_snapshot import BudgetSnapshot
+from components.category_tree import CategoryTree
+from components.daily_balances import BALANCE_COLUMNS, DailyBalances, balance_changes
+from components.description_index import DescriptionIndex
+from components.distinct_values import DistinctValues
+from components.grid_query import grid_filter_to_mongo, grid_sort
+from components.query_cache import QueryCache, invalidates_queries, query_key
+from components.rollup import ROLLUP_DIMENSIONS, Rollup, combine_summaries, full_months, rollup_cells, summarize_cells, window_bounds
+from components.transaction_files import read_transactions, standardize_transaction_files, standardize_transactions
 
 TRANSACTIONS_CLIENT = 'transactions'
 BUDGET_CLIENT = 'budget'
 ACCOUNTS_CLIENT = 'accounts'
 CATEGORIES_CLIENT = 'categories'
+BALANCES_CLIENT = 'balances'
+ROLLUP_CLIENT = 'rollup'
+DESCRIPTIONS_CLIENT = 'descriptions'
 
 EMPTY_TRANSACTION = pd.DataFrame.from_dict({'_id': ['None'], 'transaction date': [datetime.today()], 'posted date': [datetime.today()], 'category': ['unknown'],
                                             'description': ['No Available Data'], 'amount': [0], 'account name': ['None'], 'notes': ['None']})
+# Fields of a stored transaction, in the order the transactions table shows them
+TRANSACTION_COLUMNS = ['_id', 'transaction date', 'posted date', 'category', 'description', 'amount', 'original description', 'account name', 'notes',
+                       'fingerprint']
+DUPLICATE_COLUMNS = ['_id', 'account name', 'amount', 'posted date', 'transaction date', 'original description']
+DUPLICATE_KEY_ERROR = 11000
+
+# Indexes each collection needs for its queries, as (keys, options) pairs, created at startup if they don't exist yet
+REQUIRED_INDEXES = {
+    TRANSACTIONS_CLIENT: [
+        # Duplicate checks, autocategorization, and account filters and renames
+        ([('account name', 1), ('amount', 1), ('posted date', 1)], {'name': 'account_amount_posted'}),
+        # Date range queries and the oldest transaction
+        ([('posted date', 1)], {'name': 'posted_date'}),
+        # Category filters, distinct categories, and category renames
+        ([('category', 1)], {'name': 'category'}),
+        # Reject transactions that were already imported from the same statement row
+        ([('fingerprint', 1)], {'name': 'fingerprint_unique', 'unique': True, 'partialFilterExpression': {'fingerprint': {'$type': 'string'}}}),
+    ],
+    CATEGORIES_CLIENT: [
+        # Children of parent categories
+        ([('parent', 1)], {'name': 'parent'}),
+    ],
+    BALANCES_CLIENT: [
+        # Balances of an account from a day forward
+        ([('account name', 1), ('posted date', 1)], {'name': 'account_posted', 'unique': True}),
+    ],
+    ROLLUP_CLIENT: [
+        # One document per rollup cell
+        ([(dim, 1) for dim in ROLLUP_DIMENSIONS], {'name': 'cell', 'unique': True}),
+    ],
+    DESCRIPTIONS_CLIENT: [
+        # Autocategorization index of an account, with one document per description
+        ([('account name', 1), ('original description', 1)], {'name': 'account_description', 'unique': True}),
+    ],
+}
 
 
 class MaintainDatabase:
@@ -22,7 +73,17 @@ class MaintainDatabase:
         self.budget_table = None
         self.accounts_table = None
         self.categories_table = None
-        self.autocategories = None
+        self.balances_table = None
+        self.rollup_table = None
+        self.descriptions_table = None
+        self.daily_balances = None
+        self.rollup = None
+        self.category_tree = None
+        self.budget_snapshot = None
+        self.distinct_values = None
+        self.autocategories = {}
+        self.data_version = 0
+        self.query_cache = QueryCache()
         self.file_dir = os.getcwd()
 
         self.load_initial_data()
@@ -35,197 +96,247 @@ class MaintainDatabase:
         self.budget_table = client[BUDGET_CLIENT]
         self.accounts_table = client[ACCOUNTS_CLIENT]
         self.categories_table = client[CATEGORIES_CLIENT]
+        self.balances_table = client[BALANCES_CLIENT]
+        self.rollup_table = client[ROLLUP_CLIENT]
+        self.descriptions_table = client[DESCRIPTIONS_CLIENT]
+        self.create_indexes()
+
+    def create_indexes(self):
+        """Create any of the required indexes that don't exist yet"""
+        tables = {TRANSACTIONS_CLIENT: self.transactions_table, CATEGORIES_CLIENT: self.categories_table, BALANCES_CLIENT: self.balances_table,
+                  ROLLUP_CLIENT: self.rollup_table, DESCRIPTIONS_CLIENT: self.descriptions_table}
+        for client, indexes in REQUIRED_INDEXES.items():
+            if tables[client] is None:  # Not stored by this backend
+                continue
+            existing = tables[client].index_information()
+            for keys, options in indexes:
+                if options['name'] not in existing:
+                    tables[client].create_index(keys, **options)
+
+    def explain_queries(self):
+        """Print how the database runs the common queries, to check that they use an index instead of a collection scan
+
+        Returns: Dictionary of each query name and the stages of its winning plan
+        """
+        now = datetime.now()
+        queries = {
+            'transactions in date range': (self.transactions_table, {'posted date': {'$gte': now - timedelta(days=30), '$lte': now}}, None),
+            'oldest transaction': (self.transactions_table, {}, [('posted date', 1)]),
+            'duplicate candidates': (self.transactions_table, {'account name': {'$in': ['']}, 'amount': 0,
+                                                               'posted date': {'$gte': now - timedelta(days=30), '$lte': now}}, None),
+            'transactions in category': (self.transactions_table, {'category': ''}, None),
+            'transactions in account': (self.transactions_table, {'account name': ''}, None),
+            'children categories': (self.categories_table, {'parent': ''}, None),
+        }
+        plans = {}
+        for name, (table, query, sort) in queries.items():
+            cursor = table.find(query)
+            if sort is not None:
+                cursor = cursor.sort(sort).limit(1)
+            plans[name] = _plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+            print(f"{name}: {' <- '.join(plans[name])}{'  (COLLECTION SCAN)' if 'COLLSCAN' in plans[name] else ''}")
+        return plans
+
+    @invalidates_queries
+    def load_transactions(self, sheet, account=None, standardized=False):
+        """Import transaction CSV in chunks and write many transactions to database
 
-    def load_transactions(self, sheet, account=None):
-        """Import transaction CSV and write many transactions to database"""
-        transaction_list = self._add_transactions(sheet, account)
-
-        # Insert transactions into database, unless there was an error, then just return the error string
-        if isinstance(transaction_list, str):
-            return transaction_list
-        elif len(transaction_list) > 0:
-            self.transactions_table.insert_many(transaction_list)
-        return len(transaction_list)
-
-    def _add_transactions(self, sheet, account=None):
-        """Add transactions to a database, ensuring duplicates are not added, and taking special care with Venmo transactions"""
-        debug = False  # Option to print more robust debug statements
-
-        if isinstance(sheet, str):
-            df = pd.read_csv(sheet)
-        else:
-            df = sheet
+        Args:
+            sheet: Path or file object of the transactions CSV, or a dataframe of the transactions
+            account: Account name for the transactions, if not given in the CSV
+            standardized: If the sheet is already a list or generator of standardized chunks from standardize_transaction_files
 
-        # Extra check if it's a venmo CSV
-        if df.columns[1] == 'Unnamed: 1':
-            if isinstance(sheet, str):
-                df = pd.read_csv(sheet, header=2)
-                df.drop(0, inplace=True)
-            else:
-                df = sheet
-                df.columns = df.iloc[1]
-                df.drop([0, 1, 2], inplace=True)
-                df = df.reset_index(drop=True)
-            df.drop(len(df) - 1, inplace=True)
-            df = df.rename(columns={'Datetime': 'posted date', 'Note': 'description', 'Amount (total)': 'amount'})
-            df['amount'] = [''.join(val.split(' $')) for val in df['amount']]
-            df['amount'] = df['amount'].astype(float)
-            df['posted date'] = [val.split('T')[0] for val in df['posted date']]
-            # TODO 'replace' is depreciated, so update this
-            source = df['Funding Source'].replace({'Venmo balance': np.nan})
-            if any(~source.isna()):
-                df['notes'] = 'Source: ' + source
-            # Add description if it's a transfer out of Venmo
-            for i in np.argwhere(df['Type'] == 'Standard Transfer'):
-                df.loc[i, 'description'] = f"Transfer to {df.loc[i, 'Destination'].values[0]}"
-
-        # Standardize sheet columns
-        df = df.dropna(axis='columns', how='all')
-        df.columns = [col.lower().replace('_', ' ') for col in df.columns]
-
-        # Ensure both Transaction and Posted dates
-        df = df.rename(columns={'posting date': 'posted date', 'post date': 'posted date',  'booking date': 'posted date'})
-        if 'transaction date' in df.columns and 'posted date' not in df.columns:
-            df['posted date'] = df['transaction date']
-        elif 'posted date' in df.columns and 'transaction date' not in df.columns:
-            df['transaction date'] = df['posted date']
-        df['posted date'] = pd.to_datetime(df['posted date']).map(lambda x: x.replace(tzinfo=None))
-        df['transaction date'] = pd.to_datetime(df['transaction date']).map(lambda x: x.replace(tzinfo=None))
-
-        # Description
-        if 'original name' in df.columns:
-            df = df.rename(columns={'payee': 'description', 'original name': 'original description'})
-        else:
-            df = df.rename(columns={'payee': 'description'})
-        if 'original description' not in df.columns:
-            try:
-                df['original description'] = df['description']
-            except KeyError:
-                return 'Error: Must provide "description" column in the CSV'
-
-        # Amount credit/debit
-        if 'credit' in df.columns and 'debit' in df.columns:
-            df['amount'] = df['credit'].fillna(-df['debit'])
-        elif 'credit debit indicator' in df.columns:
-            cdi = list(df['credit debit indicator'].str.lower())
-            vals = list(df['amount'])
-            new_vals = []
-            for i in range(len(cdi)):
-                if cdi[i] == 'credit':
-                    new_vals.append(vals[i])
-                else:
-                    new_vals.append(-vals[i])
-            df['amount'] = new_vals
-        elif isinstance(df.loc[0]['amount'], str):
-            df['amount'] = [''.join(val.split('$')).replace('(', '-').replace(')', '').replace(',', '') for val in df['amount']]
-            df['amount'] = df['amount'].astype(float)
-
-        # Multiple accounts in one CSV
-        account_labels = True if 'account name' in df.columns else False
-        if not account_labels and not account:
-            return 'Error: Must provide account name if not given in CSV'
-
-        # Add blank category column if there is none, but keep it default if loading an exported Budgie CSV
-        if account is not None:
-            if 'account name' in df.columns:
-                pass
-            else:
-                df['category'] = ''
+        Returns: Number of transactions inserted, or the error string
+        """
+        count = 0
+        imported_ids = set()
+        occurrences = Counter()
+        for transaction_list in self._add_transactions(sheet, account, imported_ids, standardized, occurrences):
+            # Insert transactions into database, unless there was an error, then just return the error string
+            if isinstance(transaction_list, str):
+                return transaction_list
+            elif len(transaction_list) > 0:
+                for trans in transaction_list:
+                    trans['_id'] = ObjectId()
+
+                # Insert everything in one unordered write, skipping the transactions the unique index rejects
+                rejected = set()
+                try:
+                    self.transactions_table.insert_many(transaction_list, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details['writeErrors']
+                    if any(err['code'] != DUPLICATE_KEY_ERROR for err in errors):
+                        raise
+                    rejected = {err['index'] for err in errors}
+                    print(f"Did not insert {len(rejected)} transactions that were already imported")
+                inserted = [trans for i, trans in enumerate(transaction_list) if i not in rejected]
+
+                imported_ids.update(trans['_id'] for trans in inserted)
+                self._update_categories(inserted)
+                self._update_materialized(added=inserted)
+                count += len(inserted)
+        return count
 
-        # Replace NA with empty string and remove transactions with no date
-        df = df.fillna('')
-        df = df.dropna(subset='posted date', axis='index')
+    @staticmethod
+    def _fingerprint(transaction, occurrences):
+        """Get a deterministic hash identifying the statement row an imported transaction came from
 
-        # If only one account for that file, get autocategorization categories from previous data
-        if account:
-            self._get_categories(account)
+        Identical rows in the same file, like two equal purchases at the same place on the same day, are told apart by
+        how many times the row has already occurred in the file, so re-importing the file gives the same fingerprints.
 
-        # Check to ensure all the necessary columns were converted
-        necessary_columns = ['transaction date', 'posted date', 'description', 'amount']
-        for col in necessary_columns:
-            if col not in df.columns:
-                print(f"Error: CSV does not contain '{col}' column")
-                return None
+        Args:
+            transaction: Standard transaction dictionary
+            occurrences: Counter of the rows already fingerprinted in this file, which is updated
 
-        # Add all non-duplicate transactions to database
-        transaction_list = []
-        now = datetime.now()
-        for i, row in df.iterrows():
-            if account_labels:
-                account = row['account name']
-
-            duplicates = self.transactions_table.find({'amount': row['amount'], 'account name': account}).sort({'posted date': -1})
-            if isinstance(duplicates, pd.DataFrame):
-                # TODO verify that this works with CSV and BudgieDF
-                len_dups = len(duplicates)
-                duplicates = duplicates.iterrows()
-            else:
-                duplicates = list(duplicates)
-                len_dups = len(duplicates)
-
-            if len_dups > 0:
-                for dup in duplicates:
-                    if isinstance(dup, tuple):
-                        dup = dup[1]
-
-                    if dup['posted date'] > row['posted date']:
-                        continue
-
-                    # Check various parameters to see if it's a duplicate or not
-                    if dup['posted date'] == row['posted date']:
-                        # Matching amount, posted date, and account are good enough to declare duplicate
-                        if debug:
-                            if dup['transaction date'] == row['transaction date']:
-                                # but keep extra options if you need to debug
-                                if dup['original description'] == row['original description']:
-                                    # It's an exact match for amount, description, and date, so definitely a duplicate
-                                    break
-                                else:
-                                    print(f"Did not insert possible duplicate transaction, but check different description: ${dup['amount']:.2f} \n"
-                                          f"       New: {row['posted date']}, {row['original description']}\n"
-                                          f"  Existing: {dup['posted date']}, {dup['original description']}")
-                                    break
-                            else:
-                                # So far, exact match for posted date and amount, so check transaction date and description
-                                print(f"Did not insert possible duplicate transaction, but check different transaction date and description:\n"
-                                      f"    Posted: {row['posted date']}, ${dup['amount']:.2f} \n"
-                                      f"       New: {row['transaction date']}, {row['original description']}\n"
-                                      f"  Existing: {dup['transaction date']}, {dup['original description']}")
-                                break
-                        break
-                    else:
-                        if dup['transaction date'] == row['transaction date']:
-                            # It's a match for amount and transaction date, but not posted date, so check description
-                            matches = get_close_matches(row['original description'], [dup['original description']], cutoff=0.35)
-                            if matches:
-                                print(f"Did not insert possible duplicate item: ${dup['amount']:.2f}\n"
-                                      f"       New: {row['posted date']}, {row['original description']}\n"
-                                      f"  Existing: {dup['posted date']}, {dup['original description']}")
-                                break
-                            else:
-                                transaction_list.append(self._make_transaction_dict(row, self._autocategorize(row), account))
-                                if row['posted date'] - now > timedelta(days=30):
-                                    print(f"Inserted transaction from over a month ago: {row['posted date']}, {row['original description']}, ${row['amount']:.2f}")
-                                print(f"Inserted potential duplicate item: ${dup['amount']:.2f}\n"
-                                      f"       New: {row['posted date']}, {row['original description']}\n"
-                                      f"  Existing: {dup['posted date']}, {dup['original description']}")
-                                break
-
-                        else:
-                            # Neither posted nor transaction dates match, so not a duplicate
-                            transaction_list.append(self._make_transaction_dict(row, self._autocategorize(row), account))
-                            if row['posted date'] - now > timedelta(days=30):
-                                print(f"Inserted transaction from over a month ago: {row['posted date']}, {row['original description']}, ${row['amount']:.2f}")
-                            break
+        Returns: Hex digest of the normalized account name, amount, posted date and time, and original description
+        """
+        # Keep the full posted time, so rows on the same day at different times aren't counted as repeats of each other.
+        # Dates without a time keep the plain date, so files imported before stay deduplicated.
+        posted = pd.Timestamp(transaction['posted date'])
+        posted = posted.strftime('%Y-%m-%d') if posted == posted.normalize() else posted.isoformat()
+        key = '|'.join([str(transaction['account name']).strip().lower(),
+                        f"{float(transaction['amount']):.2f}",
+                        posted,
+                        ' '.join(str(transaction['original description']).lower().split())])
+        occurrence = occurrences[key]
+        occurrences[key] += 1
+        return hashlib.sha1(f"{key}|{occurrence}".encode()).hexdigest()
+
+    # Reading and standardizing the CSVs doesn't need the data, so it's done in module functions that can run in other processes
+    standardize_transaction_files = staticmethod(standardize_transaction_files)
+    _read_transactions = staticmethod(read_transactions)
+    _standardize_transactions = staticmethod(standardize_transactions)
+
+    def _add_transactions(self, sheet, account=None, imported_ids=(), standardized=False, occurrences=None):
+        """Add transactions to a database one chunk at a time, ensuring duplicates are not added
 
-            else:
-                # There's no match, so get the category and add the transaction
-                transaction_list.append(self._make_transaction_dict(row, self._autocategorize(row), account))
+        Args:
+            sheet: Path or file object of the transactions CSV, or a dataframe of the transactions
+            account: Account name for the transactions, if not given in the CSV
+            imported_ids: IDs of the transactions already inserted from this file, which are not checked as duplicates
+            standardized: If the sheet is already a list or generator of standardized chunks
+            occurrences: Counter of the rows fingerprinted so far in this file, to fingerprint every row of it for the unique
+                index to reject the rows already imported. Not given if the data has no unique fingerprint index.
+
+        Returns: Generator of the list of new transactions in each chunk, or the error string
+        """
+        if standardized:
+            chunks = sheet
+        else:
+            chunks = (self._standardize_transactions(df, account) for df in self._read_transactions(sheet))
+        for df in chunks:
+            if isinstance(df, str):
+                yield df
+                return
+
+            # If only one account for that file, get autocategorization categories from previous data
+            if account:
+                self._get_categories(account)
+
+            # Fingerprint every row of the file before any are filtered, so each row's count of earlier identical rows is the same
+            # however much of the file was already imported
+            if occurrences is not None:
+                df = df.assign(fingerprint=[self._fingerprint(row, occurrences) for row in df.to_dict('records')])
+
+            # Add all non-duplicate transactions to database
+            transaction_list = []
+            now = datetime.now()
+            for row in df[self._find_new_transactions(df, imported_ids)].to_dict('records'):
+                transaction_list.append(self._make_transaction_dict(row, self._autocategorize(row, account), row['account name']))
+                if occurrences is not None:
+                    transaction_list[-1]['fingerprint'] = row['fingerprint']
                 if (row['posted date'] - now) > timedelta(days=30):
                     print(f"Inserted transaction from over a month ago: {row['posted date']}, {row['original description']}, ${row['amount']:.2f}")
+            yield transaction_list
+
+    def _get_duplicate_candidates(self, accounts, start, end):
+        """Get all existing transactions for the accounts and date span that could be duplicates with a single query"""
+        candidates = self.transactions_table.find({'account name': {'$in': list(accounts)},
+                                                   'posted date': {'$gte': start, '$lte': end}}, DUPLICATE_COLUMNS + ['fingerprint'])
+        if not isinstance(candidates, pd.DataFrame):
+            candidates = list(candidates)
+        candidates = pd.DataFrame(candidates, columns=DUPLICATE_COLUMNS + ['fingerprint'])
+        candidates['posted date'] = pd.to_datetime(candidates['posted date']).astype('datetime64[ns]')
+        candidates['transaction date'] = pd.to_datetime(candidates['transaction date']).astype('datetime64[ns]')
+        return candidates
+
+    def _find_new_transactions(self, df, imported_ids=()):
+        """Compare the new transactions with the existing ones and get a mask of the transactions that are not duplicates
+
+        Each new transaction is matched with the most recent existing transaction of the same account and amount that was
+        posted on or before it, then:
+            * Matching posted dates is a duplicate
+            * Matching transaction dates is a duplicate only if the descriptions are also similar
+            * Otherwise, it's a new transaction
+
+        Args:
+            df: Dataframe of standardized new transactions
+            imported_ids: IDs of the transactions already inserted from this file, which are not checked as duplicates
 
-        return transaction_list
+        Returns: Boolean series, True for transactions to insert
+        """
+        debug = False  # Option to print more robust debug statements
 
+        if len(df) == 0:
+            return pd.Series(dtype=bool)
+
+        # Join the new transactions on account and amount with the closest previous existing transaction
+        new = pd.DataFrame({'row': df.index,
+                            'account name': df['account name'].astype(str),
+                            'amount': pd.to_numeric(df['amount'], errors='coerce').astype(float),
+                            'posted date': pd.to_datetime(df['posted date']).astype('datetime64[ns]'),
+                            'transaction date': pd.to_datetime(df['transaction date']).astype('datetime64[ns]')})
+        existing = self._get_duplicate_candidates(new['account name'].unique(), new[['posted date', 'transaction date']].min().min(),
+                                                  new['posted date'].max())
+        existing = existing[~existing['_id'].isin(list(imported_ids))]
+        # Rows imported before from the same file have the same fingerprint, and are left for the unique index to reject
+        if 'fingerprint' in existing.columns and 'fingerprint' in df.columns:
+            existing = existing[~existing['fingerprint'].isin(list(df['fingerprint']))]
+        existing = pd.DataFrame({'account name': existing['account name'].astype(str),
+                                 'amount': pd.to_numeric(existing['amount'], errors='coerce').astype(float),
+                                 'dup posted date': existing['posted date'],
+                                 'dup transaction date': existing['transaction date'],
+                                 'dup original description': existing['original description']})
+        matched = pd.merge_asof(new.sort_values('posted date'), existing.dropna(subset='dup posted date').sort_values('dup posted date'),
+                                left_on='posted date', right_on='dup posted date', by=['account name', 'amount'], direction='backward')
+        matched = matched.set_index('row').loc[df.index]
+
+        # Matching amount, posted date, and account are good enough to declare duplicate
+        same_posted = matched['dup posted date'] == matched['posted date']
+        # It's a match for amount and transaction date, but not posted date, so check description
+        same_transaction = ~same_posted & (matched['dup transaction date'] == matched['transaction date'])
+
+        insert = ~same_posted
+        for i in matched.index[same_transaction]:
+            row = df.loc[i]
+            dup = matched.loc[i]
+            if get_close_matches(row['original description'], [dup['dup original description']], cutoff=0.35):
+                insert[i] = False
+                print(f"Did not insert possible duplicate item: ${row['amount']:.2f}\n"
+                      f"       New: {row['posted date']}, {row['original description']}\n"
+                      f"  Existing: {dup['dup posted date']}, {dup['dup original description']}")
+            else:
+                print(f"Inserted potential duplicate item: ${row['amount']:.2f}\n"
+                      f"       New: {row['posted date']}, {row['original description']}\n"
+                      f"  Existing: {dup['dup posted date']}, {dup['dup original description']}")
+
+        if debug:
+            for i in matched.index[same_posted]:
+                row = df.loc[i]
+                dup = matched.loc[i]
+                if dup['dup transaction date'] != row['transaction date']:
+                    print(f"Did not insert possible duplicate transaction, but check different transaction date and description:\n"
+                          f"    Posted: {row['posted date']}, ${row['amount']:.2f} \n"
+                          f"       New: {row['transaction date']}, {row['original description']}\n"
+                          f"  Existing: {dup['dup transaction date']}, {dup['dup original description']}")
+                elif dup['dup original description'] != row['original description']:
+                    print(f"Did not insert possible duplicate transaction, but check different description: ${row['amount']:.2f} \n"
+                          f"       New: {row['posted date']}, {row['original description']}\n"
+                          f"  Existing: {dup['dup posted date']}, {dup['dup original description']}")
+
+        return insert
+
+    @invalidates_queries
     def add_one_transaction(self, category, amount, t_date, p_date, description, account, note):
         """Add a single manual transaction to the database"""
         transaction = {'transaction date': datetime.strptime(t_date, '%Y-%m-%d'),
@@ -236,7 +347,10 @@ class MaintainDatabase:
                        'original description': description,
                        'account name': account,
                        'notes': note}
-        return self.transactions_table.insert_one(transaction)
+        self._update_categories([transaction])
+        result = self.transactions_table.insert_one(transaction)
+        self._update_materialized(added=[transaction])
+        return result
 
     @staticmethod
     def _make_transaction_dict(td, category, account):
@@ -252,64 +366,168 @@ class MaintainDatabase:
         return default_transaction
 
     def _get_categories(self, account):
-        """Get all the descriptions corresponding categories"""
-        k = list(self.transactions_table.aggregate([
+        """Load the index of the account's descriptions and their categories, if not already loaded
+
+        The stored index is read if there is one, otherwise it's built from the account's transactions and stored.
+        """
+        if account in self.autocategories:
+            return
+        stored = self._load_descriptions(account)
+        if len(stored) > 0:
+            self.autocategories[account] = DescriptionIndex.from_records(stored)
+            return
+        index = DescriptionIndex.from_records(self._description_records(account))
+        self.autocategories[account] = index
+        self._save_descriptions(account, index.records(), replace=True)
+
+    def _description_records(self, account):
+        """Get each original description of the account's transactions with the category of its most recent transaction"""
+        k = self.transactions_table.aggregate([
             {'$match': {  # match with only this account
                 'account name': account}},
+            {'$sort': {'posted date': 1}},
             {'$group': {  # get the most recent, unique original description
                 '_id': '$original description',
                 'posted date': {'$last': '$posted date'},
                 'cat': {'$last': '$category'}}}
-        ]))
-        self.autocategories = {}
-        for cat in k:
-            self.autocategories[cat['_id']] = {'category': cat['cat'], 'posted date': cat['posted date']}
-
-    def _autocategorize(self, row):
+        ])
+        return [{'original description': cat['_id'], 'category': cat['cat'], 'posted date': cat['posted date']} for cat in k]
+
+    def _load_descriptions(self, account):
+        """Get the stored description index of the account, as a list of dictionaries"""
+        return list(self.descriptions_table.find({'account name': account}, {'_id': 0}))
+
+    def _save_descriptions(self, account, records, replace=False):
+        """Store changed descriptions of the account's index, or replace all of them"""
+        if replace:
+            self.descriptions_table.delete_many({'account name': account})
+        elif len(records) > 0:
+            self.descriptions_table.delete_many({'account name': account,
+                                                 'original description': {'$in': [rec['original description'] for rec in records]}})
+        if len(records) > 0:
+            self.descriptions_table.insert_many([{'account name': account, **rec} for rec in records])
+
+    def _drop_descriptions(self, accounts=None):
+        """Forget the description indexes of the accounts, or of all accounts, so they're built again from the transactions"""
+        if accounts is None:
+            self.autocategories = {}
+            self.descriptions_table.delete_many({})
+            return
+        for account in accounts:
+            self.autocategories.pop(account, None)
+        self.descriptions_table.delete_many({'account name': {'$in': list(accounts)}})
+
+    def _relabel_descriptions(self, categories):
+        """Rename categories in the description indexes, given a dictionary of each old name and its new name"""
+        for index in self.autocategories.values():
+            index.relabel(categories)
+        for old_name, new_name in categories.items():
+            self.descriptions_table.update_many({'category': old_name}, {'$set': {'category': new_name}})
+
+    def _update_categories(self, transactions):
+        """Update the description indexes with new or recategorized transactions, and store the changed descriptions"""
+        changed = {}
+        for trans in transactions:
+            account = trans.get('account name')
+            if not isinstance(account, str):
+                continue
+            self._get_categories(account)
+            if self.autocategories[account].add(trans.get('original description'), trans.get('category'), trans.get('posted date')):
+                changed.setdefault(account, set()).add(trans['original description'])
+        for account, descriptions in changed.items():
+            self._save_descriptions(account, self.autocategories[account].records(descriptions))
+
+    def _update_edited_categories(self, old_transactions, new_transactions):
+        """Update the description indexes with edited transactions, forgetting the index of any account a transaction moved out of"""
+        old_accounts = {str(trans.get('_id')): trans.get('account name') for trans in old_transactions}
+        moved = {old_accounts[str(trans.get('_id'))] for trans in new_transactions
+                 if old_accounts.get(str(trans.get('_id')), trans.get('account name')) != trans.get('account name')}
+        if len(moved) > 0:
+            self._drop_descriptions(moved)
+        self._update_categories(new_transactions)
+
+    def _autocategorize(self, row, account=None):
         """Check with all the known descriptions if there are any close, and if so, use the last known category"""
         try:
-            matches = get_close_matches(row['original description'], self.autocategories.keys(), cutoff=0.7)
-            matches_data = [self.autocategories[match] for match in matches]
-            i_most_recent = np.argmax([cat['posted date'] for cat in matches_data])
-            return matches_data[i_most_recent]['category']
-        except (ValueError, AttributeError):
+            category = self.autocategories[account].get_category(row['original description'])
+        except KeyError:
+            category = None
+        if category is None:
             return row['category'] if row['category'] != '' else 'unknown'
+        return category
 
     def query_transactions(self, conf_dict):
-        """Query Mongo according to configuration dict parameters
+        """Get the transactions for the configuration parameters, reusing the cached result if the data hasn't changed since
 
         Args:
             conf_dict: Dictionary of the configuration parameters.
 
         Returns: Pandas Dataframe of transactions
         """
-        if len(conf_dict['filter_value']['Category']) == 0 and len(conf_dict['filter_value']['Account Name']) == 0:
-            mongo_filter = {}
-        else:
-            mongo_filter = {}
-            for val in conf_dict['field_filter']:
-                if len(conf_dict['filter_value'][val]) > 0:
-                    mongo_filter[val.lower()] = {'$in': conf_dict['filter_value'][val]}
+        return self.query_cache.get(query_key(conf_dict, self.data_version), lambda: self._query_transactions(conf_dict))
 
-        # If filtering by category, include parent as well
-        try:
-            mongo_filter['category']['$in'].extend(self.get_children_categories_list(conf_dict['filter_value'][val]))
-        except KeyError:
-            pass
+    def _transactions_filter(self, conf_dict):
+        """Get the Mongo filter for the configuration dict parameters
+
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+
+        Returns: Mongo filter dictionary
+        """
+        mongo_filter = {}
+        for val in conf_dict['field_filter']:
+            values = conf_dict['filter_value'][val]
+            if len(values) > 0:
+                # If filtering by category, include children of parent categories as well
+                if val == 'Category':
+                    values = values + self.get_children_categories_list(values)
+                mongo_filter[val.lower()] = {'$in': list(values)}
+
+        start, stop = window_bounds(conf_dict['start_date'], conf_dict['end_date'])
+        return {'posted date': {'$gte': start.to_pydatetime(), '$lt': stop.to_pydatetime()}, **mongo_filter}
+
+    def _query_transactions(self, conf_dict):
+        """Query Mongo according to configuration dict parameters
 
-        transactions = pd.DataFrame(self.transactions_table.find({
-            'posted date': {
-                '$gte': datetime.strptime(conf_dict['start_date'], '%Y-%m-%d'),
-                '$lte': datetime.strptime(conf_dict['end_date'], '%Y-%m-%d')},
-            **mongo_filter}))
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+
+        Returns: Pandas Dataframe of transactions
+        """
+        transactions = pd.DataFrame(self.transactions_table.find(self._transactions_filter(conf_dict)))
         if len(transactions) == 0:
             transactions = EMPTY_TRANSACTION
 
         return transactions
 
+    def page_transactions(self, conf_dict, start_row, end_row, sort_model=None, filter_model=None):
+        """Get one block of rows of the transactions grid, with the grid's sorting and column filters done by the query
+
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+            start_row: Index of the first row of the block
+            end_row: Index after the last row of the block
+            sort_model: List of the sorted columns and their direction, from the grid's rows request
+            filter_model: Dictionary of each filtered column and its filter, from the grid's rows request
+
+        Returns: Pandas Dataframe of the block of transactions, and the number of transactions in all the blocks
+        """
+        mongo_filter = {**self._transactions_filter(conf_dict), **grid_filter_to_mongo(filter_model)}
+        total = self.transactions_table.count_documents(mongo_filter)
+        if total == 0:
+            return EMPTY_TRANSACTION, len(EMPTY_TRANSACTION)
+
+        # Break ties by id, so rows don't move between blocks
+        sort = grid_sort(sort_model)
+        if '_id' not in dict(sort):
+            sort.append(('_id', 1))
+        cursor = self.transactions_table.find(mongo_filter).sort(sort).skip(start_row).limit(end_row - start_row)
+        return pd.DataFrame(cursor), total
+
     def get_oldest_transaction(self):
         return list(self.transactions_table.find().sort({'posted date': 1}).limit(1))[0]['posted date'].date()
 
+    @invalidates_queries
     def edit_transaction(self, change_dict):
         """Update transaction based on edits in Transaction table"""
         change_dict[0]['data']['transaction date'] = datetime.strptime(change_dict[0]['data']['transaction date'], '%m-%d-%Y')
@@ -318,10 +536,17 @@ class MaintainDatabase:
         new_dict.pop('_id')
         old_dict = change_dict[0]['data'].copy()
         old_dict[change_dict[0]['colId']] = change_dict[0]['oldValue']
-        return self.transactions_table.update_one(old_dict, {'$set': new_dict})
+        self._update_edited_categories([old_dict], [new_dict])
+        result = self.transactions_table.update_one(old_dict, {'$set': new_dict})
+        if result.modified_count > 0:
+            self._update_materialized(removed=[old_dict], added=[new_dict])
+        return result
 
+    @invalidates_queries
     def edit_many_transactions(self, transaction_list):
         """Edit data for multiple transactions at one time"""
+        old_transactions = {trans['_id']: trans for trans in self.transactions_table.find({'_id': {'$in': [ObjectId(t['_id']) for t in transaction_list]}})}
+        new_transactions = []
         for new_trans in transaction_list:
             try:
                 new_trans['transaction date'] = datetime.strptime(new_trans['transaction date'], '%Y-%m-%d')
@@ -331,9 +556,14 @@ class MaintainDatabase:
                 new_trans['posted date'] = datetime.strptime(new_trans['posted date'], '%m-%d-%Y')
             tid = new_trans.pop('_id')
             self.transactions_table.update_one({'_id': ObjectId(tid)}, {'$set': new_trans})
+            new_transactions.append({**old_transactions.get(ObjectId(tid), {}), **new_trans})
+        self._update_edited_categories(old_transactions.values(), new_transactions)
+        self._update_materialized(removed=old_transactions.values(), added=new_transactions)
 
+    @invalidates_queries
     def delete_transaction(self, transaction_dict):
         """Delete a list of transactions from the Transactions table"""
+        removed = []
         for trans in transaction_dict:
             trans.pop('_id')
             try:
@@ -342,69 +572,60 @@ class MaintainDatabase:
             except TypeError:
                 # The date is already a datetime object
                 pass
-            self.transactions_table.delete_one(trans)
+            if self.transactions_table.delete_one(trans).deleted_count > 0:
+                removed.append(trans)
+        self._drop_descriptions({trans.get('account name') for trans in removed})
+        self._update_materialized(removed=removed)
 
     """====== Budget ======"""
     def add_budget_item(self, category, value):
         """Add new budget item in database with category and monthly value"""
-        existing = list(self.budget_table.find({'category': category}))
-        if len(existing) == 1:
+        snapshot = self.get_budget_snapshot()
+        if category in snapshot.values:
             self.budget_table.update_one({'category': category}, {"$set": {'value': value}})
+            snapshot.set(category, value)
         else:
-            parent = self.categories_table.find_one({'category name': category})
-            self.budget_table.insert_one({'category': category, 'value': value, 'is_parent': True if parent != '' else False})
+            is_parent = self.get_category_tree().is_parent(category)
+            self.budget_table.insert_one({'category': category, 'value': value, 'is_parent': is_parent})
+            snapshot.set(category, value, is_parent)
         self.update_parent_budget(category)
 
     def update_parent_budget(self, category):
         # Check if there's a parent budget, and if so, update it
-        try:
-            parent = self.categories_table.find_one({'category name': category})['parent']
-            if self.get_budget_amount(parent) != 0:
-                new_group_value = self.get_budget_amount(self.get_children_categories_list(parent))
-                self.budget_table.update_one({'category': parent}, {'$set': {'value': new_group_value}})
-        except IndexError:
-            pass
+        parent = self.get_category_tree().parent_of(category)
+        snapshot = self.get_budget_snapshot()
+        if parent and snapshot.amount(parent) != 0:
+            new_group_value = snapshot.amount(self.get_children_categories_list(parent))
+            self.budget_table.update_one({'category': parent}, {'$set': {'value': new_group_value}})
+            snapshot.set(parent, new_group_value)
+
+    def get_budget_snapshot(self):
+        """Get the budget items keyed by category, loading them the first time"""
+        if self.budget_snapshot is None:
+            self.budget_snapshot = BudgetSnapshot(self.budget_table.find())
+        return self.budget_snapshot
 
     def get_budget_dict(self):
         """Get dictionary of all positive and negative budget line items, along with all grouped budgets"""
-        pos_dict = {}
-        neg_dict = {}
-        grp_dict = {}
-        for item in self.budget_table.find():
-            try:
-                if item['is_parent']:
-                    grp_dict[item['category']] = item['value']
-                    continue
-            except KeyError:
-                pass
-            if item['value'] > 0:
-                pos_dict[item['category']] = item['value']
-            else:
-                neg_dict[item['category']] = item['value']
-        return pos_dict, neg_dict, grp_dict
+        return self.get_budget_snapshot().budget_dicts()
 
     def get_budget_amount(self, category):
-        if isinstance(category, str):
-            try:
-                return list(self.budget_table.find({'category': category}))[0]['value']
-            except IndexError:
-                return 0
-        elif isinstance(category, list):
-            budget_value = 0
-            for child_cat in category:
-                # Get the total budgeted amount for all child categories
-                budget_value += self.get_budget_amount(child_cat)
-            return budget_value
+        """Get the budget value of a category, or the total of a list of categories"""
+        return self.get_budget_snapshot().amount(category)
 
     def rm_budget_item(self, category, value):
         """Delete budget item in database"""
-        return self.budget_table.delete_one({'category': category, 'value': value})
+        result = self.budget_table.delete_one({'category': category, 'value': value})
+        if result.deleted_count > 0:
+            self.get_budget_snapshot().remove(category)
+        return result
 
     """====== Account ======"""
     def add_account(self, account_name, status='open', initial_balance=0):
         """Add new account in database with current status and beginning balance for net worth"""
         return self.accounts_table.insert_one({'account name': account_name, 'status': status, 'initial balance': initial_balance})
 
+    @invalidates_queries
     def edit_account(self, change_dict):
         """Update accounts (and transactions, if applicable) based on edits in Accounts table"""
         new_dict = change_dict['data']
@@ -413,8 +634,13 @@ class MaintainDatabase:
         old_dict[change_dict['colId']] = change_dict['oldValue']
         if old_dict['account name'] != change_dict['data']['account name']:
             self.transactions_table.update_many({'account name': old_dict['account name']}, {'$set': {'account name': new_dict['account name']}})
+            self._drop_descriptions([old_dict['account name'], new_dict['account name']])
+            self.distinct_values = None
+            self._save_balances(self.get_daily_balances().rename_account(old_dict['account name'], new_dict['account name']))
+            self._relabel_rollup(accounts={old_dict['account name']: new_dict['account name']})
         return self.accounts_table.update_one(old_dict, {'$set': new_dict})
 
+    @invalidates_queries
     def delete_account(self, row_data):
         """Delete account in database and all associated transactions"""
         rm_t = self.transactions_table.find({'account name': row_data['account name']})
@@ -423,10 +649,15 @@ class MaintainDatabase:
         return self.accounts_table.delete_one(row_data)
 
     """====== Category ======"""
+    @invalidates_queries
     def add_category(self, category_name, category_parent=None):
         """Add new category in database ... """
-        return self.categories_table.insert_one({'parent': category_parent, 'category name': category_name, 'hidden': False})
+        result = self.categories_table.insert_one({'parent': category_parent, 'category name': category_name, 'hidden': False})
+        self.category_tree = None
+        self._relabel_rollup()
+        return result
 
+    @invalidates_queries
     def edit_category(self, change_dict):
         """Update category data based on edits in Categories table"""
         new_dict = change_dict['data']
@@ -435,7 +666,12 @@ class MaintainDatabase:
         old_dict[change_dict['colId']] = change_dict['oldValue']
         if old_dict['category name'] != change_dict['data']['category name']:
             self.transactions_table.update_many({'category': old_dict['category name']}, {'$set': {'category': new_dict['category name']}})
-        return self.categories_table.update_one(old_dict, {'$set': new_dict})
+            self._relabel_descriptions({old_dict['category name']: new_dict['category name']})
+            self.distinct_values = None
+        result = self.categories_table.update_one(old_dict, {'$set': new_dict})
+        self.category_tree = None
+        self._relabel_rollup(categories={old_dict['category name']: new_dict['category name']})
+        return result
 
     def get_categories_list(self, extra=''):
         """Get list of all categories with an associated transaction
@@ -443,56 +679,219 @@ class MaintainDatabase:
         Parameter to add an additional "Add new category..." option
         """
         try:
-            cat_list = []
             if extra == 'new':
-                cat_list = list(self.transactions_table.find().distinct('category'))
+                cat_list = self.get_distinct_values().values('category')
                 cat_list.extend(['Add new category...'])
             elif extra == 'parent':
-                cat_list = list(self.transactions_table.find().distinct('category'))
-                parents = list(self.categories_table.find().distinct('parent'))
-                try:
-                    parents.remove('')
-                except ValueError:
-                    pass
-                cat_list.extend(parents)
-                # Remove NANs to allow for sorting strings
-                try:
-                    cat_list.remove(None)
-                except ValueError:
-                    pass
+                cat_list = self.get_distinct_values().values('category')
+                cat_list.extend(self.get_category_tree().parent_names())
                 cat_list = sorted(cat_list)
             elif extra == 'parent_only':
-                cat_list = list(self.categories_table.find().distinct('parent'))
-                cat_list.remove('')
-                cat_list = sorted(cat_list)
+                cat_list = self.get_category_tree().parent_names()
             else:
-                cat_list.extend(self.transactions_table.find().distinct('category'))
+                cat_list = self.get_distinct_values().values('category')
         except pymongo.errors.ServerSelectionTimeoutError as e:
             print(f"Pymongo Timeout Error: {e}")
             exit()
         return cat_list
 
+    def get_distinct_values(self):
+        """Get the distinct categories and accounts of the transactions, counting them the first time after a rename"""
+        if self.distinct_values is None:
+            self.distinct_values = DistinctValues(self._all_transactions())
+        return self.distinct_values
+
+    def get_dropdown_version(self):
+        """Get a version that changes whenever the category or account dropdown options would change"""
+        return f"{self.get_distinct_values().version}|{self.get_category_tree().version}"
+
+    def get_category_tree(self):
+        """Get the category hierarchy, loading it the first time after the categories changed"""
+        if self.category_tree is None:
+            self.category_tree = CategoryTree(self.categories_table.find())
+        return self.category_tree
+
     def get_children_categories_list(self, parent=None):
-        if isinstance(parent, list):
-            children = []
-            for par in parent:
-                children.extend([item['category name'] for item in list(self.categories_table.find({'parent': par}))])
-            return children
-        else:
-            return [item['category name'] for item in list(self.categories_table.find({'parent': parent}))]
+        return self.get_category_tree().children_of(parent)
+
+    def get_children_map(self):
+        """Get a dictionary of each parent category and the list of its children categories"""
+        return self.get_category_tree().children
 
     def get_hide_from_trends(self):
         """Get list of all categories hidden from trends"""
-        return [row['category name'] for row in self.categories_table.find({'hidden': True})]
+        return list(self.get_category_tree().hidden)
 
+    @invalidates_queries
     def delete_category(self, row_data):
         """Delete category in database"""
         self.transactions_table.update_many({'category': row_data['category name']}, {'$set': {'category': 'unknown'}})
+        self._relabel_descriptions({row_data['category name']: 'unknown'})
+        self.distinct_values = None
         # TODO add update to delete budget category
         if row_data['parent'] == '':
             row_data['parent'] = None
         row_data.pop('_id')
-        return self.categories_table.delete_one(row_data)
+        result = self.categories_table.delete_one(row_data)
+        self.category_tree = None
+        self._relabel_rollup(categories={row_data['category name']: 'unknown'})
+        return result
+
+    """====== Balances ======"""
+    def get_daily_balances(self):
+        """Get the materialized daily balances of each account, loading or building them the first time"""
+        if self.daily_balances is None:
+            self.daily_balances = self._load_balances()
+            if self.daily_balances is None:
+                self.rebuild_balances()
+        return self.daily_balances
+
+    def _all_transactions(self):
+        """Get the columns of all the transactions needed to compute the balances and rollup"""
+        return pd.DataFrame(list(self.transactions_table.find({}, ['account name', 'posted date', 'amount', 'notes', 'category'])))
+
+    def _load_balances(self):
+        """Load the stored daily balances, or None if there aren't any"""
+        stored = pd.DataFrame(list(self.balances_table.find({}, BALANCE_COLUMNS)))
+        if len(stored) == 0:
+            return None
+        return DailyBalances(stored)
+
+    def _save_balances(self, changed):
+        """Rewrite the stored balances of each changed account from its first changed day forward"""
+        for account, rows in changed.items():
+            if rows is None:
+                self.balances_table.delete_many({'account name': account})
+                continue
+            first_day, new_rows = rows
+            self.balances_table.delete_many({'account name': account, 'posted date': {'$gte': first_day}})
+            if len(new_rows) > 0:
+                self.balances_table.insert_many(new_rows.to_dict('records'))
+
+    def _save_all_balances(self):
+        """Replace all the stored balances"""
+        self.balances_table.delete_many({})
+        if not self.daily_balances.empty:
+            self.balances_table.insert_many(self.daily_balances.table.to_dict('records'))
+
+    def _update_materialized(self, removed=(), added=()):
+        """Apply removed and added transactions to the daily balances, from their posted days forward, and the rollup"""
+        removed = removed if isinstance(removed, pd.DataFrame) else list(removed)
+        added = added if isinstance(added, pd.DataFrame) else list(added)
+        if self.distinct_values is not None:
+            self.distinct_values.update(removed=removed, added=added)
+        # If there is nothing stored yet, build from the transactions, which already include this change
+        if self.daily_balances is None:
+            self.daily_balances = self._load_balances()
+        if self.daily_balances is None:
+            self.rebuild_balances()
+        else:
+            changes = balance_changes(added).sub(balance_changes(removed), fill_value=0)
+            self._save_balances(self.daily_balances.apply(changes))
+        self._update_rollup(removed, added)
+
+    def rebuild_balances(self):
+        """Compute the daily balances from all the transactions and replace the stored balances"""
+        self.daily_balances = DailyBalances.build(self._all_transactions())
+        self._save_all_balances()
+
+    def verify_balances(self, rebuild=False):
+        """Check the materialized daily balances against balances computed from all the transactions
+
+        Args:
+            rebuild: Replace the materialized balances if they don't match
+
+        Returns: List of the account, day, materialized balance, and computed balance of each mismatch
+        """
+        computed = DailyBalances.build(self._all_transactions())
+        mismatches = self.get_daily_balances().compare(computed)
+        for account, day, stored, expected in mismatches:
+            print(f"{account} on {day:%Y-%m-%d}: stored ${stored:,.2f}, computed ${expected:,.2f}")
+        print(f"{len(mismatches)} daily balances do not match the transactions")
+        if rebuild and len(mismatches) > 0:
+            self.daily_balances = computed
+            self._save_all_balances()
+            print('Rebuilt the daily balances')
+        return mismatches
+
+    """====== Rollup ======"""
+    def get_rollup(self):
+        """Get the materialized month, category, and account rollup of the transactions, loading or building it the first time"""
+        if self.rollup is None:
+            self.rollup = self._load_rollup()
+            if self.rollup is None:
+                self.rebuild_rollup()
+        return self.rollup
+
+    def _update_rollup(self, removed, added):
+        """Apply removed and added transactions to the rollup, building it if there isn't one stored yet"""
+        if self.rollup is None:
+            self.rollup = self._load_rollup()
+        if self.rollup is None:
+            self.rebuild_rollup()
+        else:
+            parents = self._category_parents()
+            self._save_rollup(self.rollup.apply(rollup_cells(added, parents), rollup_cells(removed, parents)))
+
+    def _category_parents(self):
+        """Get a dictionary of each category and its parent category"""
+        return self.get_category_tree().parents
+
+    def _load_rollup(self):
+        """Load the stored rollup, or None if there isn't one"""
+        stored = pd.DataFrame(list(self.rollup_table.find({}, {'_id': 0})))
+        if len(stored) == 0:
+            return None
+        return Rollup(stored)
+
+    def _save_rollup(self, changed):
+        """Write the changed rollup cells, removing the ones with no transactions left"""
+        requests = []
+        for cell in changed.reset_index().to_dict('records'):
+            cell_filter = {dim: cell[dim] for dim in ROLLUP_DIMENSIONS}
+            if cell['count'] == 0:
+                requests.append(pymongo.DeleteOne(cell_filter))
+            else:
+                requests.append(pymongo.ReplaceOne(cell_filter, cell, upsert=True))
+        if len(requests) > 0:
+            self.rollup_table.bulk_write(requests, ordered=False)
+
+    def _save_all_rollup(self):
+        """Replace the whole stored rollup"""
+        self.rollup_table.delete_many({})
+        if len(self.rollup.cells) > 0:
+            self.rollup_table.insert_many(self.rollup.table.to_dict('records'))
+
+    def _relabel_rollup(self, categories=None, accounts=None):
+        """Update the rollup after categories or accounts were renamed, or the parent categories changed"""
+        self._save_rollup(self.get_rollup().relabel(self._category_parents(), categories=categories, accounts=accounts))
+
+    def rebuild_rollup(self):
+        """Compute the rollup from all the transactions and replace the stored rollup"""
+        self.rollup = Rollup.build(self._all_transactions(), self._category_parents())
+        self._save_all_rollup()
+
+    def summarize_transactions(self, conf_dict):
+        """Get the income and spending of each category and account in the time window of the configuration parameters
+
+        The whole months of the window come from the rollup, and only the partial months at the edges are queried.
+        Filtered views are summarized from the queried transactions, so they match query_transactions.
+
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+
+        Returns: Dataframe indexed by category, parent category, and account name, with the income and spending sums and counts
+        """
+        parents = self._category_parents()
+        months, edges = full_months(conf_dict['start_date'], conf_dict['end_date'])
+        if months is None or any(len(values) > 0 for values in conf_dict['filter_value'].values()):
+            return summarize_cells(rollup_cells(self.query_transactions(conf_dict), parents))
+
+        summaries = [self.get_rollup().summarize(*months)]
+        for edge_start, edge_end in edges:
+            edge_config = {**conf_dict, 'start_date': edge_start.strftime('%Y-%m-%d'), 'end_date': edge_end.strftime('%Y-%m-%d')}
+            summaries.append(summarize_cells(rollup_cells(self.query_transactions(edge_config), parents)))
+        return combine_summaries(summaries)
 
     """====== Overall ======"""
     def export_data_to_csv(self, root=None):
@@ -507,6 +906,7 @@ class MaintainDatabase:
             this_data.to_csv(os.path.join(root, coll.name + '.csv'), index=False)
         return root
 
+    @invalidates_queries
     def import_data_from_csv(self):
         """Import CSV data into a new database"""
         for coll in [self.transactions_table, self.budget_table, self.accounts_table, self.categories_table]:
@@ -515,8 +915,29 @@ class MaintainDatabase:
                     if file_name[:-4] == coll.name:
                         df = pd.read_csv(file_name)
                         coll.insert_many(df.to_dict('records'))
+        self._drop_descriptions()
+        self.category_tree = None
+        self.budget_snapshot = None
+        self.distinct_values = None
+        self.rebuild_balances()
+        self.rebuild_rollup()
+
+
+def _plan_stages(plan):
+    """Flatten a query plan from explain into a list of its stages, with the index name of any index scans"""
+    stages = []
+    while plan is not None:
+        if 'stage' in plan:
+            stages.append(f"{plan['stage']}({plan['indexName']})" if 'indexName' in plan else plan['stage'])
+        plan = plan.get('inputStage', plan.get('queryPlan'))
+    return stages
 
 
 if __name__ == '__main__':
     md = MaintainDatabase()
-    md.export_data_to_csv()
+    if len(sys.argv) > 1 and sys.argv[1] == 'explain':
+        md.explain_queries()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'verify-balances':
+        md.verify_balances(rebuild='--rebuild' in sys.argv)
+    else:
+        md.export_data_to_csv()
@@ -0,0 +1,501 @@
+from bson.objectid import ObjectId
+from datetime import datetime
+from dotenv import load_dotenv
+from functools import wraps
+import numpy as np
+import os
+import pandas as pd
+from pymongo.errors import BulkWriteError
+import re
+import sqlite3
+import sys
+from threading import RLock
+import uuid
+
+from components.maintain_database import (MaintainDatabase, TRANSACTIONS_CLIENT, BUDGET_CLIENT, ACCOUNTS_CLIENT, CATEGORIES_CLIENT,
+                                          BALANCES_CLIENT, ROLLUP_CLIENT, DESCRIPTIONS_CLIENT, DUPLICATE_KEY_ERROR)
+from components.maintain_transactions_csv import MaintainCSV, TABLES
+from components.rollup import ROLLUP_DIMENSIONS, ROLLUP_MEASURES, Rollup, empty_summary
+
+# Declared column types of each table. Columns of any other field are added the first time it's written
+TABLE_COLUMNS = {
+    TRANSACTIONS_CLIENT: {'transaction date': 'TIMESTAMP', 'posted date': 'TIMESTAMP', 'category': 'TEXT', 'description': 'TEXT',
+                          'amount': 'REAL', 'original description': 'TEXT', 'account name': 'TEXT', 'notes': 'TEXT', 'fingerprint': 'TEXT'},
+    BUDGET_CLIENT: {'category': 'TEXT', 'value': 'REAL', 'is_parent': 'BOOLEAN'},
+    ACCOUNTS_CLIENT: {'account name': 'TEXT', 'status': 'TEXT', 'initial balance': 'REAL'},
+    CATEGORIES_CLIENT: {'parent': 'TEXT', 'category name': 'TEXT', 'hidden': 'BOOLEAN'},
+    BALANCES_CLIENT: {'account name': 'TEXT', 'posted date': 'TIMESTAMP', 'balance': 'REAL'},
+    DESCRIPTIONS_CLIENT: {'account name': 'TEXT', 'original description': 'TEXT', 'category': 'TEXT', 'posted date': 'TIMESTAMP'},
+}
+COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+# Selected columns of the rollup measures, in the order of ROLLUP_MEASURES, summed over each group of transactions
+MEASURES_SQL = ('SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END), SUM(amount > 0), '
+                'SUM(CASE WHEN amount < 0 THEN amount ELSE 0 END), SUM(amount < 0), COUNT(*)')
+
+
+def _object_id(value):
+    """Read ids as ObjectIds like Mongo, unless they were imported from CSV data with another kind of id"""
+    value = value.decode()
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(pd.Timestamp, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(ObjectId, str)
+sqlite3.register_adapter(uuid.UUID, str)
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.float64, float)
+sqlite3.register_adapter(np.bool_, bool)
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()) if value else None)
+sqlite3.register_converter('BOOLEAN', lambda value: bool(int(value)))
+sqlite3.register_converter('OBJECTID', _object_id)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _regex(pattern, options=''):
+    """Get a pattern for the REGEXP function, with Mongo's case insensitive option"""
+    if isinstance(pattern, re.Pattern):
+        options = 'i' if pattern.flags & re.IGNORECASE else ''
+        pattern = pattern.pattern
+    return f"(?i){pattern}" if 'i' in options else pattern
+
+
+def _regexp(pattern, value):
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+class Result:
+    """Counts of a write, like a pymongo result"""
+    def __init__(self, inserted_id=None, matched_count=0, modified_count=0, deleted_count=0):
+        self.inserted_id = inserted_id
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+
+
+class SQLiteCursor:
+    """Query of a SQLite table that can be sorted, skipped, and limited like a pymongo cursor before it's read"""
+    def __init__(self, table, value_filter=None, projection=None):
+        self.table = table
+        self.value_filter = value_filter
+        self.projection = projection
+        self.order = []
+        self.offset = 0
+        self.count = -1
+
+    def sort(self, key_or_list, direction=None):
+        if isinstance(key_or_list, str):
+            key_or_list = [(key_or_list, direction or 1)]
+        elif isinstance(key_or_list, dict):
+            key_or_list = list(key_or_list.items())
+        self.order = list(key_or_list)
+        return self
+
+    def skip(self, offset):
+        self.offset = offset
+        return self
+
+    def limit(self, count):
+        self.count = count if count > 0 else -1
+        return self
+
+    def __iter__(self):
+        columns = self.table.projected_columns(self.projection)
+        where, params = self.table.where_clause(self.value_filter)
+        order = [f"{_quote(key)} {'DESC' if direction == -1 else 'ASC'}" for key, direction in self.order if key in self.table.columns]
+        sql = f"SELECT {', '.join(map(_quote, columns))} FROM {_quote(self.table.name)} WHERE {where}"
+        if len(order) > 0:
+            sql += f" ORDER BY {', '.join(order)}"
+        sql += f" LIMIT {int(self.count)} OFFSET {int(self.offset)}"
+        rows = self.table.execute(sql, params)
+        return iter([{col: val for col, val in zip(columns, row) if val is not None} for row in rows])
+
+
+class SQLiteTable:
+    """SQLite table with the subset of the pymongo collection interface that MaintainDatabase uses
+
+    Mongo filters are translated to SQL, so date ranges, '$in' lists, and the transactions grid's filters use the table's indexes.
+
+    Args:
+        database: MaintainSQLite that owns the connection
+        name: Name of the table
+        columns: Dictionary of the declared columns and their types
+    """
+    def __init__(self, database, name, columns):
+        self.database = database
+        self.name = name
+        self.columns = {'_id': 'OBJECTID', **columns}
+        existing = {row[1] for row in self.execute(f"PRAGMA table_info({_quote(name)})")}
+        if len(existing) == 0:
+            definitions = [f"{_quote(col)} {kind}{' PRIMARY KEY' if col == '_id' else ''}" for col, kind in self.columns.items()]
+            self.execute(f"CREATE TABLE {_quote(name)} ({', '.join(definitions)})")
+        else:
+            self.columns.update({col: '' for col in existing if col not in self.columns})
+            for col in self.columns:
+                if col not in existing:
+                    self.execute(f"ALTER TABLE {_quote(name)} ADD COLUMN {_quote(col)} {self.columns[col]}")
+
+    def execute(self, sql, params=()):
+        """Run a statement and fetch its rows, both while holding the connection's lock"""
+        with self.database.lock:
+            return self.database.connection.execute(sql, params).fetchall()
+
+    def execute_count(self, sql, params=()):
+        """Run a statement and get the number of rows it changed"""
+        with self.database.lock:
+            return self.database.connection.execute(sql, params).rowcount
+
+    def _stored_value(self, column, value):
+        """Store blank and missing dates as NULL, since only dates can be read back from a TIMESTAMP column"""
+        if self.columns.get(column) == 'TIMESTAMP' and (value is pd.NaT or (isinstance(value, str) and value.strip() == '')):
+            return None
+        return value
+
+    def _add_columns(self, documents):
+        for doc in documents:
+            for col in doc:
+                if col not in self.columns:
+                    self.columns[col] = ''
+                    self.execute(f"ALTER TABLE {_quote(self.name)} ADD COLUMN {_quote(col)}")
+
+    def projected_columns(self, projection=None):
+        if projection is None:
+            return list(self.columns)
+        if isinstance(projection, dict) and not any(projection.values()):
+            return [col for col in self.columns if col not in projection]
+        fields = [col for col, keep in projection.items() if keep] if isinstance(projection, dict) else list(projection)
+        return ['_id'] + [col for col in fields if col in self.columns and col != '_id']
+
+    def _condition(self, field, condition):
+        """Translate the condition on one field to SQL"""
+        if field not in self.columns:  # Like a missing field in Mongo, which only matches null
+            column = 'NULL'
+        else:
+            column = _quote(field)
+        if isinstance(condition, re.Pattern):
+            return f"{column} REGEXP ?", [_regex(condition)]
+        if not isinstance(condition, dict):
+            return (f"{column} IS NULL", []) if condition is None else (f"{column} = ?", [condition])
+
+        clauses, params = [], []
+        for op, value in condition.items():
+            if op == '$eq':
+                clause, values = self._condition(field, value)
+            elif op == '$ne':
+                clause, values = f"{column} IS NOT ?", [value]
+            elif op in COMPARISONS:
+                clause, values = f"{column} {COMPARISONS[op]} ?", [value]
+            elif op in ['$in', '$nin']:
+                values = [val for val in value if val is not None]
+                clause = f"{column} IN ({', '.join('?' * len(values))})" if len(values) > 0 else '0'
+                clause = f"({clause} OR {column} IS NULL)" if None in value else clause
+                clause = f"NOT COALESCE({clause}, 0)" if op == '$nin' else clause
+            elif op == '$regex':
+                clause, values = f"{column} REGEXP ?", [_regex(value, condition.get('$options', ''))]
+            elif op == '$options':
+                continue
+            elif op == '$not':
+                clause, values = self._condition(field, value)
+                clause = f"NOT COALESCE({clause}, 0)"
+            else:
+                raise ValueError(f"Unsupported filter operator {op}")
+            clauses.append(clause)
+            params.extend(values)
+        return ' AND '.join(f"({clause})" for clause in clauses) or '1', params
+
+    def where_clause(self, value_filter=None):
+        """Translate a Mongo filter to a SQL condition and its parameters"""
+        clauses, params = [], []
+        for field, condition in (value_filter or {}).items():
+            if field in ['$and', '$or']:
+                parts = [self.where_clause(sub_filter) for sub_filter in condition]
+                joiner = ' AND ' if field == '$and' else ' OR '
+                clause = joiner.join(f"({part})" for part, _ in parts) or ('1' if field == '$and' else '0')
+                values = [val for _, part_params in parts for val in part_params]
+            else:
+                clause, values = self._condition(field, condition)
+            clauses.append(clause)
+            params.extend(values)
+        return ' AND '.join(f"({clause})" for clause in clauses) or '1', params
+
+    def find(self, value_filter=None, projection=None):
+        return SQLiteCursor(self, value_filter, projection)
+
+    def count_documents(self, value_filter):
+        where, params = self.where_clause(value_filter)
+        return self.execute(f"SELECT COUNT(*) FROM {_quote(self.name)} WHERE {where}", params)[0][0]
+
+    def distinct(self, field):
+        if field not in self.columns:
+            return []
+        return [row[0] for row in self.execute(f"SELECT DISTINCT {_quote(field)} FROM {_quote(self.name)} WHERE {_quote(field)} IS NOT NULL")]
+
+    def _insert_sql(self, columns):
+        return f"INSERT INTO {_quote(self.name)} ({', '.join(map(_quote, columns))}) VALUES ({', '.join('?' * len(columns))})"
+
+    def insert_one(self, document):
+        """Insert a document, giving it an id like Mongo if it doesn't have one"""
+        document.setdefault('_id', ObjectId())
+        self._add_columns([document])
+        self.execute(self._insert_sql(list(document)), [self._stored_value(col, value) for col, value in document.items()])
+        return Result(inserted_id=document['_id'])
+
+    def insert_many(self, documents, ordered=True):
+        """Insert documents in one statement, or one by one to find the ones a unique index rejects"""
+        documents = list(documents)
+        for doc in documents:
+            doc.setdefault('_id', ObjectId())
+        self._add_columns(documents)
+        columns = list(self.columns)
+        rows = [[self._stored_value(col, doc.get(col)) for col in columns] for doc in documents]
+        with self.database.lock:
+            self.execute("SAVEPOINT insert_many")
+            try:
+                self.database.connection.executemany(self._insert_sql(columns), rows)
+                self.execute("RELEASE insert_many")
+                return Result()
+            except sqlite3.IntegrityError:
+                self.execute("ROLLBACK TO insert_many")
+
+            errors = []
+            for i, row in enumerate(rows):
+                try:
+                    self.execute(self._insert_sql(columns), row)
+                except sqlite3.IntegrityError as e:
+                    errors.append({'index': i, 'code': DUPLICATE_KEY_ERROR, 'errmsg': str(e)})
+                    if ordered:
+                        break
+            self.execute("RELEASE insert_many")
+        raise BulkWriteError({'writeErrors': errors, 'nInserted': len(rows) - len(errors)})
+
+    def _update(self, value_filter, update, limit_one):
+        changes = update.get('$set', {})
+        if len(changes) == 0:
+            return Result()
+        self._add_columns([changes])
+        where, params = self.where_clause(value_filter)
+        if limit_one:
+            where = f"rowid = (SELECT rowid FROM {_quote(self.name)} WHERE {where} LIMIT 1)"
+        assignments = ', '.join(f"{_quote(col)} = ?" for col in changes)
+        values = [self._stored_value(col, value) for col, value in changes.items()]
+        count = self.execute_count(f"UPDATE {_quote(self.name)} SET {assignments} WHERE {where}", values + params)
+        return Result(matched_count=count, modified_count=count)
+
+    def update_one(self, value_filter, update):
+        return self._update(value_filter, update, limit_one=True)
+
+    def update_many(self, value_filter, update):
+        return self._update(value_filter, update, limit_one=False)
+
+    def _delete(self, value_filter, limit_one):
+        where, params = self.where_clause(value_filter)
+        if limit_one:
+            where = f"rowid = (SELECT rowid FROM {_quote(self.name)} WHERE {where} LIMIT 1)"
+        return Result(deleted_count=self.execute_count(f"DELETE FROM {_quote(self.name)} WHERE {where}", params))
+
+    def delete_one(self, value_filter):
+        return self._delete(value_filter, limit_one=True)
+
+    def delete_many(self, value_filter):
+        return self._delete(value_filter, limit_one=False)
+
+    def index_information(self):
+        return {row[1]: {} for row in self.execute(f"PRAGMA index_list({_quote(self.name)})")}
+
+    def create_index(self, keys, name, unique=False, partialFilterExpression=None):
+        """Create an index from a Mongo index specification, with a partial filter on the fields that aren't null"""
+        self._add_columns([{key: None for key, _ in keys}])
+        columns = ', '.join(f"{_quote(key)} {'DESC' if direction == -1 else 'ASC'}" for key, direction in keys)
+        where = ''
+        if partialFilterExpression:
+            where = ' WHERE ' + ' AND '.join(f"{_quote(key)} IS NOT NULL" for key in partialFilterExpression)
+        self.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {_quote(name)} ON {_quote(self.name)} ({columns}){where}")
+
+
+def _transactional(method):
+    """Run a method in one SQLite transaction, so all its writes are committed together or not at all"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            if self.in_transaction:
+                return method(self, *args, **kwargs)
+            self.in_transaction = True
+            self.connection.execute('BEGIN')
+            try:
+                result = method(self, *args, **kwargs)
+                self.connection.execute('COMMIT')
+                return result
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                self._clear_cached()
+                raise
+            finally:
+                self.in_transaction = False
+    return wrapper
+
+
+class MaintainSQLite(MaintainDatabase):
+    """Data stored in a local SQLite database, using the Mongo code with the collections replaced by SQLite tables"""
+    def __init__(self, path=None):
+        self.path = path
+        self.connection = None
+        self.lock = RLock()
+        self.in_transaction = False
+        super().__init__()
+
+    def load_initial_data(self):
+        load_dotenv()
+        if self.path is None:
+            self.path = os.getenv("SQLITE_PATH")
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Transactions are started explicitly, one per change
+        self.connection = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None, check_same_thread=False)
+        self.connection.create_function('REGEXP', 2, _regexp, deterministic=True)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.transactions_table = SQLiteTable(self, TRANSACTIONS_CLIENT, TABLE_COLUMNS[TRANSACTIONS_CLIENT])
+        self.budget_table = SQLiteTable(self, BUDGET_CLIENT, TABLE_COLUMNS[BUDGET_CLIENT])
+        self.accounts_table = SQLiteTable(self, ACCOUNTS_CLIENT, TABLE_COLUMNS[ACCOUNTS_CLIENT])
+        self.categories_table = SQLiteTable(self, CATEGORIES_CLIENT, TABLE_COLUMNS[CATEGORIES_CLIENT])
+        self.balances_table = SQLiteTable(self, BALANCES_CLIENT, TABLE_COLUMNS[BALANCES_CLIENT])
+        # Summaries are grouped by SQLite, so the rollup isn't stored. Drop the one stored by earlier versions
+        self.connection.execute(f"DROP TABLE IF EXISTS {_quote(ROLLUP_CLIENT)}")
+        self.descriptions_table = SQLiteTable(self, DESCRIPTIONS_CLIENT, TABLE_COLUMNS[DESCRIPTIONS_CLIENT])
+        self.create_indexes()
+
+    def _clear_cached(self):
+        """Forget the data kept in memory after a rolled back change, so it's loaded again from the database"""
+        self.daily_balances = None
+        self.rollup = None
+        self.category_tree = None
+        self.budget_snapshot = None
+        self.distinct_values = None
+        self.autocategories = {}
+        self.query_cache.clear()
+
+    def explain_queries(self):
+        """Print how SQLite runs the common queries, to check that they use an index instead of a table scan
+
+        Returns: Dictionary of each query name and the steps of its plan
+        """
+        now = datetime.now()
+        queries = {
+            'transactions in date range': (self.transactions_table, {'posted date': {'$gte': now, '$lte': now}}, ''),
+            'oldest transaction': (self.transactions_table, {}, ' ORDER BY "posted date" LIMIT 1'),
+            'duplicate candidates': (self.transactions_table, {'account name': {'$in': ['']}, 'amount': 0,
+                                                               'posted date': {'$gte': now, '$lte': now}}, ''),
+            'transactions in category': (self.transactions_table, {'category': ''}, ''),
+            'transactions in account': (self.transactions_table, {'account name': ''}, ''),
+            'children categories': (self.categories_table, {'parent': ''}, ''),
+        }
+        plans = {}
+        for name, (table, query, suffix) in queries.items():
+            where, params = table.where_clause(query)
+            rows = table.execute(f"EXPLAIN QUERY PLAN SELECT * FROM {_quote(table.name)} WHERE {where}{suffix}", params)
+            plans[name] = [row[-1] for row in rows]
+            scan = any(step.startswith('SCAN') and 'INDEX' not in step for step in plans[name])
+            print(f"{name}: {' <- '.join(plans[name])}{'  (TABLE SCAN)' if scan else ''}")
+        return plans
+
+    def _description_records(self, account):
+        """Get each original description of the account's transactions with the category of its most recent transaction"""
+        # SQLite takes the category from the row with the latest posted date of each group
+        rows = self.transactions_table.execute(
+            'SELECT "original description", MAX("posted date"), category FROM transactions WHERE "account name" = ? GROUP BY "original description"',
+            [account])
+        return [{'original description': desc, 'category': cat, 'posted date': pd.Timestamp(posted)} for desc, posted, cat in rows]
+
+    def get_rollup(self):
+        """Group the transactions by month, category, and account in SQLite, since the rollup isn't kept up to date"""
+        rows = self.transactions_table.execute(
+            'SELECT strftime(\'%Y-%m-01\', "posted date"), COALESCE(category, \'\'), COALESCE("account name", \'\'), '
+            f'{MEASURES_SQL} FROM transactions WHERE "posted date" IS NOT NULL GROUP BY 1, 2, 3')
+        cells = pd.DataFrame(rows, columns=['month', 'category', 'account name'] + ROLLUP_MEASURES)
+        cells['parent'] = cells['category'].map(self._category_parents()).fillna('')
+        return Rollup(cells)
+
+    def _update_rollup(self, removed, added):
+        pass
+
+    def _relabel_rollup(self, categories=None, accounts=None):
+        pass
+
+    def rebuild_rollup(self):
+        pass
+
+    def summarize_transactions(self, conf_dict):
+        """Get the income and spending of each category and account in the time window of the configuration parameters
+
+        The sums and counts are grouped by SQLite over the indexed date range, with the same filters as query_transactions.
+
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+
+        Returns: Dataframe indexed by category, parent category, and account name, with the income and spending sums and counts
+        """
+        where, params = self.transactions_table.where_clause(self._transactions_filter(conf_dict))
+        rows = self.transactions_table.execute(
+            f'SELECT COALESCE(category, \'\'), COALESCE("account name", \'\'), {MEASURES_SQL} '
+            f'FROM transactions WHERE {where} GROUP BY 1, 2', params)
+        if len(rows) == 0:
+            return empty_summary()
+        cells = pd.DataFrame(rows, columns=['category', 'account name'] + ROLLUP_MEASURES)
+        cells['parent'] = cells['category'].map(self._category_parents()).fillna('')
+        return cells.groupby(ROLLUP_DIMENSIONS[1:])[ROLLUP_MEASURES].sum().astype(float)
+
+    # Commit each change in one transaction
+    load_transactions = _transactional(MaintainDatabase.load_transactions)
+    add_one_transaction = _transactional(MaintainDatabase.add_one_transaction)
+    edit_transaction = _transactional(MaintainDatabase.edit_transaction)
+    edit_many_transactions = _transactional(MaintainDatabase.edit_many_transactions)
+    delete_transaction = _transactional(MaintainDatabase.delete_transaction)
+    add_budget_item = _transactional(MaintainDatabase.add_budget_item)
+    rm_budget_item = _transactional(MaintainDatabase.rm_budget_item)
+    add_account = _transactional(MaintainDatabase.add_account)
+    edit_account = _transactional(MaintainDatabase.edit_account)
+    delete_account = _transactional(MaintainDatabase.delete_account)
+    add_category = _transactional(MaintainDatabase.add_category)
+    edit_category = _transactional(MaintainDatabase.edit_category)
+    delete_category = _transactional(MaintainDatabase.delete_category)
+    import_data_from_csv = _transactional(MaintainDatabase.import_data_from_csv)
+    rebuild_balances = _transactional(MaintainDatabase.rebuild_balances)
+
+
+def convert_csv_data(csv_dir, sqlite_path):
+    """Copy the CSV data files, including any logged changes, into a SQLite database
+
+    Args:
+        csv_dir: Directory of the CSV data
+        sqlite_path: Path of the SQLite database file
+
+    Returns: Path of the SQLite database file
+    """
+    csv_data = MaintainCSV(csv_dir, read_only=True)  # The CSV files are left as they are
+    md = MaintainSQLite(sqlite_path)
+    with md.lock:
+        md.connection.execute('BEGIN')
+        for name in TABLES:
+            table = getattr(csv_data, f"{name}_table")
+            table = table[table['_id'].astype(str) != 'None'] if '_id' in table.columns else table  # Placeholder row of an empty table
+            if len(table) > 0:
+                getattr(md, f"{name}_table").insert_many(table.astype(object).where(table.notna(), None).to_dict('records'))
+        md.connection.execute('COMMIT')
+    md.rebuild_balances()
+    return sqlite_path
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == 'convert':
+        print(f"Saved SQLite database to {convert_csv_data(sys.argv[2], sys.argv[3])}")
+        sys.exit()
+    md = MaintainSQLite()
+    if len(sys.argv) > 1 and sys.argv[1] == 'explain':
+        md.explain_queries()
+    elif len(sys.argv) > 1 and sys.argv[1] == 'verify-balances':
+        md.verify_balances(rebuild='--rebuild' in sys.argv)
+    else:
+        md.export_data_to_csv()
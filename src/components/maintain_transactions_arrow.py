@@ -0,0 +1,107 @@
+import numpy as np
+import os
+import sys
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from components.maintain_transactions_csv import MaintainCSV, TABLES
+from components.transaction_partitions import TransactionPartitions
+
+# Fixed column types of the stored tables. Category and account name are stored dictionary encoded, and read back as strings
+TABLE_SCHEMAS = {
+    'transactions': {'posted date': 'datetime64[ns]', 'transaction date': 'datetime64[ns]', 'amount': 'float64',
+                     'category': 'category', 'account name': 'category', '_id': 'string', 'description': 'string',
+                     'original description': 'string', 'notes': 'string'},
+    'balances': {'account name': 'category', 'posted date': 'datetime64[ns]', 'balance': 'float64'},
+    'rollup': {'month': 'datetime64[ns]', 'category': 'category', 'parent': 'category', 'account name': 'category'},
+    'budget': {'category': 'string', 'value': 'float64', 'is_parent': 'boolean', '_id': 'string'},
+    'accounts': {'account name': 'string', 'initial balance': 'float64', '_id': 'string'},
+    'categories': {'category name': 'string', 'parent': 'string', 'hidden': 'boolean', '_id': 'string'},
+}
+
+
+def _arrow_frame(df, schema):
+    """Convert a table to its fixed column types, and any other column of mixed objects to strings"""
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if schema.get(col) == 'boolean':
+            df[col] = df[col].where(df[col] != '', None).astype('boolean')  # Empty when read from the categories CSV
+        elif schema.get(col) == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')  # Missing amounts may be filled with ''
+        elif col in schema:
+            df[col] = df[col].astype(schema[col])
+        elif df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) != 'boolean':
+            df[col] = df[col].astype('string')
+    return df
+
+
+def write_arrow(df, path, schema):
+    """Write a table as an uncompressed Feather file, so it can be memory mapped, replacing the old file atomically"""
+    temp_path = path + '.tmp'
+    feather.write_feather(_arrow_frame(df, schema), temp_path, compression='uncompressed')
+    os.replace(temp_path, path)
+
+
+def read_arrow(path):
+    """Read a Feather file through a memory map, with the string, category, and boolean columns as objects like the CSV data"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    table = feather.read_table(path, memory_map=True)
+    # Decode the dictionary columns in Arrow, which is faster than making categoricals and converting them
+    table = table.cast(pa.schema([pa.field(field.name, pa.string()) if pa.types.is_dictionary(field.type) else field for field in table.schema]))
+    df = table.to_pandas(ignore_metadata=True)
+    for col in df.columns:
+        if df[col].dtype == object and table.column(col).null_count > 0:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+class MaintainArrow(MaintainCSV):
+    """Local data stored as Arrow Feather files with fixed column types, so loading doesn't parse text or dates
+
+    Changes are logged and written the same way as the CSV data.
+    """
+    file_extension = '.feather'
+
+    def load_initial_data(self):
+        if self.data_dir is None:
+            self.data_dir = os.getenv("ARROW_DIR")
+        super().load_initial_data()
+
+    def _read_file(self, path):
+        return read_arrow(path)
+
+    def _write_file(self, df, path, name):
+        write_arrow(df, path, TABLE_SCHEMAS.get(name, {}))
+
+
+def convert_csv_data(csv_dir, arrow_dir):
+    """Convert the CSV data files, including any logged changes, to Feather files
+
+    Args:
+        csv_dir: Directory of the CSV data
+        arrow_dir: Directory to save the Feather files in
+
+    Returns: Directory of the Feather files
+    """
+    csv_data = MaintainCSV(csv_dir, read_only=True)  # The CSV files are left as they are
+    os.makedirs(arrow_dir, exist_ok=True)
+    tables = {name: getattr(csv_data, f"{name}_table") for name in TABLES}
+    tables['balances'] = csv_data.get_daily_balances().table
+    tables['rollup'] = csv_data.get_rollup().table
+    for name, table in tables.items():
+        if name == 'transactions':
+            partitions = TransactionPartitions(os.path.join(arrow_dir, name), MaintainArrow.file_extension, read_arrow,
+                                               lambda df, path: write_arrow(df, path, TABLE_SCHEMAS['transactions']))
+            partitions.save(table[table['_id'].astype(str) != 'None'])
+        elif len(table) > 0:
+            write_arrow(table, os.path.join(arrow_dir, name + MaintainArrow.file_extension), TABLE_SCHEMAS.get(name, {}))
+    return arrow_dir
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 and sys.argv[1] == 'convert':
+        print(f"Saved Feather files to {convert_csv_data(sys.argv[2], sys.argv[3])}")
+    elif len(sys.argv) > 1 and sys.argv[1] == 'verify-balances':
+        MaintainArrow().verify_balances(rebuild='--rebuild' in sys.argv)
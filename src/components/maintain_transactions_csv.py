@@ -1,37 +1,80 @@
 from datetime import datetime
 from dotenv import load_dotenv
+from functools import wraps
 import numpy as np
 import os
 import sys
 import pandas as pd
+from threading import Lock, RLock, Thread, Timer
 import uuid
 
-from components.maintain_database import MaintainDatabase, EMPTY_TRANSACTION
+from components.daily_balances import DailyBalances
+from components.description_index import DESCRIPTION_COLUMNS
+from components.distinct_values import DistinctValues
+from components.grid_query import grid_filter_mask, grid_key, grid_sort
+from components.rollup import Rollup, window_bounds
+from components.maintain_database import MaintainDatabase, DUPLICATE_COLUMNS, EMPTY_TRANSACTION
+from components.mutation_log import LOG_COMPACT_SIZE, MutationLog, apply_mutation
+from components.query_cache import QueryCache, invalidates_queries, query_key
+from components.transaction_partitions import TransactionPartitions, month_bounds, partition_key
+
+TABLES = ['transactions', 'budget', 'accounts', 'categories']
+# Stored views that change with each table, besides the table itself
+CHANGED_VIEWS = {'transactions': ['balances', 'rollup'], 'categories': ['rollup']}
+# Seconds without changes before the changed tables are written, overridden by CSV_FLUSH_DELAY in the .env file
+FLUSH_DELAY = 10
+# Number of filtered and sorted transaction tables kept for the grid's blocks, each up to the size of all the transactions
+PAGE_CACHE_SIZE = 4
+
+
+def locks_tables(method):
+    """Decorate a method that changes the tables, so a flush never copies them partway through the change"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.table_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _write_csv(df, path):
+    """Write a CSV to a temporary file and rename it over the old one, so a crash can't leave a partly written file"""
+    temp_path = path + '.tmp'
+    df.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
 
 
 class BudgieDF(pd.DataFrame):
-    def find(self, value_filter=None):
-        """
+    def find(self, value_filter=None, projection=None):
+        """Filter the dataframe like a Mongo query
 
         Args:
-            value_filter (dict):
+            value_filter (dict): Column values to match, or a dictionary of '$in', '$gte', and '$lte' conditions
+            projection (list): Columns to return, if not all
         """
-        if value_filter is None:
+        if value_filter is None and projection is None:
             return self
+        elif value_filter is None:
+            temp = self
         else:
-            try:  # First check for date filter
-                dates = value_filter.pop('posted date')
-                temp = self[(self['posted date'] >= dates['$gte']) & (self['posted date'] <= dates['$lte'])]
-            except KeyError:
-                temp = self
-
+            mask = np.ones(len(self), dtype=bool)
             try:  # General catch all if the filter criteria doesn't exist in the columns
-                if len(value_filter) == 1:
-                    return BudgieDF(temp[temp[list(value_filter.keys())[0]] == list(value_filter.values())[0]])
-                elif len(value_filter) == 2:
-                    return BudgieDF(temp[(temp[list(value_filter.keys())[0]] == list(value_filter.values())[0]) & (temp[list(value_filter.keys())[1]] == list(value_filter.values())[1])])
+                for key, val in value_filter.items():
+                    if isinstance(val, dict):
+                        if '$in' in val:
+                            mask &= self[key].isin(val['$in']).values
+                        if '$gte' in val:
+                            mask &= (self[key] >= val['$gte']).values
+                        if '$lte' in val:
+                            mask &= (self[key] <= val['$lte']).values
+                    else:
+                        mask &= (self[key] == val).values
             except KeyError:
                 return BudgieDF()
+            temp = self[mask]
+
+        if projection is not None:
+            temp = temp[[col for col in projection if col in temp.columns]]
+        return BudgieDF(temp)
 
     def distinct(self, value):
         try:
@@ -63,7 +106,23 @@ class BudgieDF(pd.DataFrame):
 
 
 class MaintainCSV(MaintainDatabase):
-    def __init__(self, ):
+    file_extension = '.csv'
+
+    def __init__(self, data_dir=None, read_only=False):
+        self.data_dir = data_dir
+        self.read_only = read_only  # Never write the files or the mutation log, for reading the data into another backend
+        self.partitions = None
+        self.mutation_log = None
+        self.compaction = None
+        self.flush_timer = None
+        self.flush_delay = float(os.getenv('CSV_FLUSH_DELAY', FLUSH_DELAY))
+        self.table_lock = RLock()  # Held while changing the tables and while copying them to write
+        self.write_lock = Lock()  # Held while writing the files
+        self.dirty_tables = set()
+        self.dirty_months = set()  # Months of the transactions changed since they were written, or None if it isn't known
+        self.stale_views = set()
+        self.stored_descriptions = None  # Stored description indexes of all the accounts, read the first time one is needed
+        self.page_cache = QueryCache(PAGE_CACHE_SIZE)
         super().__init__()
 
     def load_initial_data(self):
@@ -72,6 +131,8 @@ class MaintainCSV(MaintainDatabase):
             # we are running in a bundle
             self.file_dir = os.path.abspath(os.path.join(os.getcwd(), 'data'))
             print('CSV Data Directory: ', self.file_dir)
+        elif self.data_dir is not None:
+            self.file_dir = self.data_dir
         else:
             # we are running in a normal Python environment
             # load_dotenv()
@@ -80,52 +141,401 @@ class MaintainCSV(MaintainDatabase):
         if not os.path.isdir(self.file_dir):
             os.makedirs(self.file_dir)
 
-        try:
-            self.transactions_table = BudgieDF(pd.read_csv(os.path.join(self.file_dir, 'transactions.csv')))
-            self.transactions_table['transaction date'] = pd.to_datetime(self.transactions_table['transaction date'])
-            self.transactions_table['posted date'] = pd.to_datetime(self.transactions_table['posted date'])
-        except FileNotFoundError:
-            self.transactions_table = BudgieDF(EMPTY_TRANSACTION)
+        self.partitions = TransactionPartitions(os.path.join(self.file_dir, 'transactions'), self.file_extension,
+                                                self._read_partition, self._write_partition)
+        if self.partitions.exists():
+            self.transactions_table = None  # Only the partitions that are queried are read, until all the transactions are needed
+        else:
+            try:  # Single file from before the transactions were partitioned, which is partitioned the next time it's written
+                self.transactions_table = BudgieDF(self._read_table('transactions'))
+                self.transactions_table['transaction date'] = pd.to_datetime(self.transactions_table['transaction date'])
+                self.transactions_table['posted date'] = pd.to_datetime(self.transactions_table['posted date'])
+                self._resort_transactions()  # Saved in order, so only sorted if the file was edited outside of Budgie
+                self.dirty_tables.add('transactions')
+                self.dirty_months = None
+            except FileNotFoundError:
+                self.transactions_table = BudgieDF(EMPTY_TRANSACTION)
 
         try:
-            self.budget_table = BudgieDF(pd.read_csv(os.path.join(self.file_dir, 'budget.csv')))
+            self.budget_table = BudgieDF(self._read_table('budget'))
         except FileNotFoundError:
             self.budget_table = BudgieDF()
 
         try:
-            self.accounts_table = BudgieDF(pd.read_csv(os.path.join(self.file_dir, 'accounts.csv')))
+            self.accounts_table = BudgieDF(self._read_table('accounts'))
         except FileNotFoundError:
             self.accounts_table = BudgieDF()
 
         try:
-            self.categories_table = pd.read_csv(os.path.join(self.file_dir, 'categories.csv'))
+            self.categories_table = self._read_table('categories')
             self.categories_table = BudgieDF(self.categories_table.replace(np.nan, ''))
         except FileNotFoundError:
             self.categories_table = BudgieDF()
 
-    def load_transactions(self, sheet, account=None):
-        """Import transaction CSV and save many transactions to dataframe"""
-        transaction_list = self._add_transactions(sheet, account)
-        for trans in transaction_list:
-            trans['_id'] = str(uuid.uuid4())
+        self.mutation_log = MutationLog(os.path.join(self.file_dir, 'mutations.log'))
+        self._replay_mutations()
+
+    def _table_path(self, name):
+        return os.path.join(self.file_dir, name + self.file_extension)
+
+    def _read_table(self, name):
+        """Read a stored table, raising FileNotFoundError if it doesn't exist yet"""
+        return self._read_file(self._table_path(name))
+
+    def _write_table(self, df, name):
+        self._write_file(df, self._table_path(name), name)
+
+    def _read_file(self, path):
+        return pd.read_csv(path)
+
+    def _write_file(self, df, path, name):
+        _write_csv(df, path)
+
+    def _read_partition(self, path):
+        df = self._read_file(path)
+        df['transaction date'] = pd.to_datetime(df['transaction date'])
+        df['posted date'] = pd.to_datetime(df['posted date'])
+        return df
+
+    def _write_partition(self, df, path):
+        self._write_file(df, path, 'transactions')
+
+    @property
+    def transactions_table(self):
+        """All the transactions, read from every partition the first time they're needed"""
+        if self._transactions is None:
+            transactions = self.partitions.read_window()
+            self.partitions.clear()  # Kept in the full table from now on
+            self._transactions = BudgieDF(EMPTY_TRANSACTION) if transactions is None else self._sort_transactions(transactions)
+        return self._transactions
+
+    @transactions_table.setter
+    def transactions_table(self, df):
+        self._transactions = df
+
+    def _transactions_between(self, start, end):
+        """Get the transactions posted from start up to end, not included, reading only the partitions the window overlaps if
+        the full table isn't loaded"""
+        transactions = self._transactions
+        if transactions is None:
+            transactions = self.partitions.read_window(start, end)
+            if transactions is None:
+                return EMPTY_TRANSACTION.iloc[:0]
+        # The table is sorted by posted date, so binary search for the rows in the date range
+        posted_dates = transactions['posted date']
+        first = posted_dates.searchsorted(start, side='left')
+        last = posted_dates.searchsorted(end, side='left')
+        return transactions.iloc[first:last].copy()
+
+    def _replay_mutations(self):
+        """Apply the changes logged since the CSV files were last written, reading only the months they touched"""
+        mutations = self.mutation_log.replay()
+        if len(mutations) == 0:
+            return
+        logged = [mutation for mutation in mutations if mutation['table'] == 'transactions']
+        # Logs from before the months were logged don't say which months the deleted and updated rows were in
+        months = None if any('months' not in mutation for mutation in logged) else {m for mutation in logged for m in mutation['months']}
+        if len(logged) > 0:
+            transactions = self._without_placeholder(self.transactions_table) if months is None else self._month_transactions(months)
+        for mutation in mutations:
+            name = mutation['table']
+            self._mark_dirty(name)
+            if name == 'transactions':
+                transactions = apply_mutation(transactions, mutation)
+            else:
+                setattr(self, f"{name}_table", BudgieDF(apply_mutation(getattr(self, f"{name}_table"), mutation)))
+
+        if len(logged) > 0:
+            transactions['transaction date'] = pd.to_datetime(transactions['transaction date'])
+            transactions['posted date'] = pd.to_datetime(transactions['posted date'])
+            if months is None:
+                self.dirty_months = None
+                self.transactions_table = self._sort_transactions(transactions) if len(transactions) > 0 else BudgieDF(EMPTY_TRANSACTION)
+            else:
+                self._replace_months(months, transactions)
+        self.categories_table = BudgieDF(self.categories_table.replace(np.nan, ''))
+        # The stored balances, rollup, and description indexes don't include the logged changes
+        self.stale_views = self.dirty_tables & {'balances', 'rollup'}
+        if 'transactions' in self.dirty_tables:
+            self.stale_views.add('descriptions')
+
+    def _mark_dirty(self, table):
+        self.dirty_tables.add(table)
+        self.dirty_tables.update(CHANGED_VIEWS.get(table, []))
+
+    @staticmethod
+    def _without_placeholder(df):
+        """Drop the EMPTY_TRANSACTION placeholder of an empty transactions table"""
+        return df[df['_id'].astype(str) != 'None']
+
+    def _has_transactions(self):
+        if self._transactions is None:
+            return len(self.partitions.months()) > 0
+        return len(self._without_placeholder(self._transactions)) > 0
+
+    def _month_transactions(self, months):
+        """Copy the transactions posted in the months, reading only those partitions if the full table isn't loaded"""
+        if self._transactions is None:
+            frames = [self.partitions.load(month) for month in sorted(months) if month in self.partitions.manifest]
+        else:
+            # The table is sorted by posted date, so each month is found by binary search
+            transactions = self._without_placeholder(self._transactions)
+            posted_dates = transactions['posted date']
+            frames = []
+            for month in sorted(months):
+                start, end = month_bounds(month)
+                frames.append(transactions.iloc[posted_dates.searchsorted(start):posted_dates.searchsorted(end)])
+        if len(frames) == 0:
+            return BudgieDF(EMPTY_TRANSACTION.iloc[:0].copy())
+        return BudgieDF(pd.concat(frames, ignore_index=True))
+
+    def _replace_months(self, months, transactions):
+        """Replace the transactions posted in the months with their changed transactions
+
+        Changed transactions posted in other months, after their posted date was edited, are added to those months too.
+
+        Args:
+            months: Months of the transactions before the change
+            transactions: Dataframe of all the transactions of the months after the change
+
+        Returns: Set of the changed months, which are written with the next flush
+        """
+        months = set(months)
+        moved_to = set(partition_key(transactions['posted date']).dropna()) - months
+        if len(moved_to) > 0:
+            transactions = pd.concat([transactions, self._month_transactions(moved_to)], ignore_index=True)
+            months |= moved_to
+        transactions = self._sort_transactions(transactions)
+        by_month = {month: rows.reset_index(drop=True) for month, rows in transactions.groupby(partition_key(transactions['posted date']).values)}
+        if self._transactions is None:
+            for month in months:
+                self.partitions.update(month, by_month.get(month, transactions.iloc[:0]))
+        else:
+            # Put each month's transactions in place of the old ones, between the unchanged months
+            existing = self._without_placeholder(self._transactions)
+            posted_dates = existing['posted date']
+            pieces, previous = [], 0
+            for month in sorted(months):
+                start, end = month_bounds(month)
+                pieces += [existing.iloc[previous:posted_dates.searchsorted(start)], by_month.get(month, transactions.iloc[:0])]
+                previous = posted_dates.searchsorted(end)
+            pieces.append(existing.iloc[previous:])
+            combined = pd.concat(pieces, ignore_index=True)
+            self._transactions = BudgieDF(combined) if len(combined) > 0 else BudgieDF(EMPTY_TRANSACTION)
+        if self.dirty_months is not None:
+            self.dirty_months |= months
+        return months
+
+    def _months_of(self, field, values):
+        """Get the months with transactions whose field is one of the values, from the manifest if the table isn't loaded"""
+        if self._transactions is None:
+            values = {str(value) for value in values}
+            return {month for month, entry in self.partitions.manifest.items() if values & set(entry.get(field, {}))}
+        transactions = self._transactions
+        return set(partition_key(transactions.loc[transactions[field].isin(values), 'posted date']).dropna())
+
+    def _months_of_ids(self, ids, posted_dates):
+        """Get the months of the transactions with the ids, looking in the months of their posted dates as the grid sent them
+
+        If a posted date was already changed, so the transaction isn't in its month, all the months are checked.
+        """
+        if self._transactions is not None:
+            transactions = self._transactions
+            return set(partition_key(transactions.loc[transactions['_id'].isin(ids), 'posted date']).dropna())
+        dates = pd.to_datetime(pd.Series(list(posted_dates), dtype=object), format='mixed', errors='coerce')
+        months = set(partition_key(dates).dropna())
+        if not set(ids) <= set(self._month_transactions(months)['_id']):
+            months = set(self.partitions.months())
+        return months
+
+    def _log(self, table, op, rows=None, ids=None, months=None):
+        """Log a change to a table, and write the changed tables once the log is large or there are no more changes for a while"""
+        if self.read_only:
+            raise PermissionError(f"Can't change the read only data in {self.file_dir}")
+        self.mutation_log.append(table, op, rows, ids, months)
+        self._mark_dirty(table)
+        if self.mutation_log.size() > LOG_COMPACT_SIZE:
+            self.compact_in_background()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Write the changed tables after the flush delay, restarting the delay if a flush was already waiting"""
+        with self.table_lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+            self.flush_timer = Timer(self.flush_delay, self.compact_in_background)
+            self.flush_timer.daemon = True  # Exiting doesn't wait for the delay, the atexit flush writes the changes instead
+            self.flush_timer.start()
+
+    def _log_table(self, table):
+        """Log all the rows of a small table"""
+        self._log(table, 'replace', getattr(self, f"{table}_table"))
+
+    @invalidates_queries
+    @locks_tables
+    def load_transactions(self, sheet, account=None, standardized=False):
+        """Import transaction CSV in chunks and save many transactions to dataframe
+
+        Args:
+            sheet: Path or file object of the transactions CSV, or a dataframe of the transactions
+            account: Account name for the transactions, if not given in the CSV
+            standardized: If the sheet is already a list of standardized chunks from standardize_transaction_files
+
+        Returns: Number of transactions inserted, or the error string
+        """
+        new_transactions = []
+        imported_ids = set()
+        for transaction_list in self._add_transactions(sheet, account, imported_ids, standardized):
+            if isinstance(transaction_list, str):
+                return transaction_list
+            for trans in transaction_list:
+                trans['_id'] = str(uuid.uuid4())
+                imported_ids.add(trans['_id'])
+            if len(transaction_list) > 0:
+                new_transactions.append(pd.DataFrame(transaction_list))
+                self._update_categories(transaction_list)
 
         # Insert transactions into database
-        if len(transaction_list) > 0:
-            if len(self.transactions_table) == 1:  # don't let it include the EMPTY_TRANSACTIONS item in the actual data
-                self.transactions_table = BudgieDF(pd.DataFrame(transaction_list))
+        if len(new_transactions) > 0:
+            added = pd.concat(new_transactions)
+            had_transactions = self._has_transactions()
+            months = self._insert_transactions(added)
+            if had_transactions:
+                self._update_materialized(added=added)
             else:
-                self.transactions_table = BudgieDF(pd.concat([self.transactions_table, pd.DataFrame(transaction_list)]).reset_index(drop=True))
-        self.export_data_to_csv()
-        return len(transaction_list)
+                self.distinct_values = None
+                self.rebuild_balances()
+                self.rebuild_rollup()
+            self._log('transactions', 'insert', added, months=months)
+        return len(imported_ids)
+
+    @staticmethod
+    def _sort_transactions(df):
+        """Sort transactions by posted date, keeping the order of transactions with the same date"""
+        return BudgieDF(df.sort_values('posted date', kind='stable').reset_index(drop=True))
+
+    def _insert_transactions(self, new_df):
+        """Add new transactions to the months they were posted in, after the existing transactions posted on the same day
+
+        Returns: Set of the changed months
+        """
+        months = set(partition_key(new_df['posted date']))
+        return self._replace_months(months, pd.concat([self._month_transactions(months), new_df], ignore_index=True))
+
+    def _resort_transactions(self):
+        """Sort the transactions table again if an edit changed a posted date out of order"""
+        if not self.transactions_table['posted date'].is_monotonic_increasing:
+            self.transactions_table = self._sort_transactions(self.transactions_table)
 
     def export_data_to_csv(self, root=None):
-        """Save all data files to a CSV"""
-        tables = [self.transactions_table, self.budget_table, self.accounts_table, self.categories_table]
-        file_names = ['transactions.csv', 'budget.csv', 'accounts.csv', 'categories.csv']
-        for i in range(4):
-            if len(tables[i]) > 0:
-                tables[i].to_csv(os.path.join(self.file_dir, file_names[i]), index=False)
+        """Save the changed data files to a CSV now, compacting the mutation log into them"""
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+        if self.compaction is not None:
+            self.compaction.join()
+        self._write_tables(*self._snapshot_tables())
+        return self.file_dir
+
+    def compact_in_background(self):
+        """Write the changed CSV files in a separate thread, so the change that triggered it doesn't wait for the write"""
+        with self.table_lock:
+            if self.compaction is not None and self.compaction.is_alive():
+                # Try again after the delay, so the changes made since the running write's copy are written too
+                self._schedule_flush()
+                return
+            self.compaction = Thread(target=self._write_tables, args=self._snapshot_tables())
+            self.compaction.start()
+
+    def _snapshot_tables(self):
+        """Copy the changed tables to write, moving the log aside first so any later change is logged again
+
+        Only the changed months of the transactions are copied, when they're known.
+
+        Returns: Dictionary of the copied tables, and the set of changed months or None if they all need to be compared
+        """
+        with self.table_lock:
+            self.mutation_log.start_compaction()
+            dirty, self.dirty_tables = self.dirty_tables, set()
+            months, self.dirty_months = self.dirty_months, set()
+            tables = {name: getattr(self, f"{name}_table").copy() for name in TABLES if name in dirty and name != 'transactions'}
+            if 'transactions' in dirty:
+                self.partitions.start_save()
+                tables['transactions'] = self.transactions_table.copy() if months is None else self._month_transactions(months)
+            for name, view in [('balances', self.daily_balances), ('rollup', self.rollup), ('descriptions', self.stored_descriptions)]:
+                if view is not None and name in dirty:
+                    tables[name] = view.copy() if name == 'descriptions' else view.table.copy()
+                elif name in self.stale_views:
+                    tables[name] = None  # Remove the stored view, so it's built again from the written transactions
+            self.stale_views = set()
+            return tables, months
+
+    def _write_tables(self, tables, months=None):
+        if self.read_only:
+            return
+        try:
+            with self.write_lock:
+                for name, table in tables.items():
+                    path = self._table_path(name)
+                    if name == 'transactions':
+                        self.partitions.save(table[table['_id'].astype(str) != 'None'], months)  # Without the placeholder of an empty table
+                        if os.path.exists(path):  # Replaced by the partitions
+                            os.remove(path)
+                    elif table is not None and len(table.columns) > 0:
+                        self._write_table(table, name)  # Written even when empty, so the deleted rows aren't read back
+                    elif os.path.exists(path):  # Stale view, or a table that never had any columns
+                        os.remove(path)
+                self.mutation_log.finish_compaction()
+        except Exception:
+            # Keep the moved log, and write the tables again with the next flush. The table lock is only taken once the
+            # write lock is released, since changes to the tables take them in that order.
+            with self.table_lock:
+                self.dirty_tables.update(tables)
+                if 'transactions' in tables:
+                    self.dirty_months = None if months is None or self.dirty_months is None else self.dirty_months | set(months)
+            raise
+
+    def _all_transactions(self):
+        return self.transactions_table
+
+    def _load_balances(self):
+        if 'balances' in self.stale_views:
+            return None
+        try:
+            return DailyBalances(self._read_table('balances'))
+        except FileNotFoundError:
+            return None
+
+    def _save_balances(self, changed):
+        # Saved with the rest of the data when the mutation log is compacted
+        pass
+
+    def _save_all_balances(self):
+        if self.read_only:
+            return
+        with self.write_lock:
+            self._write_table(self.daily_balances.table, 'balances')
+
+    def _load_rollup(self):
+        if 'rollup' in self.stale_views:
+            return None
+        try:
+            return Rollup(self._read_table('rollup'))
+        except FileNotFoundError:
+            return None
+
+    def _save_rollup(self, changed):
+        # Saved with the rest of the data when the mutation log is compacted
+        pass
+
+    def _save_all_rollup(self):
+        if self.read_only:
+            return
+        with self.write_lock:
+            self._write_table(self.rollup.table, 'rollup')
 
+    @invalidates_queries
+    @locks_tables
     def add_one_transaction(self, category, amount, t_date, p_date, description, account, note):
         """Add a single manual transaction to the dataframe"""
         transaction = {'_id': str(uuid.uuid4()),
@@ -139,22 +549,80 @@ class MaintainCSV(MaintainDatabase):
                        'notes': [note]}
 
         # Insert transactions into CSV
-        if len(self.transactions_table) == 1 and self.transactions_table.loc[0]['description'] == 'No Available Data':  # don't let it include the EMPTY_TRANSACTIONS item in the actual data
-            self.transactions_table = BudgieDF(pd.DataFrame(transaction))
-        else:
-            self.transactions_table = BudgieDF(pd.concat([self.transactions_table, pd.DataFrame(transaction)]).reset_index(drop=True))
-        self.export_data_to_csv()
-
-    def _get_categories(self, account):
-        """Get all the descriptions corresponding categories"""
-        m = self.transactions_table[self.transactions_table['account name'] == account]
-        k = m.drop_duplicates(subset=['original description'])
-
-        self.autocategories = {}
-        for i, row in k.iterrows():
-            self.autocategories[row['original description']] = {'category': row['category'], 'posted date': row['posted date']}
-
-    def query_transactions(self, conf_dict):
+        transaction = pd.DataFrame(transaction)
+        months = self._insert_transactions(transaction)
+        self._update_categories(transaction.to_dict('records'))
+        self._update_materialized(added=transaction)
+        self._log('transactions', 'insert', transaction, months=months)
+
+    def _get_duplicate_candidates(self, accounts, start, end):
+        """Get the existing transactions for the accounts and date span that could be duplicates, from the months it overlaps"""
+        candidates = self._transactions_between(start, end + pd.Timedelta(days=1))
+        candidates = candidates[candidates['account name'].isin(list(accounts)) & (candidates['posted date'] <= end)]
+        candidates = pd.DataFrame(candidates[DUPLICATE_COLUMNS]).reset_index(drop=True)
+        candidates['posted date'] = pd.to_datetime(candidates['posted date']).astype('datetime64[ns]')
+        candidates['transaction date'] = pd.to_datetime(candidates['transaction date']).astype('datetime64[ns]')
+        return candidates
+
+    def _description_records(self, account):
+        """Get each original description of the account's transactions with the category of its most recent transaction"""
+        m = self._month_transactions(self._months_of('account name', [account]))
+        m = m[m['account name'] == account]
+        return m.drop_duplicates(subset=['original description'], keep='last').to_dict('records')
+
+    def _get_stored_descriptions(self):
+        """Get the stored description indexes of all the accounts, reading them the first time"""
+        if self.stored_descriptions is None:
+            try:
+                if 'descriptions' in self.stale_views:
+                    raise FileNotFoundError
+                stored = self._read_table('descriptions')
+                stored['posted date'] = pd.to_datetime(stored['posted date'])
+            except FileNotFoundError:
+                stored = pd.DataFrame(columns=DESCRIPTION_COLUMNS)
+            self.stored_descriptions = stored
+        return self.stored_descriptions
+
+    def _set_stored_descriptions(self, stored):
+        """Replace the stored description indexes, which are written with the next flush"""
+        self.stored_descriptions = stored.reset_index(drop=True)
+        self.dirty_tables.add('descriptions')
+        if not self.read_only:
+            self._schedule_flush()
+
+    def _load_descriptions(self, account):
+        stored = self._get_stored_descriptions()
+        return stored[stored['account name'] == account].to_dict('records')
+
+    def _save_descriptions(self, account, records, replace=False):
+        stored = self._get_stored_descriptions()
+        replaced = stored['account name'] == account
+        if not replace:
+            replaced &= stored['original description'].isin([rec['original description'] for rec in records])
+        kept = stored[~replaced]
+        if len(records) > 0:
+            new_rows = pd.DataFrame([{'account name': account, **rec} for rec in records], columns=DESCRIPTION_COLUMNS)
+            kept = pd.concat([kept, new_rows]) if len(kept) > 0 else new_rows
+        self._set_stored_descriptions(kept)
+
+    def _drop_descriptions(self, accounts=None):
+        stored = self._get_stored_descriptions()
+        if accounts is None:
+            self.autocategories = {}
+            self._set_stored_descriptions(stored.iloc[:0])
+            return
+        for account in accounts:
+            self.autocategories.pop(account, None)
+        self._set_stored_descriptions(stored[~stored['account name'].isin(list(accounts))])
+
+    def _relabel_descriptions(self, categories):
+        for index in self.autocategories.values():
+            index.relabel(categories)
+        stored = self._get_stored_descriptions().copy()
+        stored['category'] = stored['category'].replace(categories)
+        self._set_stored_descriptions(stored)
+
+    def _query_transactions(self, conf_dict):
         """Query dataframe according to configuration dict parameters
 
         Args:
@@ -162,35 +630,91 @@ class MaintainCSV(MaintainDatabase):
 
         Returns: Pandas Dataframe of transactions
         """
-        transactions = self.transactions_table[(self.transactions_table['posted date'] >= conf_dict['start_date']) & (self.transactions_table['posted date'] <= conf_dict['end_date'])]
+        transactions = self._transactions_between(*window_bounds(conf_dict['start_date'], conf_dict['end_date']))
         if len(conf_dict['filter_value']) == 0:
             pass
         else:
             for val in conf_dict['field_filter']:
-                if len(conf_dict['filter_value'][val]) > 0:
-                    transactions = transactions[transactions[val.lower()].isin(conf_dict['filter_value'])]
+                values = conf_dict['filter_value'][val]
+                if len(values) > 0:
+                    # If filtering by category, include children of parent categories as well
+                    if val == 'Category':
+                        values = values + self.get_children_categories_list(values)
+                    transactions = transactions[transactions[val.lower()].isin(values)]
 
         if len(transactions) == 0:
             transactions = EMPTY_TRANSACTION
 
         return transactions
 
-    def get_oldest_transaction(self):
-        return self.transactions_table['posted date'].min()
+    def page_transactions(self, conf_dict, start_row, end_row, sort_model=None, filter_model=None):
+        """Get one block of rows of the transactions grid, with the grid's sorting and column filters applied to the dataframe
 
+        Args:
+            conf_dict: Dictionary of the configuration parameters.
+            start_row: Index of the first row of the block
+            end_row: Index after the last row of the block
+            sort_model: List of the sorted columns and their direction, from the grid's rows request
+            filter_model: Dictionary of each filtered column and its filter, from the grid's rows request
+
+        Returns: Pandas Dataframe of the block of transactions, and the number of transactions in all the blocks
+        """
+        # The grid requests the blocks one at a time, so the filtered and sorted transactions are kept to slice each block from
+        key = (query_key(conf_dict, self.data_version), grid_key(sort_model, filter_model))
+        transactions = self.page_cache.get(key, lambda: self._grid_transactions(conf_dict, sort_model, filter_model), copy=False)
+        return transactions.iloc[start_row:end_row].copy(), len(transactions)
+
+    def _grid_transactions(self, conf_dict, sort_model=None, filter_model=None):
+        """Get all the transactions of the configuration parameters, with the grid's column filters and sorting applied"""
+        transactions = self.query_transactions(conf_dict)
+        if filter_model:
+            transactions = transactions[grid_filter_mask(transactions, filter_model)]
+        if len(transactions) == 0:
+            return EMPTY_TRANSACTION
+
+        fields, directions = zip(*grid_sort(sort_model))
+        return transactions.sort_values(list(fields), ascending=[d == 1 for d in directions], kind='stable')
+
+    def get_oldest_transaction(self):
+        if self._transactions is None and self.partitions.oldest() is not None:
+            return self.partitions.oldest()
+        return self.transactions_table['posted date'].iloc[0]
+
+    def get_distinct_values(self):
+        """Get the distinct categories and accounts, from the partition manifest if the transactions aren't loaded"""
+        if self.distinct_values is None and self._transactions is None:
+            self.distinct_values = DistinctValues.from_counts(self.partitions.value_counts())
+        return super().get_distinct_values()
+
+    @invalidates_queries
+    @locks_tables
     def edit_transaction(self, change_dict):
         """Update transaction based on edits in Transaction table"""
         change_dict[0]['data']['posted date'] = datetime.strptime(change_dict[0]['data']['posted date'], '%m-%d-%Y')
         change_dict[0]['data']['transaction date'] = datetime.strptime(change_dict[0]['data']['transaction date'], '%m-%d-%Y')
         new_dict = change_dict[0]['data']
         tid = new_dict['_id']
-        existing = self.transactions_table[self.transactions_table['_id'] == tid]
+        old_posted = change_dict[0]['oldValue'] if change_dict[0].get('colId') == 'posted date' else new_dict['posted date']
+        months = self._months_of_ids([tid], [old_posted])
+        transactions = self._month_transactions(months)
+        existing = transactions[transactions['_id'] == tid]
         for key, val in new_dict.items():
-            self.transactions_table.loc[existing.index, key] = new_dict[key]
-        self.export_data_to_csv()
-
+            transactions.loc[existing.index, key] = new_dict[key]
+        edited = transactions.loc[existing.index]
+        months = self._replace_months(months, transactions)
+        self._update_edited_categories(existing.to_dict('records'), edited.to_dict('records'))
+        self._update_materialized(removed=existing, added=edited)
+        self._log('transactions', 'update', edited, months=months)
+
+    @invalidates_queries
+    @locks_tables
     def edit_many_transactions(self, transaction_list):
         """Edit data for multiple transactions at one time"""
+        # The posted dates were already replaced if they're being edited, so those transactions are looked for in every month
+        months = self._months_of_ids([trans['_id'] for trans in transaction_list], [trans['posted date'] for trans in transaction_list])
+        transactions = self._month_transactions(months)
+        edited_ids = transactions['_id'].isin([trans['_id'] for trans in transaction_list])
+        old_transactions = transactions[edited_ids]
         for new_trans in transaction_list:
             try:
                 new_trans['posted date'] = datetime.strptime(new_trans['posted date'], '%Y-%m-%d')
@@ -199,19 +723,32 @@ class MaintainCSV(MaintainDatabase):
                 new_trans['posted date'] = datetime.strptime(new_trans['posted date'], '%m-%d-%Y')
                 new_trans['transaction date'] = datetime.strptime(new_trans['transaction date'], '%m-%d-%Y')
             tid = new_trans['_id']
-            existing = self.transactions_table[self.transactions_table['_id'] == tid]
+            existing = transactions[transactions['_id'] == tid]
             for key, val in new_trans.items():
-                self.transactions_table.loc[existing.index, key] = new_trans[key]
-        self.export_data_to_csv()
-
+                transactions.loc[existing.index, key] = new_trans[key]
+        new_transactions = transactions[edited_ids]
+        months = self._replace_months(months, transactions)
+        self._update_edited_categories(old_transactions.to_dict('records'), new_transactions.to_dict('records'))
+        self._update_materialized(removed=old_transactions, added=new_transactions)
+        self._log('transactions', 'update', new_transactions, months=months)
+
+    @invalidates_queries
+    @locks_tables
     def delete_transaction(self, transaction_dict):
         """Delete a list of transactions from the Transactions table"""
-        for trans in transaction_dict:
-            rm_i = self.transactions_table[self.transactions_table['_id'] == trans['_id']].index
-            self.transactions_table = BudgieDF(self.transactions_table.drop(rm_i))
-        self.export_data_to_csv()
+        ids = [trans['_id'] for trans in transaction_dict]
+        months = self._months_of_ids(ids, [trans.get('posted date') for trans in transaction_dict])
+        transactions = self._month_transactions(months)
+        deleted = transactions['_id'].isin(ids)
+        removed = transactions[deleted]
+        if len(removed) > 0:
+            months = self._replace_months(months, transactions[~deleted])
+            self._drop_descriptions(set(removed['account name']))
+            self._update_materialized(removed=removed)
+            self._log('transactions', 'delete', ids=removed['_id'], months=months)
 
     """====== Budget ======"""
+    @locks_tables
     def add_budget_item(self, category, value):
         """Add new budget item in dataframe with category and monthly value"""
         try:  # Check for when there's no budget items yet
@@ -221,86 +758,49 @@ class MaintainCSV(MaintainDatabase):
 
         if len(existing) == 1:
             self.budget_table.loc[existing.index, 'value'] = value
+            self.get_budget_snapshot().set(category, value)
         else:
-            is_parent = False
-            try:
-                self.categories_table[self.categories_table['parent'] == category]['parent'].values[0]
-                is_parent = True
-            except IndexError:
-                pass
-
+            is_parent = self.get_category_tree().is_parent(category)
             self.budget_table = BudgieDF(pd.concat([self.budget_table, pd.DataFrame({'category': [category],
                                                                                      'value': [value],
                                                                                      'is_parent': is_parent,
                                                                                      '_id': uuid.uuid4()})], ignore_index=True))
+            self.get_budget_snapshot().set(category, value, is_parent)
         self.update_parent_budget(category)
-        self.export_data_to_csv()
+        self._log_table('budget')
 
     def update_parent_budget(self, category):
         # Check if there's a parent budget, and if so, update it
-        try:
-            parent = self.categories_table.find({'category name': category}).iloc[0]['parent']
-            if self.get_budget_amount(parent) != 0:
-                new_group_value = self.get_budget_amount(self.get_children_categories_list(parent))
-                existing = self.budget_table[self.budget_table['category'] == parent]
-                self.budget_table.loc[existing.index, 'value'] = new_group_value
-        except IndexError:
-            pass
-
-    def get_budget_dict(self):
-        """Get dictionary of all positive and negative budget line items"""
-        pos_dict = {}
-        neg_dict = {}
-        grp_dict = {}
-        for i, item in self.budget_table.find().iterrows():
-            try:
-                if item['is_parent']:
-                    grp_dict[item['category']] = item['value']
-                    continue
-            except KeyError:
-                pass
-            if item['value'] > 0:
-                pos_dict[item['category']] = item['value']
-            else:
-                neg_dict[item['category']] = item['value']
-        return pos_dict, neg_dict, grp_dict
-
-    def get_budget_amount(self, category):
-        """
-
-        Args:
-            category (str, list): Single category or list of categories to get the budget value of
-
-        Returns:
-
-        """
-        if isinstance(category, str):
-            try:
-                return self.budget_table.find({'category': category}).iloc[0]['value']
-            except IndexError:
-                return 0
-        elif isinstance(category, list):
-            budget_value = 0
-            for child_cat in category:
-                # Get the total budgeted amount for all child categories
-                budget_value += self.get_budget_amount(child_cat)
-            return budget_value
-
+        parent = self.get_category_tree().parent_of(category)
+        snapshot = self.get_budget_snapshot()
+        if parent and snapshot.amount(parent) != 0:
+            new_group_value = snapshot.amount(self.get_children_categories_list(parent))
+            existing = self.budget_table[self.budget_table['category'] == parent]
+            self.budget_table.loc[existing.index, 'value'] = new_group_value
+            snapshot.set(parent, new_group_value)
+
+    @locks_tables
     def rm_budget_item(self, category, value):
         """Delete budget item in dataframe"""
         rm_i = self.budget_table[(self.budget_table['category'] == category) & (self.budget_table['value'] == value)].index
         self.budget_table = BudgieDF(self.budget_table.drop(rm_i))
+        if len(rm_i) > 0:
+            self.get_budget_snapshot().remove(category)
         self.update_parent_budget(category)
-        self.export_data_to_csv()
+        self._log_table('budget')
 
     """====== Account ======"""
+    @locks_tables
     def add_account(self, account_name, status='open', initial_balance=0):
         """Add new account in dataframe with current status and beginning balance for net worth"""
         self.accounts_table = BudgieDF(pd.concat([self.accounts_table, pd.DataFrame({'account name': [account_name],
                                                                                      'status': [status],
                                                                                      'initial balance': [initial_balance],
                                                                                      '_id': uuid.uuid4()})], ignore_index=True))
+        self._log_table('accounts')
 
+    @invalidates_queries
+    @locks_tables
     def edit_account(self, change_dict):
         """Update account based on edits in Accounts table"""
         new_dict = change_dict[0]['data']
@@ -308,22 +808,40 @@ class MaintainCSV(MaintainDatabase):
         existing = self.accounts_table[self.accounts_table['_id'] == tid]
         for key, val in new_dict.items():
             self.accounts_table.loc[existing.index, key] = new_dict[key]
-        self.export_data_to_csv()
+        self._log_table('accounts')
 
+    @invalidates_queries
+    @locks_tables
     def delete_account(self, row_data):
         """Delete account in database and remove all transactions"""
         self.accounts_table = BudgieDF(self.accounts_table[self.accounts_table['account name'] != row_data['account name']])
-        self.transactions_table = BudgieDF(self.transactions_table[self.transactions_table['account name'] != row_data['account name']])
-        self.export_data_to_csv()
+        months = self._months_of('account name', [row_data['account name']])
+        transactions = self._month_transactions(months)
+        removed = transactions['account name'] == row_data['account name']
+        removed_ids = transactions.loc[removed, '_id']
+        months = self._replace_months(months, transactions[~removed])
+        self._drop_descriptions([row_data['account name']])
+        self.get_daily_balances().drop_account(row_data['account name'])
+        self.get_rollup().drop_account(row_data['account name'])
+        self.distinct_values = None
+        self._log_table('accounts')
+        self._log('transactions', 'delete', ids=removed_ids, months=months)
 
     """====== Category ======"""
+    @invalidates_queries
+    @locks_tables
     def add_category(self, category_name, category_parent=''):
         """Add new category in dataframe"""
         self.categories_table = BudgieDF(pd.concat([self.categories_table, pd.DataFrame({'parent': [category_parent],
                                                                                          'category name': [category_name],
                                                                                          'hidden': False,
                                                                                          '_id': uuid.uuid4()})], ignore_index=True))
+        self.category_tree = None
+        self._relabel_rollup()
+        self._log_table('categories')
 
+    @invalidates_queries
+    @locks_tables
     def edit_category(self, change_dict):
         """Update category data based on edits in Categories table"""
         new_dict = change_dict['data']
@@ -331,34 +849,38 @@ class MaintainCSV(MaintainDatabase):
         existing = self.categories_table[self.categories_table['_id'] == tid]
         for key, val in new_dict.items():
             self.categories_table.loc[existing.index, key] = new_dict[key]
-        self.export_data_to_csv()
-
-    def get_children_categories_list(self, parent=None):
-        if isinstance(parent, list):
-            children = []
-            for par in parent:
-                children.extend([item['category name'] for item in list(self.categories_table.find({'parent': par}))])
-            return children
-        else:
-            return list(self.categories_table.find({'parent': parent})['category name'])
-
-    def get_hide_from_trends(self):
-        """Get list of all categories hidden from trends"""
-        return [row['category name'] for i, row in self.categories_table.find({'hidden': True}).iterrows()]
+        self.category_tree = None
+        self._relabel_rollup()
+        self._log_table('categories')
 
+    @invalidates_queries
+    @locks_tables
     def delete_category(self, row_data):
         """Delete category in database"""
         # Update transaction categories to unknown
-        self.transactions_table['category'] = self.transactions_table['category'].replace(row_data['category name'], 'unknown')
+        months = self._months_of('category', [row_data['category name']])
+        transactions = self._month_transactions(months)
+        recategorized = transactions['category'] == row_data['category name']
+        transactions.loc[recategorized, 'category'] = 'unknown'
+        months = self._replace_months(months, transactions)
+        self._relabel_descriptions({row_data['category name']: 'unknown'})
+        self.distinct_values = None
 
         # Update budget
         self.budget_table = BudgieDF(self.budget_table[self.budget_table['category'] != row_data['category name']])
+        self.get_budget_snapshot().remove(row_data['category name'])
 
         # Remove category from table
         rm_i = self.categories_table[self.categories_table['_id'] == row_data['_id']].index
         self.categories_table = BudgieDF(self.categories_table.drop(rm_i))
-        self.export_data_to_csv()
+        self.category_tree = None
+        self._relabel_rollup(categories={row_data['category name']: 'unknown'})
+        self._log('transactions', 'update', transactions[recategorized], months=months)
+        self._log_table('budget')
+        self._log_table('categories')
 
 
 if __name__ == '__main__':
     md = MaintainCSV()
+    if len(sys.argv) > 1 and sys.argv[1] == 'verify-balances':
+        md.verify_balances(rebuild='--rebuild' in sys.argv)
@@ -0,0 +1,111 @@
+import json
+import os
+import pandas as pd
+
+# Size of the log, in bytes, after which it's compacted into the data files
+LOG_COMPACT_SIZE = 4 * 1024 * 1024
+
+
+def _records(rows):
+    """Convert a dataframe or list of row dictionaries to JSON compatible dictionaries"""
+    if isinstance(rows, pd.DataFrame):
+        rows = rows.to_dict('records')
+    return [{key: str(val) if isinstance(val, (pd.Timestamp, pd.Timedelta)) else val for key, val in row.items()} for row in rows]
+
+
+def apply_mutation(df, mutation):
+    """Apply a logged mutation to a table
+
+    Inserts and updates replace any rows with the same id, so replaying a mutation that's already in the table doesn't change it.
+
+    Args:
+        df: Dataframe of the table
+        mutation: Dictionary of the logged mutation
+
+    Returns: Updated dataframe
+    """
+    if mutation['op'] == 'replace':
+        return pd.DataFrame(mutation['rows'])
+    if '_id' not in df.columns:
+        return df if mutation['op'] == 'delete' else pd.DataFrame(mutation['rows'])
+    if mutation['op'] == 'delete':
+        return df[~df['_id'].astype(str).isin(mutation['ids'])]
+
+    rows = pd.DataFrame(mutation['rows'])
+    df = df[~df['_id'].astype(str).isin(rows['_id'].astype(str))]
+    return pd.concat([df, rows], ignore_index=True) if len(df) > 0 else rows
+
+
+class MutationLog:
+    """Append-only log of the changes to the CSV tables since they were last written
+
+    Each line is one mutation: the rows inserted or updated, the ids deleted, or all the rows of a small table.
+    Compacting moves the log aside while the tables are written, so changes made in the meantime start a new log.
+
+    Args:
+        path: Path of the log file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.compacting_path = path + '.compacting'
+
+    def append(self, table, op, rows=None, ids=None, months=None):
+        """Append a mutation to the log
+
+        Args:
+            table: Name of the changed table
+            op: 'insert', 'update', 'delete', or 'replace'
+            rows: Dataframe or list of the inserted, updated, or replacing rows
+            ids: List of the deleted ids
+            months: Month partitions of the transactions the change touched, both before and after it
+        """
+        mutation = {'table': table, 'op': op}
+        if rows is not None:
+            mutation['rows'] = _records(rows)
+        if ids is not None:
+            mutation['ids'] = [str(tid) for tid in ids]
+        if months is not None:
+            mutation['months'] = sorted(months)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(mutation, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def replay(self):
+        """Get the logged mutations in order, including a log left from a compaction that didn't finish"""
+        mutations = []
+        for path in [self.compacting_path, self.path]:
+            try:
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            mutations.append(json.loads(line))
+                        except json.JSONDecodeError:  # Line cut off by a crash while it was written
+                            pass
+            except FileNotFoundError:
+                pass
+        return mutations
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def start_compaction(self):
+        """Move the log aside, so new mutations go in a new log while the tables are written"""
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.compacting_path):  # Left by a compaction that didn't finish
+            with open(self.compacting_path, 'a') as moved, open(self.path) as f:
+                moved.write(f.read())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.compacting_path)
+
+    def finish_compaction(self):
+        """Remove the moved log after the tables with its mutations were written"""
+        try:
+            os.remove(self.compacting_path)
+        except FileNotFoundError:
+            pass
@@ -8,6 +8,24 @@ import plotly.graph_objects as go
 from components.utils import zero_params_dict, MD, update_layout_axes, get_accounts_list
 
 
+def get_account_balances(sampled, accounts, account_list):
+    """Get the balance of each account and the total net worth at the end of each day
+
+    Args:
+        sampled: Dataframe of the sum of the transactions of each account up to each day, from the daily balances
+        accounts: Dataframe of the accounts, with the initial balance of each
+        account_list: Names of the accounts to get the balances of
+
+    Returns: Dataframe of the balance of each account on each day, and list of the net worth on each day
+    """
+    net_worth = list(sampled.sum(axis=1).values + accounts['initial balance'].sum())
+    initial_balances = accounts.drop_duplicates(subset='account name').set_index('account name')['initial balance'].astype(float)
+    val_df = sampled.reindex(columns=account_list, fill_value=0) + initial_balances.reindex(account_list, fill_value=0)
+    val_df = val_df.mask(val_df.abs() < 0.001, 0).reset_index(drop=True)
+    val_df.columns.name = None
+    return val_df, net_worth
+
+
 def make_net_worth_plot(conf_dict):
     """Make a plot of the net worth of each account over the time of the Time Window parameter
 
@@ -17,17 +35,14 @@ def make_net_worth_plot(conf_dict):
     Returns: Plotly figure object
 
     """
-    # Ensure it queries all transactions since the beginning
+    # Count all transactions since the beginning, from the materialized daily balances, which leave out the Venmo
+    # transactions that are actually a transfer from another account
     all_time_config = zero_params_dict()
     all_time_config['start_date'] = '2000-01-01'
-    transactions = MD.query_transactions(all_time_config)
+    balances = MD.get_daily_balances()
+    posted_days = balances.table['posted date']
 
-    try:  # Drop Venmo transactions that are actually a transfer from another account
-        transactions = transactions.drop(transactions[(transactions['account name'] == 'Venmo') & (transactions.notes.str.contains('Source'))].index)
-    except AttributeError:
-        pass
-
-    if len(transactions) == 0 or transactions.iloc[0].description == 'No Available Data':
+    if not posted_days.between(all_time_config['start_date'], all_time_config['end_date']).any():
         fig_obj = go.Figure()
         update_layout_axes(fig_obj)
         return fig_obj
@@ -62,25 +77,10 @@ def make_net_worth_plot(conf_dict):
                 break
 
         # Calculate net worth at each date
-        net_worth = []
-        val_dict = {}
-        initial_net_worth = accounts['initial balance'].sum()
-        for end_day in days:
-            this_month = transactions[transactions['posted date'].dt.date <= end_day]
-            net_worth.append(this_month['amount'].sum() + initial_net_worth)
-            for acc in get_accounts_list():
-                acc_status = accounts[accounts['account name'] == acc]
-                grp = this_month[this_month['account name'] == acc]
-                current_val = grp['amount'].sum() + float(acc_status['initial balance'].iloc[0])
-                if abs(current_val) < 0.001:
-                    current_val = 0
-                try:
-                    val_dict[acc].append(current_val)
-                except KeyError:
-                    val_dict[acc] = [current_val]
-
-        # Convert account net worth data to dataframe to drop accounts that are closed and sort
-        val_df = pd.DataFrame(val_dict)
+        sampled = balances.sample(days, start=all_time_config['start_date'], end=all_time_config['end_date'])
+        val_df, net_worth = get_account_balances(sampled, accounts, get_accounts_list())
+
+        # Drop accounts that are closed and sort
         val_df = val_df.loc[:, (val_df != 0).any(axis=0)]
         recent_worth = val_df.iloc[0]
         average_worth = (val_df.iloc[0] + val_df.iloc[-1])/2
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+QUERY_CACHE_SIZE = 32
+
+
+def query_key(conf_dict, version):
+    """Get a hashable key for the parts of a configuration dictionary that change the queried transactions
+
+    Args:
+        conf_dict: Dictionary of the configuration parameters
+        version: Data version the query is run against
+
+    Returns: Tuple of the version, dates, filter fields, and sorted filter values
+    """
+    filter_values = conf_dict.get('filter_value') or {}
+    return (version,
+            str(conf_dict['start_date']),
+            str(conf_dict['end_date']),
+            tuple(conf_dict.get('field_filter') or []),  # Order matters for the parent category lookup
+            tuple(sorted((field, tuple(sorted(map(str, values)))) for field, values in filter_values.items())))
+
+
+def invalidates_queries(method):
+    """Decorate a method that changes the transactions, so cached query results from before the change are not used"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.data_version += 1
+    return wrapper
+
+
+class QueryCache:
+    """Least recently used cache of query results, with hit and miss counts
+
+    Results are stored and returned as copies, so callers can modify their dataframe without changing the cache.
+    """
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key, query, copy=True):
+        """Get the cached result for the key, or run the query function and cache its result
+
+        Args:
+            key: Hashable key of the query
+            query: Function running the query
+            copy: If the result is copied, or else shared with the cache so the caller must not modify it
+        """
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return self.results[key].copy() if copy else self.results[key]
+            self.misses += 1
+
+        result = query()
+        with self.lock:
+            self.results[key] = result.copy() if copy else result
+            self.results.move_to_end(key)
+            while len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def stats(self):
+        """Get the hit and miss counts and the number of cached results"""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit rate': self.hits / total if total else 0.0,
+                'size': len(self.results), 'maxsize': self.maxsize}
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+ROLLUP_DIMENSIONS = ['month', 'category', 'parent', 'account name']
+ROLLUP_MEASURES = ['income', 'income count', 'spending', 'spending count', 'count']
+
+
+def rollup_cells(transactions, parents):
+    """Sum the amounts of transactions per month, category, parent category, and account
+
+    Args:
+        transactions: Dataframe or list of transaction dictionaries
+        parents: Dictionary of each category and its parent category
+
+    Returns: Dataframe indexed by the rollup dimensions, with the income and spending sums and counts
+    """
+    df = pd.DataFrame(list(transactions)) if not isinstance(transactions, pd.DataFrame) else transactions
+    if len(df) == 0 or 'posted date' not in df.columns:
+        return pd.DataFrame(columns=ROLLUP_MEASURES, index=pd.MultiIndex.from_arrays([[]] * len(ROLLUP_DIMENSIONS), names=ROLLUP_DIMENSIONS))
+    if '_id' in df.columns:  # Placeholder row of an empty table
+        df = df[df['_id'].astype(str) != 'None']
+
+    amount = pd.to_numeric(df['amount'], errors='coerce')
+    cells = pd.DataFrame({'month': pd.to_datetime(df['posted date'], format='mixed').dt.to_period('M').dt.to_timestamp(),
+                          'category': df['category'].fillna(''),
+                          'parent': df['category'].map(parents).fillna(''),
+                          'account name': df['account name'].fillna(''),
+                          'income': amount.where(amount > 0, 0),
+                          'income count': (amount > 0).astype(int),
+                          'spending': amount.where(amount < 0, 0),
+                          'spending count': (amount < 0).astype(int),
+                          'count': 1})
+    return cells.groupby(ROLLUP_DIMENSIONS)[ROLLUP_MEASURES].sum()
+
+
+class Rollup:
+    """Materialized cube of the income and spending of each month, category, parent category, and account
+
+    Args:
+        table: Dataframe with a column for each rollup dimension and measure
+    """
+    def __init__(self, table=None):
+        if table is None or len(table) == 0:
+            table = pd.DataFrame(columns=ROLLUP_DIMENSIONS + ROLLUP_MEASURES)
+        table = table[ROLLUP_DIMENSIONS + ROLLUP_MEASURES].copy()
+        table['month'] = pd.to_datetime(table['month'])
+        table[ROLLUP_DIMENSIONS[1:]] = table[ROLLUP_DIMENSIONS[1:]].fillna('')
+        self.cells = table.set_index(ROLLUP_DIMENSIONS)[ROLLUP_MEASURES].astype(float)
+
+    @classmethod
+    def build(cls, transactions, parents):
+        """Compute the cube from scratch"""
+        return cls(rollup_cells(transactions, parents).reset_index())
+
+    @property
+    def table(self):
+        return self.cells.reset_index()
+
+    def apply(self, added, removed):
+        """Add the cells of added transactions and subtract the cells of removed transactions
+
+        Args:
+            added: Dataframe of rollup cells, from rollup_cells
+            removed: Dataframe of rollup cells, from rollup_cells
+
+        Returns: Dataframe of the new values of the changed cells, where cells with a count of 0 were removed
+        """
+        changes = added.astype(float).sub(removed.astype(float), fill_value=0)
+        changes = changes[(changes != 0).any(axis=1)]
+        if len(changes) == 0:
+            return changes
+        cells = self.cells.add(changes, fill_value=0)
+        changed = cells.loc[changes.index]
+        self.cells = cells[cells['count'] != 0]
+        return changed
+
+    def relabel(self, parents, categories=None, accounts=None):
+        """Rename categories or accounts and update the parent category of each cell, merging cells that become the same
+
+        Only the cells whose labels change are moved, by removing them and adding them again under their new labels.
+
+        Args:
+            parents: Dictionary of each category and its parent category
+            categories: Dictionary of old and new category names
+            accounts: Dictionary of old and new account names
+
+        Returns: Dataframe of the new values of the changed cells, where cells with a count of 0 were removed
+        """
+        old = self.table
+        new = old.copy()
+        if categories:
+            new['category'] = new['category'].replace(categories)
+        if accounts:
+            new['account name'] = new['account name'].replace(accounts)
+        new['parent'] = new['category'].map(parents).fillna('')
+        moved = (new[ROLLUP_DIMENSIONS] != old[ROLLUP_DIMENSIONS]).any(axis=1)
+        removed = old[moved].set_index(ROLLUP_DIMENSIONS)[ROLLUP_MEASURES]
+        added = new[moved].groupby(ROLLUP_DIMENSIONS)[ROLLUP_MEASURES].sum()
+        return self.apply(added, removed)
+
+    def drop_account(self, account):
+        """Remove all the cells of an account"""
+        self.cells = self.cells[self.cells.index.get_level_values('account name') != account]
+
+    def summarize(self, start_month, end_month):
+        """Sum the cells of the months from start_month to end_month, both included, over the other dimensions"""
+        months = self.cells.index.get_level_values('month')
+        in_window = self.cells[(months >= start_month) & (months <= end_month)]
+        return in_window.groupby(level=ROLLUP_DIMENSIONS[1:]).sum()
+
+
+def full_months(start_date, end_date):
+    """Split a date window into the whole months it covers and the partial months at its edges
+
+    Args:
+        start_date: First day of the window
+        end_date: Last day of the window
+
+    Returns: First and last whole month, or None if there are no whole months, and a list of the (start, end) of the
+        partial edges
+    """
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    first_month = start if start.is_month_start else start + pd.offsets.MonthBegin()
+    stop_month = (end + pd.Timedelta(days=1)).to_period('M').to_timestamp()
+    if first_month >= stop_month:
+        return None, [(start, end)]
+    edges = []
+    if start < first_month:
+        edges.append((start, first_month - pd.Timedelta(days=1)))
+    if stop_month <= end:
+        edges.append((stop_month, end))
+    return (first_month, stop_month - pd.offsets.MonthBegin()), edges
+
+
+def window_bounds(start_date, end_date):
+    """Get the first moment of a date window and the first moment after it, so the last day is whole like the months of
+    the rollup"""
+    return pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+
+
+def empty_summary():
+    return pd.DataFrame(columns=ROLLUP_MEASURES, dtype=float,
+                        index=pd.MultiIndex.from_arrays([[]] * 3, names=ROLLUP_DIMENSIONS[1:]))
+
+
+def summarize_cells(cells):
+    """Sum rollup cells over the months"""
+    if len(cells) == 0:
+        return empty_summary()
+    return cells.astype(float).groupby(level=ROLLUP_DIMENSIONS[1:]).sum()
+
+
+def combine_summaries(summaries):
+    """Add together summaries of different parts of a time window"""
+    summaries = [s for s in summaries if len(s) > 0]
+    if len(summaries) == 0:
+        return empty_summary()
+    combined = summaries[0]
+    for summary in summaries[1:]:
+        combined = combined.add(summary, fill_value=0)
+    return combined.fillna(0).astype(np.float64)
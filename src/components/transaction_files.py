@@ -0,0 +1,156 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import os
+import pandas as pd
+
+from components.bank_formats import detect_bank_format, detect_header_row
+
+# Reading and standardizing uploaded transaction CSVs. This module doesn't import any of the app or the data backends,
+# so the upload worker processes can unpickle standardize_transactions_file without loading the data.
+
+IMPORT_CHUNK_SIZE = 10000
+# Processes parsing uploaded files, which is also the most files parsed ahead of the one being inserted
+UPLOAD_WORKERS = os.cpu_count() or 1
+
+_upload_pool = None
+
+
+def _get_upload_pool():
+    """Get the process pool for parsing uploads, started the first time several files are uploaded at once and reused after"""
+    global _upload_pool
+    if _upload_pool is None:
+        _upload_pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS)
+    return _upload_pool
+
+
+def standardize_transaction_files(sheets, account=None):
+    """Read and standardize several transaction CSVs at once, with each file in its own process
+
+    Each file's result is generated in the order of the files as soon as it's ready, and only UPLOAD_WORKERS files are parsed
+    ahead of the one being used, so the parsed files aren't all held in memory at once. A single file is read one chunk at a
+    time in this process instead, like an import from a path.
+
+    Args:
+        sheets: List of the contents of each transactions CSV, as bytes
+        account: Account name for the transactions, if not given in the CSV
+
+    Returns: Generator of the standardized chunks of each file, or the error string or exception for that file
+    """
+    global _upload_pool
+    if len(sheets) <= 1:
+        for sheet in sheets:
+            yield standardize_transactions_chunks(sheet, account)
+        return
+
+    waiting = iter(sheets)
+    in_flight = deque()
+    for sheet in waiting:
+        in_flight.append(_get_upload_pool().submit(standardize_transactions_file, sheet, account))
+        if len(in_flight) == UPLOAD_WORKERS:
+            break
+    while len(in_flight) > 0:
+        try:
+            result = in_flight.popleft().result()
+        except BrokenProcessPool as e:  # A worker died, so the files after this one go to a new pool
+            _upload_pool = None
+            result = e
+        except Exception as e:
+            result = e
+        next_sheet = next(waiting, None)
+        if next_sheet is not None:
+            in_flight.append(_get_upload_pool().submit(standardize_transactions_file, next_sheet, account))
+        yield result
+
+
+def standardize_transactions_chunks(sheet, account=None):
+    """Read and standardize a transactions CSV one chunk at a time, stopping at the error string of a chunk it can't standardize"""
+    for df in read_transactions(BytesIO(sheet) if isinstance(sheet, bytes) else sheet):
+        df = standardize_transactions(df, account)
+        yield df
+        if isinstance(df, str):
+            return
+
+
+def standardize_transactions_file(sheet, account=None):
+    """Read and standardize all the chunks of a transactions CSV, as a module function so it can run in a separate process"""
+    chunks = []
+    for df in standardize_transactions_chunks(sheet, account):
+        if isinstance(df, str):
+            return df
+        chunks.append(df)
+    return chunks
+
+
+def read_transactions(sheet):
+    """Read the transactions CSV one chunk at a time, starting from the header row of its bank format"""
+    if isinstance(sheet, pd.DataFrame):
+        # Dataframes are read with the first row as the header, so move the header down if needed
+        header_row = detect_header_row(lambda row: sheet.columns if row == 0 else sheet.iloc[row - 1])
+        if header_row > 0:
+            sheet = sheet.iloc[header_row:].set_axis(sheet.iloc[header_row - 1], axis='columns')
+        yield sheet.reset_index(drop=True)
+        return
+
+    def read_header(row):
+        if hasattr(sheet, 'seek'):
+            sheet.seek(0)
+        return pd.read_csv(sheet, index_col=False, header=row, nrows=0).columns
+
+    header_row = detect_header_row(read_header)
+    if hasattr(sheet, 'seek'):
+        sheet.seek(0)
+    for chunk in pd.read_csv(sheet, index_col=False, header=header_row, chunksize=IMPORT_CHUNK_SIZE):
+        yield chunk.reset_index(drop=True)
+
+
+def standardize_transactions(df, account=None):
+    """Standardize the columns of a transactions CSV according to its bank format
+
+    Args:
+        df: Dataframe of the transactions as read from the CSV
+        account: Account name for the transactions, if not given in the CSV
+
+    Returns: Dataframe of the standardized transactions, or the error string
+    """
+    # Convert the bank's columns to the standard columns
+    bank_format = detect_bank_format(tuple(df.columns))
+    if bank_format is None:
+        return 'Error: Must provide "amount" or "credit" and "debit" columns in the CSV'
+    df = bank_format.standardize(df)
+    df = df.dropna(axis='columns', how='all')
+
+    # Description
+    if 'original description' not in df.columns:
+        try:
+            df['original description'] = df['description']
+        except KeyError:
+            return 'Error: Must provide "description" column in the CSV'
+
+    # Multiple accounts in one CSV
+    account_labels = True if 'account name' in df.columns else False
+    if not account_labels and not account:
+        return 'Error: Must provide account name if not given in CSV'
+
+    # Add blank category column if there is none, but keep it default if loading an exported Budgie CSV
+    if account is not None:
+        if 'account name' in df.columns:
+            pass
+        else:
+            df['category'] = ''
+
+    # Remove transactions with no date and replace NA with empty string
+    df = df.dropna(subset='posted date', axis='index')
+    df = df.fillna('')
+
+    # Check to ensure all the necessary columns were converted
+    necessary_columns = ['transaction date', 'posted date', 'description', 'amount']
+    for col in necessary_columns:
+        if col not in df.columns:
+            print(f"Error: CSV does not contain '{col}' column")
+            return f"Error: CSV does not contain '{col}' column"
+
+    if not account_labels:
+        df['account name'] = account
+    return df.reset_index(drop=True)
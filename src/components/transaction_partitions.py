@@ -0,0 +1,201 @@
+from collections import Counter, OrderedDict
+import json
+import os
+import pandas as pd
+from threading import Lock
+
+from components.distinct_values import DISTINCT_FIELDS
+
+# Number of month partitions kept in memory after they're read
+PARTITION_CACHE_SIZE = 24
+MANIFEST_NAME = 'manifest.json'
+
+
+def partition_key(dates):
+    """Get the month partition of each posted date, as 'YYYY-MM'"""
+    return pd.to_datetime(dates).dt.strftime('%Y-%m')
+
+
+def month_bounds(month):
+    """Get the first moment of a month partition and of the month after it"""
+    start = pd.Timestamp(month + '-01')
+    return start, start + pd.offsets.MonthBegin()
+
+
+def _partition_hash(df):
+    """Hash the rows of a partition, to tell if it changed since it was written"""
+    return str(int(pd.util.hash_pandas_object(df.astype(str), index=False).sum()))
+
+
+def _manifest_entry(rows):
+    """Get the manifest entry of a month's transactions, without the hash of its rows"""
+    entry = {'min': str(rows['posted date'].min()), 'max': str(rows['posted date'].max()), 'rows': len(rows)}
+    for field in DISTINCT_FIELDS:
+        entry[field] = {str(value): int(n) for value, n in rows[field].value_counts().items()}
+    return entry
+
+
+class TransactionPartitions:
+    """Transactions stored as one file per month of posted dates, with a manifest of each month's dates and row counts
+
+    Only the months overlapping a queried window are read, and the most recently read months are kept in an LRU cache.
+    Changed months are kept in memory and read instead of their files until they're written.
+
+    Args:
+        directory: Directory of the partition files and the manifest
+        extension: File extension of the partition files
+        read: Function reading a partition file into a dataframe
+        write: Function writing a dataframe to a partition file
+        maxsize: Number of partitions to keep in the cache
+    """
+    def __init__(self, directory, extension, read, write, maxsize=PARTITION_CACHE_SIZE):
+        self.directory = directory
+        self.extension = extension
+        self.read = read
+        self.write = write
+        self.maxsize = maxsize
+        self.manifest = self._read_manifest()
+        self.cache = OrderedDict()
+        self.pending = {}  # Changed months that haven't been written yet
+        self.saving = {}  # Changed months being written, moved aside so the months changed again meanwhile stay pending
+        self.lock = Lock()
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _partition_path(self, month):
+        return os.path.join(self.directory, month + self.extension)
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest):
+        temp_path = self._manifest_path() + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self._manifest_path())
+
+    def exists(self):
+        """Check if the transactions have been stored as partitions"""
+        return self.manifest is not None
+
+    def months(self, start=None, end=None):
+        """Get the months with transactions posted in the window, in order"""
+        return sorted(month for month, entry in (self.manifest or {}).items()
+                      if (start is None or pd.Timestamp(entry['max']) >= pd.Timestamp(start))
+                      and (end is None or pd.Timestamp(entry['min']) <= pd.Timestamp(end)))
+
+    def oldest(self):
+        """Get the first posted date of all the transactions, or None if there aren't any"""
+        months = self.months()
+        return pd.Timestamp(self.manifest[months[0]]['min']) if len(months) > 0 else None
+
+    def value_counts(self):
+        """Get the number of transactions with each category and account, from the manifest"""
+        counts = {field: Counter() for field in DISTINCT_FIELDS}
+        for entry in (self.manifest or {}).values():
+            for field in DISTINCT_FIELDS:
+                counts[field].update(entry.get(field, {}))
+        return counts
+
+    def load(self, month):
+        """Read a month partition, or get it from the changed months or the cache"""
+        with self.lock:
+            for changed in [self.pending, self.saving]:
+                if month in changed:
+                    return changed[month]
+            if month in self.cache:
+                self.cache.move_to_end(month)
+                return self.cache[month]
+        df = self.read(self._partition_path(month))
+        with self.lock:
+            self.cache[month] = df
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return df
+
+    def read_window(self, start=None, end=None):
+        """Get the transactions of the months overlapping the window, sorted by posted date, or None if there aren't any"""
+        frames = [self.load(month) for month in self.months(start, end)]
+        if len(frames) == 0:
+            return None
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0].copy()
+
+    def update(self, month, df):
+        """Replace the transactions of a month in memory, and its manifest entry, until the month is written by save"""
+        with self.lock:
+            self.pending[month] = df
+            if len(df) > 0:
+                self.manifest[month] = _manifest_entry(df)
+            else:
+                self.manifest.pop(month, None)
+
+    def start_save(self):
+        """Move the changed months aside before copying them to save, so changes made during the write stay pending"""
+        with self.lock:
+            self.saving = {**self.saving, **self.pending}
+            self.pending = {}
+
+    def save(self, df, months=None):
+        """Write the months of the sorted transactions that changed since they were last written, and the new manifest
+
+        Args:
+            df: Dataframe of the transactions sorted by posted date, either all of them or at least all of the changed months
+            months: Set of the months that changed, or None to find them by comparing the hash of every month with the manifest
+
+        Returns: List of the months written
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        previous = self._read_manifest() or {}  # Compared to the files as they are now, even if another process wrote them
+        if months is None:
+            manifest = {}
+        else:
+            # Only the changed months are written, and the others keep their entries
+            manifest = {month: entry for month, entry in previous.items() if month not in months}
+        written = []
+        groups = df.groupby(partition_key(df['posted date']).values, sort=True) if len(df) > 0 else []
+        try:
+            for month, rows in groups:
+                if months is not None and month not in months:
+                    continue
+                rows = rows.reset_index(drop=True)
+                entry = {**_manifest_entry(rows), 'hash': _partition_hash(rows)}
+                if months is not None or previous.get(month, {}).get('hash') != entry['hash']:
+                    self.write(rows, self._partition_path(month))
+                    written.append(month)
+                manifest[month] = entry
+        except Exception:
+            with self.lock:  # Saved again with the next write, unless they were changed again
+                self.pending = {**self.saving, **self.pending}
+                self.saving = {}
+            raise
+
+        removed = set(previous) - set(manifest)
+        with self.lock:
+            # Months changed again during the write keep the manifest entries of their pending changes
+            current = dict(manifest)
+            for month in self.pending:
+                if month in self.manifest:
+                    current[month] = self.manifest[month]
+                else:
+                    current.pop(month, None)
+            self.manifest = current
+            self.saving = {}
+            for month in written + list(removed):
+                self.cache.pop(month, None)
+        self._write_manifest(manifest)
+        # Remove the months that no longer have any transactions, after the manifest stops listing them
+        for month in removed:
+            try:
+                os.remove(self._partition_path(month))
+            except FileNotFoundError:
+                pass
+        return written
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
@@ -1,27 +1,42 @@
 import dash
-from dash import callback, dcc, html, Input, Output, no_update
+from dash import callback, dcc, html, Input, Output, State, no_update
 import dash_ag_grid as dag
 import dash_bootstrap_components as dbc
 from datetime import date
 
+from components.grid_query import GRID_BLOCK_SIZE
+from components.maintain_database import TRANSACTION_COLUMNS
 from components.utils import zero_params_dict, MD, EXCLUDE_FROM_TABLE, get_accounts_list
 
 
+def _format_rows(transactions):
+    """Convert a dataframe of transactions to the grid's row dictionaries"""
+    transactions = transactions.copy()
+    transactions.loc[:, '_id'] = [str(tid) for tid in transactions['_id']]
+    transactions['transaction date'] = transactions['transaction date'].dt.strftime('%m-%d-%Y')
+    transactions['posted date'] = transactions['posted date'].dt.strftime('%m-%d-%Y')
+    return transactions.to_dict('records')
+
+
+def _filtered_rows(conf_dict, filter_model):
+    """Get the grid rows of every transaction matching the configuration parameters and the grid's column filters"""
+    _, total = MD.page_transactions(conf_dict, 0, 1, filter_model=filter_model)
+    transactions, _ = MD.page_transactions(conf_dict, 0, total, filter_model=filter_model)
+    return [row for row in _format_rows(transactions) if row['_id'] != 'None']
+
+
 def make_table(conf_dict):
-    """Query the transactions and organize the data into a table, giving the correct parameters to each column
+    """Make the transactions table, giving the correct parameters to each column
+
+    The rows are requested from the data layer one block at a time as the table is scrolled, sorted, or filtered,
+    so making a new table also clears the blocks loaded for the previous parameters.
 
     Args:
         conf_dict: Dictionary of the configuration parameters.
 
-    Returns: Data and Columns dictionary
+    Returns: AgGrid of the transactions
     """
-    transactions = MD.query_transactions(conf_dict)
-    transactions.loc[:, '_id'] = [str(tid) for tid in transactions['_id']]
-    transactions = transactions.sort_values('posted date', ascending=False)
-    transactions['transaction date'] = transactions['transaction date'].dt.strftime('%m-%d-%Y')
-    transactions['posted date'] = transactions['posted date'].dt.strftime('%m-%d-%Y')
-    data = transactions.to_dict('records')
-    columns = [{"field": i} for i in transactions.columns]
+    columns = [{"field": i} for i in TRANSACTION_COLUMNS]
 
     # Update the column format for each column
     for col in columns:
@@ -48,17 +63,22 @@ def make_table(conf_dict):
             col['width'] = 150
         elif col['field'] == 'transaction date':
             col['checkboxSelection'] = True
-            col['headerCheckboxSelection'] = True
-            col['headerCheckboxSelectionFilteredOnly'] = True
             col['filter'] = 'agDateColumnFilter'
             col['width'] = 175
         elif col['field'] == 'notes':
             col['editable'] = True
-    return {'data': data, 'columns': columns}
 
+    return dag.AgGrid(id="transactions-table",
+                      style={"height": '600px'},
+                      columnDefs=columns,
+                      columnSize="autoSize",
+                      defaultColDef={'filter': True, "resizable": True, 'sortable': True},
+                      rowModelType="infinite",
+                      getRowId="params.data._id",
+                      dashGridOptions={"rowSelection": "multiple", "cacheBlockSize": GRID_BLOCK_SIZE, "maxBlocksInCache": 10,
+                                       "infiniteInitialRowCount": GRID_BLOCK_SIZE}
+                      )
 
-# Make initial table
-tab = make_table(zero_params_dict())
 
 transaction_tab = dcc.Tab(label="Transactions", value='Transactions', children=[
         html.Div(style={'width': '100%', 'float': 'left'}, className='tab-body',
@@ -66,6 +86,10 @@ transaction_tab = dcc.Tab(label="Transactions", value='Transactions', children=[
                      html.Div(style={'padding': '10px', 'display': 'inline-block'},
                               children=[dbc.Button(children=["Edit ", html.I(className="fa-solid fa-pen-to-square")],
                                                    style={'width': '80px'}, id="transact-edit", disabled=True, color="primary")]),
+                     html.Div(style={'padding': '10px', 'display': 'inline-block'},
+                              children=[dbc.Button(children=["Select All ", html.I(className="fa-solid fa-check-double")],
+                                                   style={'width': '120px'}, id="transact-select-all", color="secondary")]),
+                     dcc.Store(id='transactions-select-all', data=None),
                      dbc.Modal(id="edit-modal", is_open=False, children=[
                          dbc.ModalHeader(dbc.ModalTitle("Edit Transactions")),
                          dbc.ModalBody(children=[
@@ -131,24 +155,32 @@ transaction_tab = dcc.Tab(label="Transactions", value='Transactions', children=[
                                                  'Add new transactions either by uploading a CSV file or inputting a manual transaction from the menu on the left.', html.Br(), html.Br(),
                                                  'Quick edit a single transaction by double clicking the value to modify, or select row(s) and use the Edit button for more detailed edits.', html.Br(), html.Br(),
                                                  'Shift + click to select a range of transactions, or ctrl + click to select multiple individual transactions. '
-                                                 'Press the space bar to undo/redo your selection.'
+                                                 'Press the space bar to undo/redo your selection. Select All selects every transaction matching the current filters, '
+                                                 'including the ones not scrolled to yet.'
                                                  ])]),
 
                      html.Div(style={'padding': '10px 50px 0 0', 'float': 'right'}, id='transactions-stats', children=[]),
 
-                     dag.AgGrid(id="transactions-table",
-                                style={"height": '600px'},
-                                rowData=tab.get('data'),
-                                columnDefs=tab.get('columns'),
-                                columnSize="autoSize",
-                                defaultColDef={'filter': True, "resizable": True, 'sortable': True},
-                                dashGridOptions={"rowSelection": "multiple"}
-                                ),
+                     html.Div(id='transactions-grid', children=[make_table(zero_params_dict())]),
                  ]),
         html.Div(style={'height': '8px', 'width': '75%', 'float': 'left'}, id='blank-space-2')
     ])
 
 
+@callback(
+    Output('transactions-table', 'getRowsResponse'),
+    Input('transactions-table', 'getRowsRequest'),
+    State('current-config-memory', 'data'),
+)
+def get_table_rows(request, conf_dict):
+    """Send the block of rows the table requested, sorted and filtered by the data layer"""
+    if request is None:
+        return no_update
+    transactions, total = MD.page_transactions(conf_dict or zero_params_dict(), request['startRow'], request['endRow'],
+                                               request.get('sortModel'), request.get('filterModel'))
+    return {'rowData': _format_rows(transactions), 'rowCount': total}
+
+
 @callback(
     Output('blank-space-1', 'children'),
     Input('transactions-table', 'cellValueChanged')
@@ -184,9 +216,11 @@ def update_table_data(change_data):
     Output('new-note-input', 'value'),
     Output('transactions-stats', 'children'),
     Output('update-tab', 'data', allow_duplicate=True),
+    Output('transactions-select-all', 'data'),
 
     Input('transact-edit', 'n_clicks'),
     Input('transact-delete', 'n_clicks'),
+    Input('transact-select-all', 'n_clicks'),
     Input('transactions-table', 'selectedRows'),
     Input("n-modal-cancel", "n_clicks"),
     Input("n-modal-submit", "n_clicks"),
@@ -199,9 +233,13 @@ def update_table_data(change_data):
     Input('new-account-dropdown', 'value'),
     Input('new-account-input', 'value'),
     Input('new-note-input', 'value'),
+    State('transactions-table', 'getRowsRequest'),
+    State('current-config-memory', 'data'),
+    State('transactions-select-all', 'data'),
     prevent_initial_call=True,
 )
-def bulk_update_table(edit_button, delete_button, row_data, cancel, submit, category, new_category, amount, t_date, p_date, description, account, new_account, new_note):
+def bulk_update_table(edit_button, delete_button, select_all_button, row_data, cancel, submit, category, new_category, amount, t_date, p_date, description, account,
+                      new_account, new_note, rows_request, conf_dict, select_all):
     trigger = dash.callback_context.triggered[0]['prop_id']
 
     is_open = False
@@ -209,6 +247,20 @@ def bulk_update_table(edit_button, delete_button, row_data, cancel, submit, cate
     enabled = True
     update_tab = no_update
 
+    # Select All selects the rows of the current parameters and filters on the server, since the table only has the blocks scrolled to.
+    # Picking rows in the table again, or changing the parameters or filters, goes back to the rows selected in the table.
+    conf_dict = conf_dict or zero_params_dict()
+    filter_model = (rows_request or {}).get('filterModel') or {}
+    if trigger == 'transact-select-all.n_clicks':
+        select_all = {'conf': conf_dict, 'filterModel': filter_model}
+    elif trigger == 'transactions-table.selectedRows':
+        select_all = None
+    if select_all is not None and select_all == {'conf': conf_dict, 'filterModel': filter_model}:
+        row_data = _filtered_rows(conf_dict, filter_model)
+    else:
+        select_all = None
+    row_data = row_data or []
+
     if category == 'Add new category...':
         cat_style = {'display': 'inline-block', 'width': '400px'}
     else:
@@ -233,7 +285,7 @@ def bulk_update_table(edit_button, delete_button, row_data, cancel, submit, cate
         ph_category = 'New Category'
         ph_description = 'New Transaction Description'
 
-    if trigger == 'transactions-table.selectedRows' and (row_data is None or len(row_data) > 0):
+    if trigger in ['transactions-table.selectedRows', 'transact-select-all.n_clicks'] and len(row_data) > 0:
         enabled = False
 
     elif trigger == 'transact-delete.n_clicks':
@@ -284,7 +336,6 @@ def bulk_update_table(edit_button, delete_button, row_data, cancel, submit, cate
                 MD.add_account(new_account)
             if new_category:
                 MD.add_category(new_category)
-            MD.export_data_to_csv()
 
             category = None
             new_category = None
@@ -318,8 +369,11 @@ def bulk_update_table(edit_button, delete_button, row_data, cancel, submit, cate
     else:
         transaction_stats = []
 
+    if update_tab is True:
+        select_all = None
+
     return enabled, enabled, is_open, category, cat_style, new_category, MD.get_categories_list('new'), ph_category, amount, ph_amount, t_date, ph_transaction, p_date, ph_posted, \
-        description, ph_description, account, account_style, new_account, ph_account, msg_str, new_note, transaction_stats, update_tab
+        description, ph_description, account, account_style, new_account, ph_account, msg_str, new_note, transaction_stats, update_tab, select_all
 
 
 @callback(
@@ -3,6 +3,8 @@ from dash import callback, dcc, html, Input, Output
 import dash_bootstrap_components as dbc
 from datetime import date, timedelta, datetime
 from dateutil.relativedelta import relativedelta
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
@@ -21,21 +23,20 @@ def make_trends_plot(conf_dict):
     """
 
     def _sort_plot_data():
-        if len(transactions) == 0 or transactions.iloc[0].description == 'No Available Data':
-            l_v = {'Spending': {'labels': [0], 'values': [0]},
-                   'Income': {'labels': [0], 'values': [0]}}
-        else:
-            l_v = {'Spending': {'labels': [], 'values': []},
-                   'Income': {'labels': [], 'values': []}}
-            for cat, grp in transactions.groupby(conf_dict['sort_filter'].lower()):
-                inc_amount = grp['amount'][grp['amount'] > 0].sum()
-                spd_amount = grp['amount'][grp['amount'] < 0].sum()
-                if spd_amount:
-                    l_v['Spending']['labels'].append(cat)
-                    l_v['Spending']['values'].append(-spd_amount)
-                if inc_amount:
-                    l_v['Income']['labels'].append(cat)
-                    l_v['Income']['values'].append(inc_amount)
+        l_v = {'Spending': {'labels': [], 'values': []},
+               'Income': {'labels': [], 'values': []}}
+        # Filter categories to display
+        shown = summary[~summary.index.get_level_values('category').isin(MD.get_hide_from_trends())]
+        totals = shown.groupby(level=conf_dict['sort_filter'].lower())[['income', 'spending']].sum()
+        for cat, row in totals.iterrows():
+            inc_amount = row['income']
+            spd_amount = row['spending']
+            if spd_amount:
+                l_v['Spending']['labels'].append(cat)
+                l_v['Spending']['values'].append(-spd_amount)
+            if inc_amount:
+                l_v['Income']['labels'].append(cat)
+                l_v['Income']['values'].append(inc_amount)
 
         for spin in ['Spending', 'Income']:
             if len(l_v[spin]['values']) > 0:
@@ -44,30 +45,18 @@ def make_trends_plot(conf_dict):
                 l_v[spin]['values'], l_v[spin]['labels'] = [0], [0]
         return l_v
 
-    # Get transactions
-    transactions = MD.query_transactions(conf_dict)
+    # Get income and spending per category and account, mostly from the monthly rollup
+    summary = MD.summarize_transactions(conf_dict)
 
     # Check if any transaction data, and if not, annotate the plot to let user know it's not broken
     plot_type = conf_dict['plot_type']
-    if len(transactions) == 1 and transactions.loc[0]['description'] == 'No Available Data':
+    if summary['count'].sum() == 0:
         text = 'No data found for these filters. Try selecting a different filter.'
-        all_data = MD.transactions_table.find()
-        try:
-            len(all_data)
-            desc = all_data.loc[0]['description']
-        except TypeError:
-            all_data = list(all_data)
-            try:
-                desc = all_data[0]['description'] == 'No Available Data'
-            except IndexError:
-                text = 'No data found. Start by adding a transaction CSV file or individual transaction on the right.'
-        if len(all_data) >= 1 and desc == 'No Available Data':
+        # The rollup has a cell for every month, category, and account with transactions
+        if len(MD.get_rollup().cells) == 0:
             text = 'No data found. Start by adding a transaction CSV file or individual transaction on the right.'
         plot_type = 'text_only'
 
-    # Filter transactions to display
-    transactions = transactions[~transactions['category'].isin(MD.get_hide_from_trends())]
-
     # Make bar plot
     if plot_type == 'bar':
         fig_obj = go.Figure()
@@ -108,6 +97,8 @@ def make_trends_plot(conf_dict):
     # Or plot over time
     elif plot_type == 'time':
         fig_obj = go.Figure()
+        transactions = MD.query_transactions(conf_dict)
+        transactions = transactions[~transactions['category'].isin(MD.get_hide_from_trends())]
 
         # Get each date to query data, filtering by day/week/month based on overall length of time window
         start_date = datetime.strptime(conf_dict['start_date'], '%Y-%m-%d').date()
@@ -128,21 +119,21 @@ def make_trends_plot(conf_dict):
             if previous_date <= start_date:
                 break
 
-        # Calculate spending at each date
-        val_dict = {}
-        net = []
-        for i in range(len(days) - 1):
-            this_month = transactions[(transactions['posted date'].dt.date < days[i]) & (transactions['posted date'].dt.date >= days[i + 1])]
-            net.append(this_month['amount'].sum())
-            for cat, grp in this_month.groupby(conf_dict['sort_filter'].lower()):
-                try:
-                    val_dict[cat]['posted date'].append(days[i + 1])
-                    val_dict[cat]['amount'].append(grp['amount'].sum())
-                except KeyError:
-                    val_dict[cat] = {'posted date': [days[i + 1]], 'amount': [grp['amount'].sum()]}
+        # Bin each transaction into the time period from days[i + 1] up to, but not including, days[i]
+        edges = pd.to_datetime(days[::-1]).values
+        position = np.searchsorted(edges, transactions['posted date'].dt.normalize().values, side='right') - 1
+        in_period = (position >= 0) & (position < len(days) - 1)
+        binned = transactions[in_period].assign(period=len(days) - 2 - position[in_period])
+
+        # Calculate spending in each time period
+        net = binned.groupby('period')['amount'].sum().reindex(range(len(days) - 1), fill_value=0).tolist()
+        period_sums = binned.groupby([conf_dict['sort_filter'].lower(), 'period'])['amount'].sum()
 
         # Alphabetize list of categories
-        val_dict = dict(sorted(val_dict.items()))
+        val_dict = {}
+        for cat, sums in period_sums.groupby(level=0):
+            sums = sums.droplevel(0)
+            val_dict[cat] = {'posted date': [days[i + 1] for i in sums.index], 'amount': sums.tolist()}
 
         # Add lines and bars
         fig_obj.add_trace(go.Scatter(x=days[1:], y=net, name='Net Transactions', mode='markers+lines',
@@ -1,12 +1,16 @@
+import atexit
 from datetime import date, datetime
 from dotenv import load_dotenv
+from multiprocessing import parent_process
 import os
 import sys
 
 from components.maintain_database import MaintainDatabase
+from components.maintain_sqlite import MaintainSQLite
+from components.maintain_transactions_arrow import MaintainArrow
 from components.maintain_transactions_csv import MaintainCSV
 
-EXCLUDE_FROM_TABLE = ['_id', 'original description']
+EXCLUDE_FROM_TABLE = ['_id', 'original description', 'fingerprint']
 
 PLOTLY_COLORS = [
     '#636EFA',
@@ -40,9 +44,18 @@ COLORS = {
 print('Welcome to Budgie! \n\n'
       'To get started, open a web browser and go to http://127.0.0.1:8050/ \n\n')
 load_dotenv()
-if os.getenv("MONGO_HOST") is not None:
+if parent_process() is not None:
+    # Worker processes only standardize uploaded files, and must never load or write the data
+    MD = None
+elif os.getenv("MONGO_HOST") is not None:
     MD = MaintainDatabase()
     print(f"Using Mongo data from {os.getenv('MONGO_HOST')}")
+elif os.getenv("SQLITE_PATH") is not None:
+    MD = MaintainSQLite()
+    print(f"Using SQLite data from {os.getenv('SQLITE_PATH')}")
+elif os.getenv("ARROW_DIR") is not None:
+    MD = MaintainArrow()
+    print(f"Using Feather data from {os.getenv('ARROW_DIR')}")
 elif os.getenv("DATA_DIR") is not None:
     MD = MaintainCSV()
     print(f"Using CSV data from {os.getenv('DATA_DIR')}")
@@ -50,9 +63,13 @@ elif getattr(sys, 'frozen', False):
     MD = MaintainCSV()
     print(f"Using CSV data from default directory: {os.getcwd()}")
 else:
-    print("You must specify either 'DATA_DIR=C:\path\to\dir' or 'MONGO_HOST==mongodb://ip.to.mongo:27017/' in the .env file")
+    print("You must specify either 'DATA_DIR=C:\path\to\dir', 'ARROW_DIR=C:\path\to\dir', 'SQLITE_PATH=C:\path\to\budgie.db', or 'MONGO_HOST==mongodb://ip.to.mongo:27017/' in the .env file")
     quit()
 
+if isinstance(MD, MaintainCSV):
+    # Write any changes that are still waiting for the flush delay when the app exits
+    atexit.register(MD.export_data_to_csv)
+
 
 def zero_params_dict():
     """Create empty dictionary with parameter keys.
@@ -88,15 +105,11 @@ def get_accounts_list(extra=''):
 
     Parameter to add an additional "Add new account..." option
     """
-    acc_list = []
+    acc_list = MD.get_distinct_values().values('account name')
     if extra == 'new':
-        acc_list = list(MD.transactions_table.find().distinct('account name'))
         acc_list.extend(['Add new account...'])
-    if extra == 'multi':
-        acc_list = list(MD.transactions_table.find().distinct('account name'))
+    elif extra == 'multi':
         acc_list.extend(['Multiple accounts...', 'Add new account...'])
-    else:
-        acc_list.extend(MD.transactions_table.find().distinct('account name'))
 
     try:  # Quick check for when there's actually no accounts available
         acc_list.remove('None')
@@ -0,0 +1,142 @@
+import os
+import sys
+
+from bson import ObjectId
+import numpy as np
+import pandas as pd
+import pytest
+
+# The app's modules are imported from the src directory, like when Budgie is run from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from components.maintain_sqlite import MaintainSQLite, convert_csv_data
+from components.maintain_transactions_csv import MaintainCSV
+
+ACCOUNTS = ['Checking', 'Credit Card', 'Savings']
+# Each category and its parent category
+CATEGORIES = {'food': '', 'groceries': 'food', 'coffee': 'food', 'auto': '', 'gas': 'auto', 'income': '', 'unknown': ''}
+DESCRIPTIONS = ['TRADER JOES #552', 'STARBUCKS STORE 1234', 'SHELL OIL 5555', 'PAYROLL ACME CORP', 'AMAZON MKTPLACE PMTS']
+# Configuration of every transaction, queried instead of loading all the CSV partitions
+ALL_TIME = {'start_date': '2000-01-01', 'end_date': '2100-01-01', 'field_filter': [], 'filter_value': {}}
+
+
+def make_transactions(n=200, seed=0):
+    """Make random transactions posted over two years, with ObjectId ids so they can also be copied into SQLite"""
+    rng = np.random.default_rng(seed)
+    posted = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 730, n), unit='D')
+    descriptions = rng.choice(DESCRIPTIONS, n)
+    return pd.DataFrame({'_id': [str(ObjectId()) for _ in range(n)],
+                         'transaction date': posted - pd.to_timedelta(rng.integers(0, 3, n), unit='D'),
+                         'posted date': posted,
+                         'category': rng.choice([cat for cat, parent in CATEGORIES.items() if parent], n),
+                         'description': descriptions,
+                         'amount': np.round(rng.normal(-40, 60, n), 2),
+                         'original description': descriptions,
+                         'account name': rng.choice(ACCOUNTS, n),
+                         'notes': ''})
+
+
+def write_csv_data(data_dir, transactions):
+    """Write the transactions, accounts, categories, and budget as CSV data files"""
+    transactions.to_csv(os.path.join(data_dir, 'transactions.csv'), index=False)
+    pd.DataFrame({'account name': ACCOUNTS, 'status': 'open', 'initial balance': [100, 0, 1000],
+                  '_id': [str(ObjectId()) for _ in ACCOUNTS]}).to_csv(os.path.join(data_dir, 'accounts.csv'), index=False)
+    pd.DataFrame({'parent': list(CATEGORIES.values()), 'category name': list(CATEGORIES), 'hidden': False,
+                  '_id': [str(ObjectId()) for _ in CATEGORIES]}).to_csv(os.path.join(data_dir, 'categories.csv'), index=False)
+    pd.DataFrame({'category': ['groceries', 'coffee', 'food', 'income'], 'value': [-400, -50, -450, 5000],
+                  'is_parent': [False, False, True, False],
+                  '_id': [str(ObjectId()) for _ in range(4)]}).to_csv(os.path.join(data_dir, 'budget.csv'), index=False)
+
+
+def open_backend(kind, data_dir, db_path):
+    """Open the CSV data directory with the CSV backend, or copy it into a SQLite database and open that"""
+    if kind == 'csv':
+        return MaintainCSV()
+    convert_csv_data(str(data_dir), str(db_path))
+    return MaintainSQLite(str(db_path))
+
+
+def close_backend(md):
+    """Stop any waiting CSV write, or close the SQLite connection"""
+    if isinstance(md, MaintainCSV):
+        if md.flush_timer is not None:
+            md.flush_timer.cancel()
+        if md.compaction is not None:
+            md.compaction.join()
+    else:
+        md.connection.close()
+
+
+def reopen_backend(md):
+    """Write any waiting CSV changes and open the stored data again, to check what was saved"""
+    if isinstance(md, MaintainCSV):
+        md.export_data_to_csv()
+        return MaintainCSV()
+    return MaintainSQLite(md.path)
+
+
+def stored_row(md, table, field, value):
+    """Get a stored row as the grid sends it to the data layer, with the id"""
+    if isinstance(md, MaintainCSV):
+        rows = md.query_transactions(ALL_TIME) if table == 'transactions' else getattr(md, f"{table}_table")
+        return rows[rows[field] == value].iloc[0].to_dict()
+    return next(iter(getattr(md, f"{table}_table").find({field: value})))
+
+
+def transaction_ids(md, account):
+    """Get the ids of an account's transactions, in order of posted date"""
+    rows = md.query_transactions(ALL_TIME)
+    rows = rows[rows['account name'] == account]
+    return [str(tid) for tid in rows.sort_values('posted date', kind='stable')['_id']]
+
+
+def add_transaction(md):
+    md.add_one_transaction('gas', -30.5, '2022-06-01', '2022-06-02', 'SHELL OIL 5555', 'Checking', '')
+
+
+def import_statement(md):
+    """Import a statement with new transactions, including one posted before all the others"""
+    statement = pd.DataFrame({'Transaction Date': ['12/30/2021', '01/05/2024', '01/05/2024'],
+                              'Post Date': ['12/31/2021', '01/06/2024', '01/07/2024'],
+                              'Description': ['OPENING DEPOSIT', 'STARBUCKS STORE 1234', 'PAYROLL ACME CORP'],
+                              'Amount': [500, -4.75, 2500]})
+    md.load_transactions(statement, 'Savings')
+
+
+def edit_transactions(md):
+    """Change the amount, posted date, and account of transactions, moving one to an earlier month"""
+    first, second = transaction_ids(md, 'Checking')[-2:]
+    md.edit_many_transactions([{'_id': first, 'posted date': '2022-02-10', 'transaction date': '2022-02-09', 'amount': -99.99},
+                               {'_id': second, 'posted date': '2023-03-03', 'transaction date': '2023-03-03',
+                                'account name': 'Savings', 'category': 'income', 'amount': 12.5}])
+
+
+def delete_transaction(md):
+    md.delete_transaction([stored_row(md, 'transactions', '_id', transaction_ids(md, 'Checking')[0])])
+
+
+def delete_account(md):
+    md.delete_account(stored_row(md, 'accounts', 'account name', 'Credit Card'))
+
+
+# Changes to the transactions, which the materialized views are updated for
+TRANSACTION_CHANGES = [add_transaction, import_statement, edit_transactions, delete_transaction, delete_account]
+
+
+@pytest.fixture
+def csv_dir(tmp_path, monkeypatch):
+    """Directory of CSV data, which the CSV backend opens from DATA_DIR and only writes when a test asks it to"""
+    monkeypatch.setenv('CSV_FLUSH_DELAY', '3600')
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    write_csv_data(data_dir, make_transactions())
+    monkeypatch.setenv('DATA_DIR', str(data_dir))
+    return data_dir
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def md(request, csv_dir, tmp_path):
+    """Data backend opened on the test data"""
+    md = open_backend(request.param, csv_dir, tmp_path / 'budgie.db')
+    yield md
+    close_backend(md)
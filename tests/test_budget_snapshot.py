@@ -0,0 +1,22 @@
+import pandas as pd
+
+from components.budget_snapshot import BudgetSnapshot
+
+from conftest import reopen_backend
+
+
+def test_budget_dicts_split_groups_income_and_spending():
+    snapshot = BudgetSnapshot(pd.DataFrame({'category': ['food', 'groceries', 'income'], 'value': [-450, -400, 5000],
+                                            'is_parent': [True, False, float('nan')]}))
+    assert snapshot.budget_dicts() == ({'income': 5000}, {'groceries': -400}, {'food': -450})
+    assert snapshot.amount(['groceries', 'coffee']) == -400
+
+
+def test_snapshot_matches_stored_budget(md):
+    md.add_budget_item('gas', -100)
+    md.add_budget_item('groceries', -500)
+    md.rm_budget_item('income', 5000)
+    # The group budget of the parent category is the sum of its children
+    assert md.get_budget_amount('food') == -550
+    reopened = reopen_backend(md)
+    assert md.get_budget_dict() == BudgetSnapshot(reopened.budget_table.find()).budget_dicts()
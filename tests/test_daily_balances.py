@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from components.daily_balances import DailyBalances, balance_changes
+
+from conftest import TRANSACTION_CHANGES, reopen_backend
+
+
+def test_apply_only_changes_following_days():
+    balances = DailyBalances.build(pd.DataFrame({'account name': ['A', 'A', 'B'], 'amount': [10.0, 5.0, 1.0],
+                                                 'posted date': pd.to_datetime(['2022-01-01', '2022-01-03', '2022-01-02'])}))
+    changed = balances.apply(balance_changes(pd.DataFrame({'account name': ['A'], 'amount': [2.0],
+                                                           'posted date': pd.to_datetime(['2022-01-02'])})))
+    assert balances.account_balances('A').tolist() == [10.0, 12.0, 17.0]
+    assert balances.account_balances('B').tolist() == [1.0]
+    assert list(changed) == ['A']
+    assert changed['A'][1]['posted date'].tolist() == list(pd.to_datetime(['2022-01-02', '2022-01-03']))
+
+
+@pytest.mark.parametrize('change', TRANSACTION_CHANGES, ids=lambda change: change.__name__)
+def test_incremental_balances_match_rebuilt(md, change):
+    md.get_daily_balances()
+    change(md)
+    assert md.get_daily_balances().compare(DailyBalances.build(md._all_transactions())) == []
+
+
+def test_stored_balances_match_rebuilt(md):
+    md.get_daily_balances()
+    for change in TRANSACTION_CHANGES:
+        change(md)
+    reopened = reopen_backend(md)
+    stored = reopened._load_balances()
+    assert stored is not None
+    assert stored.compare(DailyBalances.build(reopened._all_transactions())) == []
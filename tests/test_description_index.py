@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from components.description_index import SHORTLIST_SIZE, DescriptionIndex
+
+from conftest import ACCOUNTS, TRANSACTION_CHANGES, delete_account, delete_transaction, reopen_backend, stored_row
+
+
+def delete_category(md):
+    md.delete_category(stored_row(md, 'categories', 'category name', 'gas'))
+
+
+def categories(records):
+    return {rec['original description']: rec['category'] for rec in records}
+
+
+def test_close_match_outside_top_trigram_counts_is_found():
+    index = DescriptionIndex()
+    # Many descriptions sharing the store number, ahead of the close match in the order they were added
+    for i in range(3 * SHORTLIST_SIZE):
+        index.add(f"STORE 1234 ITEM {i:03d}", 'shopping', pd.Timestamp('2022-01-01'))
+    index.add('1234 STARBUCKS STORE', 'coffee', pd.Timestamp('2022-01-01'))
+    assert index.get_category('STARBUCKS STORE 1234') == 'coffee'
+
+
+def test_recent_category_wins_and_relabel_changes_it():
+    index = DescriptionIndex()
+    assert index.add('SHELL OIL 5555', 'auto', pd.Timestamp('2022-02-01'))
+    assert not index.add('SHELL OIL 5555', 'unknown', pd.Timestamp('2022-01-01'))
+    assert index.get_category('SHELL OIL 5556') == 'auto'
+    assert index.relabel({'auto': 'gas'}) == ['SHELL OIL 5555']
+    assert index.records() == [{'original description': 'SHELL OIL 5555', 'category': 'gas', 'posted date': pd.Timestamp('2022-02-01')}]
+
+
+@pytest.mark.parametrize('change', TRANSACTION_CHANGES + [delete_category], ids=lambda change: change.__name__)
+def test_stored_index_matches_rebuilt(md, change):
+    for account in ACCOUNTS:
+        md._get_categories(account)
+    change(md)
+    reopened = reopen_backend(md)
+    for account in ACCOUNTS:
+        stored = reopened._load_descriptions(account)
+        rebuilt = DescriptionIndex.from_records(reopened._description_records(account)).records()
+        # Deleting transactions drops the account's stored index, which is built again the next time it's needed
+        assert categories(stored) == categories(rebuilt) or (len(stored) == 0 and change in [delete_transaction, delete_account])
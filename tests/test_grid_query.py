@@ -0,0 +1,111 @@
+import mongomock
+import pytest
+
+from components.grid_query import grid_filter_mask, grid_filter_to_mongo, grid_key, grid_sort
+
+from conftest import make_transactions
+
+
+def text(kind, value=None):
+    return {'filterType': 'text', 'type': kind, 'filter': value}
+
+
+def number(kind, value, value_to=None):
+    return {'filterType': 'number', 'type': kind, 'filter': value, 'filterTo': value_to}
+
+
+def date(kind, value, value_to=None):
+    return {'filterType': 'date', 'type': kind, 'dateFrom': value, 'dateTo': value_to}
+
+
+# Filter models like the grid sends them, covering each filter type of the transactions table's columns
+FILTER_MODELS = {
+    'contains': {'description': text('contains', 'store')},
+    'not contains': {'description': text('notContains', 'STORE')},
+    'starts with': {'description': text('startsWith', 'payroll')},
+    'ends with': {'description': text('endsWith', '5555')},
+    'text equals': {'category': text('equals', 'coffee')},
+    'text not equal': {'category': text('notEqual', 'coffee')},
+    'special characters': {'description': text('contains', '#552')},
+    'blank': {'notes': text('blank')},
+    'not blank': {'notes': text('notBlank')},
+    'number equals': {'amount': number('equals', -40.0)},
+    'less than': {'amount': number('lessThan', -40)},
+    'greater than or equal': {'amount': number('greaterThanOrEqual', 0)},
+    'number in range': {'amount': number('inRange', -50, 10)},
+    'date equals': {'posted date': date('equals', '2022-03-15 00:00:00')},
+    'date not equal': {'posted date': date('notEqual', '2022-03-15 00:00:00')},
+    'before date': {'posted date': date('lessThan', '2022-06-01 00:00:00')},
+    'after date': {'posted date': date('greaterThan', '2023-06-01 00:00:00')},
+    'on or before date': {'posted date': date('lessThanOrEqual', '2022-03-15 00:00:00')},
+    'on or after date': {'posted date': date('greaterThanOrEqual', '2022-03-15 00:00:00')},
+    'date in range': {'posted date': date('inRange', '2022-06-01 00:00:00', '2022-09-01 00:00:00')},
+    'or conditions': {'category': {'filterType': 'text', 'operator': 'OR',
+                                   'conditions': [text('equals', 'coffee'), text('equals', 'gas')]}},
+    'and conditions': {'amount': {'filterType': 'number', 'operator': 'AND',
+                                  'conditions': [number('lessThan', 0), number('greaterThan', -30)]}},
+    'older conditions': {'description': {'filterType': 'text', 'operator': 'OR', 'condition1': text('startsWith', 'shell'),
+                                         'condition2': text('startsWith', 'amazon')}},
+    'several columns': {'account name': text('equals', 'Checking'), 'amount': number('lessThan', 0),
+                        'posted date': date('greaterThan', '2022-12-31 00:00:00')},
+}
+
+
+@pytest.fixture(scope='module')
+def transactions():
+    df = make_transactions(n=500)
+    df.loc[::3, 'amount'] = -40.0
+    df.loc[::7, 'notes'] = 'reimbursed'
+    df.loc[::11, 'posted date'] = df.loc[0, 'posted date'].replace(year=2022, month=3, day=15, hour=14)
+    return df
+
+
+@pytest.fixture(scope='module')
+def collection(transactions):
+    collection = mongomock.MongoClient().db.transactions
+    collection.insert_many(transactions.to_dict('records'))
+    return collection
+
+
+@pytest.mark.parametrize('filter_model', FILTER_MODELS.values(), ids=FILTER_MODELS.keys())
+def test_mongo_filter_matches_dataframe_mask(transactions, collection, filter_model):
+    expected = set(transactions.loc[grid_filter_mask(transactions, filter_model), '_id'])
+    assert 0 < len(expected) < len(transactions)
+    assert {doc['_id'] for doc in collection.find(grid_filter_to_mongo(filter_model))} == expected
+
+
+def test_no_filter_matches_everything(transactions):
+    assert grid_filter_to_mongo({}) == {}
+    assert grid_filter_mask(transactions, None).all()
+
+
+def test_unknown_column_is_ignored_by_mask(transactions):
+    assert grid_filter_mask(transactions, {'missing': text('contains', 'x')}).all()
+
+
+def test_sort_defaults_to_newest_first():
+    assert grid_sort(None) == [('posted date', -1)]
+    assert grid_sort([{'colId': 'amount', 'sort': 'asc'}, {'colId': 'category', 'sort': 'desc'}]) == [('amount', 1), ('category', -1)]
+
+
+def test_grid_key_ignores_order_of_filtered_columns():
+    first = {'amount': number('lessThan', 0), 'category': text('equals', 'gas')}
+    second = {'category': text('equals', 'gas'), 'amount': number('lessThan', 0)}
+    assert grid_key(None, first) == grid_key([], second)
+    assert grid_key(None, first) != grid_key([{'colId': 'amount', 'sort': 'asc'}], first)
+
+
+def test_blocks_are_slices_of_all_rows(md):
+    conf = {'start_date': '2022-01-01', 'end_date': '2023-12-31', 'field_filter': [], 'filter_value': {}}
+    sort_model = [{'colId': 'amount', 'sort': 'asc'}]
+    filter_model = {'amount': number('lessThan', 0)}
+    rows, total = md.page_transactions(conf, 0, 1000, sort_model, filter_model)
+    blocks = [md.page_transactions(conf, start, start + 50, sort_model, filter_model) for start in range(0, total, 50)]
+    assert all(block_total == total for _, block_total in blocks)
+    assert [str(tid) for block, _ in blocks for tid in block['_id']] == [str(tid) for tid in rows['_id']]
+    assert rows['amount'].is_monotonic_increasing
+
+    md.add_one_transaction('gas', -1000, '2022-06-01', '2022-06-02', 'SHELL OIL 5555', 'Checking', '')
+    first, new_total = md.page_transactions(conf, 0, 1, sort_model, filter_model)
+    assert new_total == total + 1
+    assert first['amount'].tolist() == [-1000]
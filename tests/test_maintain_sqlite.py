@@ -0,0 +1,136 @@
+import re
+
+from bson import ObjectId
+import mongomock
+import pandas as pd
+import pytest
+
+from components.grid_query import grid_filter_to_mongo
+from components.maintain_sqlite import MaintainSQLite
+
+from conftest import make_transactions
+from test_grid_query import FILTER_MODELS
+
+NOW = pd.Timestamp('2023-01-01').to_pydatetime()
+
+# Mongo filters of the kinds MaintainDatabase and the grid send, including nulls and missing fields
+FILTERS = {
+    'equals': {'category': 'coffee'},
+    'equals null': {'notes': None},
+    'several fields': {'account name': 'Checking', 'category': 'gas'},
+    'in': {'account name': {'$in': ['Checking', 'Savings']}},
+    'in with null': {'notes': {'$in': [None, '']}},
+    'not in': {'notes': {'$nin': [None, '']}},
+    'not equal': {'notes': {'$ne': 'reimbursed'}},
+    'date range': {'posted date': {'$gte': NOW, '$lte': NOW.replace(month=6)}},
+    'greater than': {'amount': {'$gt': 0}},
+    'less than or equal': {'amount': {'$lte': -40}},
+    'comparison on null': {'notes': {'$gt': ''}},
+    'regex': {'description': {'$regex': 'store', '$options': 'i'}},
+    'compiled regex': {'description': re.compile('^shell', re.IGNORECASE)},
+    'not regex': {'description': {'$not': re.compile('store', re.IGNORECASE)}},
+    'not range': {'amount': {'$not': {'$gte': -50, '$lt': 0}}},
+    'not on null': {'notes': {'$not': re.compile('^r')}},
+    'and': {'$and': [{'amount': {'$lt': 0}}, {'category': {'$in': ['gas', 'coffee']}}]},
+    'or': {'$or': [{'category': 'gas'}, {'notes': None}]},
+    'missing field': {'fingerprint': None},
+    'empty': {},
+}
+
+
+@pytest.fixture(scope='module')
+def documents():
+    df = make_transactions(n=300)
+    df['_id'] = [ObjectId(tid) for tid in df['_id']]
+    df.loc[::3, 'amount'] = -40.0
+    df.loc[::7, 'notes'] = 'reimbursed'
+    records = df.to_dict('records')
+    for i, record in enumerate(records):
+        record['posted date'] = record['posted date'].to_pydatetime()
+        record['transaction date'] = record['transaction date'].to_pydatetime()
+        if i % 5 == 0:
+            record['notes'] = None
+        elif i % 5 == 1:
+            del record['notes']
+    return records
+
+
+@pytest.fixture(scope='module')
+def tables(documents, tmp_path_factory):
+    md = MaintainSQLite(str(tmp_path_factory.mktemp('sqlite') / 'budgie.db'))
+    md.transactions_table.insert_many([dict(doc) for doc in documents])
+    collection = mongomock.MongoClient().db.transactions
+    collection.insert_many([dict(doc) for doc in documents])
+    yield md.transactions_table, collection
+    md.connection.close()
+
+
+def ids(cursor):
+    return [doc['_id'] for doc in cursor]
+
+
+@pytest.mark.parametrize('value_filter', FILTERS.values(), ids=FILTERS.keys())
+def test_find_matches_mongo(tables, value_filter):
+    sqlite_table, collection = tables
+    expected = set(ids(collection.find(value_filter)))
+    assert set(ids(sqlite_table.find(value_filter))) == expected
+    assert sqlite_table.count_documents(value_filter) == len(expected)
+
+
+@pytest.mark.parametrize('filter_model', FILTER_MODELS.values(), ids=FILTER_MODELS.keys())
+def test_grid_filters_match_mongo(tables, filter_model):
+    sqlite_table, collection = tables
+    mongo_filter = grid_filter_to_mongo(filter_model)
+    assert set(ids(sqlite_table.find(mongo_filter))) == set(ids(collection.find(mongo_filter)))
+
+
+def test_sort_skip_and_limit_match_mongo(tables):
+    sqlite_table, collection = tables
+    sort = [('amount', 1), ('_id', 1)]
+    value_filter = {'account name': 'Checking'}
+    assert ids(sqlite_table.find(value_filter).sort(sort).skip(10).limit(25)) == \
+           ids(collection.find(value_filter).sort(sort).skip(10).limit(25))
+
+
+def test_projection_and_distinct_match_mongo(tables):
+    sqlite_table, collection = tables
+    projection = ['account name', 'amount']
+    sqlite_docs = {doc['_id']: doc for doc in sqlite_table.find({'category': 'gas'}, projection)}
+    mongo_docs = {doc['_id']: doc for doc in collection.find({'category': 'gas'}, projection)}
+    assert sqlite_docs == mongo_docs
+    # SQLite stores missing fields as NULL too, so like the options of a filter dropdown, its distinct values leave out null
+    assert sorted(sqlite_table.distinct('notes')) == sorted(value for value in collection.distinct('notes') if value is not None)
+    assert sorted(sqlite_table.distinct('category')) == sorted(collection.distinct('category'))
+
+
+def test_update_and_delete_one_change_single_row(tmp_path, documents):
+    md = MaintainSQLite(str(tmp_path / 'budgie.db'))
+    table = md.transactions_table
+    table.insert_many([dict(doc) for doc in documents[:20]])
+    assert table.update_one({'amount': -40.0}, {'$set': {'category': 'changed'}}).modified_count == 1
+    assert table.count_documents({'category': 'changed'}) == 1
+    assert table.delete_one({'amount': -40.0}).deleted_count == 1
+    assert table.count_documents({}) == 19
+    md.connection.close()
+
+
+def test_blank_dates_are_stored_as_null(tmp_path):
+    md = MaintainSQLite(str(tmp_path / 'budgie.db'))
+    table = md.transactions_table
+    table.insert_one({'posted date': '', 'transaction date': pd.NaT, 'amount': 1.0})
+    table.insert_many([{'posted date': NOW, 'transaction date': ' ', 'amount': 2.0}])
+    table.update_one({'amount': 2.0}, {'$set': {'posted date': ''}})
+    table.execute('INSERT INTO transactions (_id, "posted date", amount) VALUES (?, ?, ?)', [str(ObjectId()), '', 3.0])
+    assert [(doc.get('posted date'), doc.get('transaction date')) for doc in table.find({})] == [(None, None)] * 3
+    md.connection.close()
+
+
+@pytest.mark.parametrize('md', ['sqlite'], indirect=True)
+def test_unique_fingerprints_reject_only_rows_already_imported(md):
+    statement = pd.DataFrame({'Transaction Date': ['02/01/2024'] * 2, 'Post Date': ['02/02/2024'] * 2,
+                              'Description': ['STARBUCKS STORE 1234'] * 2, 'Amount': [-4.75] * 2})
+    assert md.load_transactions(statement.iloc[:1], 'Savings') == 1
+    # The second of the identical purchases is new, and the whole statement again has nothing new
+    assert md.load_transactions(statement, 'Savings') == 1
+    assert md.load_transactions(statement, 'Savings') == 0
+    assert md.transactions_table.count_documents({'account name': 'Savings', 'amount': -4.75}) == 2
@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from components.daily_balances import DailyBalances
+from components.maintain_transactions_csv import MaintainCSV
+from components.mutation_log import MutationLog, apply_mutation
+
+from conftest import TRANSACTION_CHANGES, close_backend
+
+
+def test_replay_skips_line_cut_off_by_crash(tmp_path):
+    log = MutationLog(str(tmp_path / 'mutations.log'))
+    log.append('budget', 'replace', [{'category': 'gas', 'value': -100}])
+    log.append('transactions', 'delete', ids=['a', 'b'])
+    with open(log.path, 'a') as f:
+        f.write('{"table": "transactions", "op": "ins')
+    assert [(m['table'], m['op']) for m in log.replay()] == [('budget', 'replace'), ('transactions', 'delete')]
+
+
+def test_replay_includes_log_of_unfinished_compaction(tmp_path):
+    log = MutationLog(str(tmp_path / 'mutations.log'))
+    log.append('accounts', 'replace', [{'account name': 'first'}])
+    log.start_compaction()
+    log.append('accounts', 'replace', [{'account name': 'second'}])
+    assert [m['rows'][0]['account name'] for m in log.replay()] == ['first', 'second']
+
+    # The next compaction keeps both, in order
+    log.start_compaction()
+    assert [m['rows'][0]['account name'] for m in log.replay()] == ['first', 'second']
+    log.finish_compaction()
+    assert log.replay() == [] and log.size() == 0
+
+
+def test_replaying_mutation_twice_changes_nothing():
+    table = pd.DataFrame({'_id': ['a', 'b'], 'amount': [1.0, 2.0]})
+    mutation = {'table': 'transactions', 'op': 'update', 'rows': [{'_id': 'b', 'amount': 5.0}]}
+    once = apply_mutation(table, mutation)
+    twice = apply_mutation(once, mutation)
+    assert sorted(twice['amount']) == sorted(once['amount']) == [1.0, 5.0]
+
+
+def assert_same_data(md, reopened):
+    columns = ['_id', 'posted date', 'amount', 'category', 'account name']
+
+    def rows(df):
+        df = df[df['_id'].astype(str) != 'None'][columns].astype(str)
+        return df.sort_values('_id').reset_index(drop=True)
+    pd.testing.assert_frame_equal(rows(md.transactions_table), rows(reopened.transactions_table))
+    for name in ['budget', 'accounts', 'categories']:
+        assert sorted(getattr(md, f"{name}_table").astype(str).values.tolist()) == \
+               sorted(getattr(reopened, f"{name}_table").astype(str).values.tolist())
+    assert reopened.get_daily_balances().compare(DailyBalances.build(reopened._all_transactions())) == []
+
+
+def crash(md):
+    """Stop the CSV data like the app was killed, without writing the changes waiting for the flush"""
+    close_backend(md)
+
+
+def test_changes_are_replayed_after_crash(csv_dir):
+    md = MaintainCSV()
+    md.get_daily_balances()
+    for change in TRANSACTION_CHANGES:
+        change(md)
+    md.add_budget_item('gas', -100)
+    md.add_category('snacks', 'food')
+    crash(md)
+    assert_same_data(md, MaintainCSV())
+
+
+def test_changes_are_replayed_after_crash_during_write(csv_dir, monkeypatch):
+    md = MaintainCSV()
+    md.get_daily_balances()
+    TRANSACTION_CHANGES[0](md)
+    md.add_budget_item('gas', -100)
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    with monkeypatch.context() as patch:
+        patch.setattr(pd.DataFrame, 'to_csv', fail)
+        with pytest.raises(OSError):
+            md.export_data_to_csv()
+    # Changes after the failed write go in a new log, next to the one moved aside for the write
+    for change in TRANSACTION_CHANGES[1:]:
+        change(md)
+    crash(md)
+    assert_same_data(md, MaintainCSV())
+
+
+def test_table_emptied_before_write_stays_empty(csv_dir):
+    md = MaintainCSV()
+    while len(md.budget_table) > 0:  # Removing a child budget changes its parent's value
+        row = md.budget_table.iloc[0]
+        md.rm_budget_item(row['category'], row['value'])
+    for account in list(md.accounts_table['account name']):
+        md.delete_account({'account name': account})
+    md.export_data_to_csv()
+    close_backend(md)
+
+    reopened = MaintainCSV()
+    assert len(reopened.budget_table) == 0
+    assert len(reopened.accounts_table) == 0
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from components.query_cache import QueryCache, invalidates_queries, query_key
+
+CONF = {'start_date': '2022-01-01', 'end_date': '2023-12-31', 'field_filter': ['Category', 'Account Name'],
+        'filter_value': {'Category': ['coffee', 'groceries'], 'Account Name': ['Checking']}}
+
+
+def test_query_key_ignores_order_of_filter_values():
+    reordered = {**CONF, 'filter_value': {'Account Name': ['Checking'], 'Category': ['groceries', 'coffee']}}
+    assert query_key(CONF, 0) == query_key(reordered, 0)
+
+
+def test_query_key_changes_with_version_and_dates():
+    assert query_key(CONF, 0) != query_key(CONF, 1)
+    assert query_key(CONF, 0) != query_key({**CONF, 'end_date': '2023-12-30'}, 0)
+
+
+def test_cache_runs_query_once_and_returns_copies():
+    cache = QueryCache()
+    calls = []
+
+    def query():
+        calls.append(1)
+        return pd.DataFrame({'amount': [1.0, 2.0]})
+
+    first = cache.get('key', query)
+    first.loc[0, 'amount'] = 100
+    second = cache.get('key', query)
+    assert len(calls) == 1
+    assert second['amount'].tolist() == [1.0, 2.0]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = QueryCache(maxsize=2)
+    for key in ['a', 'b']:
+        cache.get(key, lambda: pd.DataFrame({'key': [key]}))
+    cache.get('a', lambda: pytest.fail('should be cached'))
+    cache.get('c', lambda: pd.DataFrame({'key': ['c']}))
+    assert list(cache.results) == ['a', 'c']
+
+
+def test_invalidates_queries_even_if_change_fails():
+    class Data:
+        data_version = 0
+
+        @invalidates_queries
+        def change(self):
+            raise ValueError
+
+    data = Data()
+    with pytest.raises(ValueError):
+        data.change()
+    assert data.data_version == 1
+
+
+def test_query_after_change_includes_it(md):
+    conf = {'start_date': '2021-03-01', 'end_date': '2021-03-31', 'field_filter': [], 'filter_value': {}}
+    assert 'cached' not in md.query_transactions(conf)['description'].tolist()
+    md.add_one_transaction('coffee', -5.25, '2021-03-03', '2021-03-04', 'cached', 'Checking', '')
+    assert md.query_transactions(conf)['description'].tolist() == ['cached']
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components.rollup import ROLLUP_DIMENSIONS, Rollup, rollup_cells, summarize_cells
+
+from conftest import TRANSACTION_CHANGES, close_backend, make_transactions, open_backend, reopen_backend, stored_row, write_csv_data
+
+
+def rename_category(md):
+    row = stored_row(md, 'categories', 'category name', 'gas')
+    md.edit_category({'data': {**row, 'category name': 'fuel'}, 'colId': 'category name', 'oldValue': 'gas'})
+
+
+def move_category(md):
+    row = stored_row(md, 'categories', 'category name', 'coffee')
+    md.edit_category({'data': {**row, 'parent': 'auto'}, 'colId': 'parent', 'oldValue': 'food'})
+
+
+def add_category(md):
+    md.add_category('snacks', 'food')
+
+
+def delete_category(md):
+    md.delete_category(stored_row(md, 'categories', 'category name', 'groceries'))
+
+
+CHANGES = TRANSACTION_CHANGES + [rename_category, move_category, add_category, delete_category]
+
+
+def assert_same_cells(rollup, other):
+    """Check that two rollups have the same cells with transactions, however their cells are split"""
+    def nonzero(cells):
+        cells = cells.groupby(level=ROLLUP_DIMENSIONS).sum()
+        return cells[cells['count'] != 0].sort_index()
+    pd.testing.assert_frame_equal(nonzero(rollup.cells), nonzero(other.cells), check_dtype=False)
+
+
+def test_apply_adds_and_removes_cells():
+    parents = {'coffee': 'food'}
+    transactions = pd.DataFrame({'posted date': pd.to_datetime(['2022-01-05', '2022-01-20', '2022-02-01']),
+                                 'category': ['coffee', 'coffee', 'income'], 'account name': 'A', 'amount': [-3.0, -4.0, 100.0]})
+    rollup = Rollup.build(transactions.iloc[:2], parents)
+    rollup.apply(rollup_cells(transactions.iloc[2:], parents), rollup_cells(transactions.iloc[:1], parents))
+    assert_same_cells(rollup, Rollup.build(transactions.iloc[1:], parents))
+    assert rollup.summarize(pd.Timestamp('2022-01-01'), pd.Timestamp('2022-02-01'))['count'].sum() == 2
+
+
+def test_relabel_changes_only_relabeled_cells():
+    parents = {'coffee': 'food', 'gas': 'auto'}
+    transactions = pd.DataFrame({'posted date': pd.to_datetime(['2022-01-05', '2022-01-20', '2022-02-01']),
+                                 'category': ['coffee', 'gas', 'gas'], 'account name': 'A', 'amount': [-3.0, -4.0, -5.0]})
+    rollup = Rollup.build(transactions, parents)
+    changed = rollup.relabel({**parents, 'fuel': 'auto'}, categories={'gas': 'fuel'})
+    assert sorted(changed.index.get_level_values('category')) == ['fuel', 'fuel', 'gas', 'gas']
+    assert list(changed.loc[changed.index.get_level_values('category') == 'gas', 'count']) == [0, 0]
+    assert_same_cells(rollup, Rollup.build(transactions.replace({'gas': 'fuel'}), {**parents, 'fuel': 'auto'}))
+
+
+@pytest.mark.parametrize('kind', ['csv', 'sqlite'])
+def test_summary_with_partial_months_matches_query(kind, csv_dir, tmp_path):
+    transactions = make_transactions(n=3000)  # Several on every day
+    transactions['posted date'] += pd.to_timedelta(np.arange(len(transactions)) % 24, unit='h')  # Posted during the day
+    write_csv_data(csv_dir, transactions)
+    md = open_backend(kind, csv_dir, tmp_path / 'budgie.db')
+    for start, end in [('2022-03-15', '2022-06-30'), ('2022-03-01', '2022-07-10'), ('2022-05-03', '2022-05-20')]:
+        conf = {'start_date': start, 'end_date': end, 'field_filter': [], 'filter_value': {}}
+        in_window = transactions['posted date'].between(start, pd.Timestamp(end) + pd.Timedelta(days=1), inclusive='left')
+        expected = summarize_cells(rollup_cells(transactions[in_window], md._category_parents()))
+        for summary in [md.summarize_transactions(conf), summarize_cells(rollup_cells(md.query_transactions(conf), md._category_parents()))]:
+            pd.testing.assert_frame_equal(summary.sort_index(), expected.sort_index(), check_dtype=False)
+    close_backend(md)
+
+
+# SQLite groups the summaries itself, so only the CSV data keeps a rollup
+@pytest.mark.parametrize('md', ['csv'], indirect=True)
+@pytest.mark.parametrize('change', CHANGES, ids=lambda change: change.__name__)
+def test_incremental_rollup_matches_rebuilt(md, change):
+    md.get_rollup()
+    change(md)
+    assert_same_cells(md.get_rollup(), Rollup.build(md._all_transactions(), md._category_parents()))
+
+
+@pytest.mark.parametrize('md', ['csv'], indirect=True)
+def test_stored_rollup_matches_rebuilt(md):
+    md.get_rollup()
+    for change in CHANGES:
+        change(md)
+    reopened = reopen_backend(md)
+    stored = reopened._load_rollup()
+    assert stored is not None
+    assert_same_cells(stored, Rollup.build(reopened._all_transactions(), reopened._category_parents()))
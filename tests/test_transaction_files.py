@@ -0,0 +1,28 @@
+from conftest import make_transactions
+from components import transaction_files
+
+
+def make_sheet(seed, n=50):
+    """Make the bytes of an uploaded bank CSV"""
+    df = make_transactions(n, seed)
+    df = df.rename(columns={'transaction date': 'Transaction Date', 'posted date': 'Post Date',
+                            'description': 'Description', 'amount': 'Amount'})
+    return df[['Transaction Date', 'Post Date', 'Description', 'Amount']].to_csv(index=False).encode()
+
+
+def test_files_are_parsed_in_order():
+    sheets = [make_sheet(seed, n) for seed, n in enumerate([30, 10, 20])] + [b'not,a\n1,2\n']
+    parsed = list(transaction_files.standardize_transaction_files(sheets, 'Checking'))
+
+    assert [sum(len(chunk) for chunk in chunks) for chunks in parsed[:3]] == [30, 10, 20]
+    assert isinstance(parsed[3], str)
+    pool = transaction_files._upload_pool
+    list(transaction_files.standardize_transaction_files(sheets[:2], 'Checking'))
+    assert transaction_files._upload_pool is pool
+
+
+def test_single_file_is_read_lazily():
+    parsed = list(transaction_files.standardize_transaction_files([make_sheet(0)], 'Checking'))
+
+    assert len(parsed) == 1 and not isinstance(parsed[0], list)
+    assert sum(len(chunk) for chunk in parsed[0]) == 50
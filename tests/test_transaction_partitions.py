@@ -0,0 +1,56 @@
+import shutil
+
+import pandas as pd
+
+from components.maintain_transactions_csv import MaintainCSV
+
+from conftest import TRANSACTION_CHANGES, close_backend, stored_row, transaction_ids
+
+
+def edit_posted_date(md):
+    """Edit the posted date of a transaction in the grid, moving it to another month"""
+    row = stored_row(md, 'transactions', '_id', transaction_ids(md, 'Savings')[0])
+    data = {**row, 'posted date': '03-15-2023', 'transaction date': row['transaction date'].strftime('%m-%d-%Y')}
+    md.edit_transaction([{'data': data, 'colId': 'posted date', 'oldValue': row['posted date'].strftime('%m-%d-%Y')}])
+
+
+def delete_category(md):
+    md.delete_category(stored_row(md, 'categories', 'category name', 'groceries'))
+
+
+CHANGES = TRANSACTION_CHANGES + [edit_posted_date, delete_category]
+
+
+def rows(md):
+    """Get the stored transactions, without the random ids of the inserted ones"""
+    df = md._all_transactions()[['posted date', 'transaction date', 'description', 'amount', 'category', 'account name']]
+    return df.astype(str).sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_changes_read_only_their_months(csv_dir, tmp_path):
+    first = MaintainCSV()
+    first.get_daily_balances()
+    first.get_rollup()
+    first.export_data_to_csv()  # Partition the transactions, next to the stored views
+    loaded_dir = tmp_path / 'loaded'
+    shutil.copytree(csv_dir, loaded_dir)
+    md = MaintainCSV()
+    loaded = MaintainCSV(str(loaded_dir))
+    loaded.transactions_table  # Changes the full table from now on
+
+    for change in CHANGES:
+        change(md)
+        change(loaded)
+    assert md._transactions is None
+    pd.testing.assert_frame_equal(rows(md), rows(loaded))
+
+    # The logged changes are replayed into the months they name
+    close_backend(md)
+    close_backend(loaded)
+    replayed = MaintainCSV()
+    assert replayed._transactions is None
+    pd.testing.assert_frame_equal(rows(replayed), rows(loaded))
+
+    # Only the changed months are written
+    replayed.export_data_to_csv()
+    pd.testing.assert_frame_equal(rows(MaintainCSV()), rows(loaded))